@@ -52,6 +52,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Inactive unless QUERY_PROFILING is set
+    'grandpa.profiling.QueryProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -142,7 +144,126 @@ TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
 TWILIO_PHONE_NUMBER = os.getenv('TWILIO_PHONE_NUMBER')
 TWILIO_PARTICIPANTS = os.getenv('TWILIO_PARTICIPANTS', '').split(',')
+# How long the stored conversation SID/participants are trusted before re-checking with Twilio
+TWILIO_CONVERSATION_STATE_TTL = int(os.getenv('TWILIO_CONVERSATION_STATE_TTL', str(24 * 60 * 60)))
+# Participant adds run in parallel, at most this many at once
+TWILIO_PARTICIPANT_CONCURRENCY = int(os.getenv('TWILIO_PARTICIPANT_CONCURRENCY', '4'))
+# Recipient group fan-out (grandpa/fanout.py): conversations sent to in parallel, the
+# sustained request rate and burst allowed towards Twilio, and retries after a 429
+TWILIO_SEND_CONCURRENCY = int(os.getenv('TWILIO_SEND_CONCURRENCY', '4'))
+TWILIO_SEND_RATE = float(os.getenv('TWILIO_SEND_RATE', '10'))
+TWILIO_SEND_BURST = int(os.getenv('TWILIO_SEND_BURST', '10'))
+TWILIO_SEND_MAX_RETRIES = int(os.getenv('TWILIO_SEND_MAX_RETRIES', '3'))
+TWILIO_RETRY_BACKOFF_SECONDS = float(os.getenv('TWILIO_RETRY_BACKOFF_SECONDS', '1'))
+
+# Messaging client class; grandpa.fake_messaging.FakeTwilioClient is an offline stand-in
+TWILIO_CLIENT_BACKEND = os.getenv('TWILIO_CLIENT_BACKEND', 'twilio.rest.Client')
+# Simulated behaviour of the fake client
+TWILIO_FAKE_LATENCY_SECONDS = float(os.getenv('TWILIO_FAKE_LATENCY_SECONDS', '0'))
+TWILIO_FAKE_JITTER_SECONDS = float(os.getenv('TWILIO_FAKE_JITTER_SECONDS', '0'))
+TWILIO_FAKE_MAX_RPS = int(os.getenv('TWILIO_FAKE_MAX_RPS', '0'))
+TWILIO_FAKE_ERROR_RATE = float(os.getenv('TWILIO_FAKE_ERROR_RATE', '0'))
 
 SITE_URL = os.getenv('SITE_URL', 'http://127.0.0.1:8000')
 
 FAKE_DATE = os.getenv('FAKE_DATE')
+
+# Calendar parsing job queue (see grandpa/jobs.py and `manage.py run_parse_worker`)
+PARSE_WORKER_CONCURRENCY = int(os.getenv('PARSE_WORKER_CONCURRENCY', '2'))
+PARSE_JOB_LEASE_SECONDS = int(os.getenv('PARSE_JOB_LEASE_SECONDS', '600'))
+PARSE_JOB_MAX_ATTEMPTS = int(os.getenv('PARSE_JOB_MAX_ATTEMPTS', '5'))
+PARSE_JOB_RETRY_BACKOFF_SECONDS = int(os.getenv('PARSE_JOB_RETRY_BACKOFF_SECONDS', '30'))
+PARSE_JOB_MAX_BACKOFF_SECONDS = int(os.getenv('PARSE_JOB_MAX_BACKOFF_SECONDS', '3600'))
+
+# Preprocessing applied to calendar photos before upload (see grandpa/imaging.py)
+GEMINI_IMAGE_MAX_EDGE = int(os.getenv('GEMINI_IMAGE_MAX_EDGE', '2048'))
+GEMINI_IMAGE_FORMAT = os.getenv('GEMINI_IMAGE_FORMAT', 'JPEG')
+GEMINI_IMAGE_QUALITY = int(os.getenv('GEMINI_IMAGE_QUALITY', '85'))
+GEMINI_IMAGE_DESKEW = os.getenv('GEMINI_IMAGE_DESKEW', 'True') == 'True'
+
+# Parse result cache (see grandpa/parse_cache.py and `manage.py purge_parse_cache`)
+PARSE_CACHE_ENABLED = os.getenv('PARSE_CACHE_ENABLED', 'True') == 'True'
+PARSE_CACHE_MAX_AGE_DAYS = int(os.getenv('PARSE_CACHE_MAX_AGE_DAYS', '90'))
+PARSE_CACHE_MAX_BYTES = int(os.getenv('PARSE_CACHE_MAX_BYTES', str(50 * 1024 * 1024)))
+
+# Split month grids into week rows and parse them concurrently (see CalendarProcessor._extract_tiles)
+GEMINI_TILED_EXTRACTION = os.getenv('GEMINI_TILED_EXTRACTION', 'False') == 'True'
+GEMINI_TILE_CONCURRENCY = int(os.getenv('GEMINI_TILE_CONCURRENCY', '6'))
+
+# Extraction backend used by CalendarProcessor. Set to grandpa.fake_gemini.FakeGeminiBackend to
+# replay recorded fixtures offline, or grandpa.fake_gemini.RecordingGeminiBackend to record them.
+GEMINI_BACKEND = os.getenv('GEMINI_BACKEND', 'grandpa.gemini.GeminiBackend')
+GEMINI_FAKE_FIXTURES_DIR = os.getenv('GEMINI_FAKE_FIXTURES_DIR', str(BASE_DIR / 'grandpa' / 'testdata' / 'gemini'))
+GEMINI_FAKE_LATENCY_SECONDS = float(os.getenv('GEMINI_FAKE_LATENCY_SECONDS', '0'))
+GEMINI_FAKE_JITTER_SECONDS = float(os.getenv('GEMINI_FAKE_JITTER_SECONDS', '0'))
+GEMINI_FAKE_ERROR_RATE = float(os.getenv('GEMINI_FAKE_ERROR_RATE', '0'))
+
+# Extraction call policy (see grandpa/hedging.py): per-attempt deadline, retries of
+# transient errors with jittered backoff, and hedged second requests (off by default,
+# since a hedge can double token spend) sent once an attempt outlasts the given
+# percentile of recent latencies (or HEDGE_AFTER_SECONDS until MIN_SAMPLES are in)
+GEMINI_REQUEST_TIMEOUT_SECONDS = float(os.getenv('GEMINI_REQUEST_TIMEOUT_SECONDS', '120'))
+GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', '2'))
+GEMINI_RETRY_BACKOFF_SECONDS = float(os.getenv('GEMINI_RETRY_BACKOFF_SECONDS', '1'))
+GEMINI_RETRY_MAX_BACKOFF_SECONDS = float(os.getenv('GEMINI_RETRY_MAX_BACKOFF_SECONDS', '30'))
+GEMINI_HEDGING = os.getenv('GEMINI_HEDGING', 'False') == 'True'
+GEMINI_HEDGE_PERCENTILE = float(os.getenv('GEMINI_HEDGE_PERCENTILE', '95'))
+GEMINI_HEDGE_AFTER_SECONDS = float(os.getenv('GEMINI_HEDGE_AFTER_SECONDS', '30'))
+GEMINI_HEDGE_MIN_SAMPLES = int(os.getenv('GEMINI_HEDGE_MIN_SAMPLES', '20'))
+
+# Files API uploads (see grandpa/uploads.py): reused until this close to their expiry,
+# deleted once unused for KEEP_SECONDS, in batches, every CLEANUP_INTERVAL by the parse worker
+GEMINI_UPLOAD_REUSE_MARGIN_SECONDS = int(os.getenv('GEMINI_UPLOAD_REUSE_MARGIN_SECONDS', str(30 * 60)))
+GEMINI_UPLOAD_KEEP_SECONDS = int(os.getenv('GEMINI_UPLOAD_KEEP_SECONDS', str(6 * 60 * 60)))
+GEMINI_UPLOAD_CLEANUP_INTERVAL_SECONDS = int(os.getenv('GEMINI_UPLOAD_CLEANUP_INTERVAL_SECONDS', '600'))
+GEMINI_UPLOAD_CLEANUP_BATCH = int(os.getenv('GEMINI_UPLOAD_CLEANUP_BATCH', '100'))
+GEMINI_UPLOAD_CLEANUP_CONCURRENCY = int(os.getenv('GEMINI_UPLOAD_CLEANUP_CONCURRENCY', '8'))
+
+# Shared cache (file-based so the parse worker and every web worker see the same entries)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_DIR', str(BASE_DIR / '.cache')),
+    },
+    # Ingestion metrics (METRICS_CACHE): their own directory, never expired and never
+    # culled, so counters and histogram buckets can't be reset behind /metrics' back
+    'metrics': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('METRICS_CACHE_DIR', str(BASE_DIR / '.cache' / 'metrics')),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 100_000},
+    },
+}
+
+# How long a rendered /messages/* text may stay cached (it is also invalidated on change)
+MESSAGES_CACHE_TIMEOUT = int(os.getenv('MESSAGES_CACHE_TIMEOUT', str(60 * 60 * 24)))
+
+# max-age for /api/events responses; clients revalidate with If-None-Match afterwards
+EVENTS_API_MAX_AGE = int(os.getenv('EVENTS_API_MAX_AGE', '0'))
+
+# Parse status stream (admin): how often it checks for changes, and how long one
+# connection stays open before the browser reconnects
+PARSE_STATUS_POLL_SECONDS = float(os.getenv('PARSE_STATUS_POLL_SECONDS', '1'))
+PARSE_STATUS_STREAM_SECONDS = int(os.getenv('PARSE_STATUS_STREAM_SECONDS', '300'))
+
+# Per-request SQL profiling (see grandpa/profiling.py and `manage.py query_profile_report`):
+# Server-Timing headers, a warning when one query shape runs REPEAT_THRESHOLD+ times in a
+# request, and a JSON line per request in QUERY_PROFILING_LOG (empty to disable the log)
+QUERY_PROFILING = os.getenv('QUERY_PROFILING', 'False') == 'True'
+QUERY_PROFILING_REPEAT_THRESHOLD = int(os.getenv('QUERY_PROFILING_REPEAT_THRESHOLD', '5'))
+QUERY_PROFILING_LOG = os.getenv('QUERY_PROFILING_LOG', str(BASE_DIR / 'query_profile.log'))
+QUERY_PROFILING_LOG_MAX_BYTES = int(os.getenv('QUERY_PROFILING_LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+
+# Ingestion metrics at /metrics (see grandpa/metrics.py): the cache alias holding them,
+# and an optional bearer token scrapers must present
+METRICS_CACHE = os.getenv('METRICS_CACHE', 'metrics')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# The app's own log lines (parse results, N+1 warnings) go to the console, which the
+# web and parse worker processes already send to their logs
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {'grandpa': {'handlers': ['console'], 'level': os.getenv('GRANDPA_LOG_LEVEL', 'INFO')}},
+}
@@ -26,6 +26,7 @@ urlpatterns = [
     path('', RedirectView.as_view(url='/calendar/', permanent=False)),
     path("messages/today", views.messages_today),
     path("messages/tomorrow", views.messages_tomorrow),
+    path("metrics", views.metrics),
     re_path(r'^.*$', RedirectView.as_view(url='/calendar/', permanent=False)),
 ]
 
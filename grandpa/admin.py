@@ -1,39 +1,54 @@
 from django.contrib import admin
-from .models import CalendarMonth, CalendarEvent
+from .models import CalendarMonth, CalendarEvent, GeminiUpload, ParseJob, RecipientGroup, TwilioConversation
 import json
 from django.utils.safestring import mark_safe
 from django.utils.html import format_html
+from django.urls import reverse
 
 @admin.register(CalendarEvent)
 class CalendarEventAdmin(admin.ModelAdmin):
     list_display = ('day', 'hour', 'minute', 'title', 'calendar_month')
     list_select_related = ('calendar_month',)
-    ordering = ('-day', '-hour', '-minute')
-    list_filter = ('calendar_month',)
+    ordering = ('-event_date', 'all_day', '-start_minute_of_day')
+    list_filter = ('calendar_month', 'manually_edited')
     search_fields = ('title', 'original_text')
 
+    def save_model(self, request, obj, form, change):
+        # A correction must survive the next re-parse (unticking the box releases it);
+        # so must an event added by hand, typically one the model missed
+        if not change or set(form.changed_data) - {'manually_edited'}:
+            obj.manually_edited = True
+        super().save_model(request, obj, form, change)
+
     def get_ordering(self, request):
         # If filtering by calendar_month, default to ascending order.
         # Check for the specific lookup parameter used by Django admin for foreign keys.
         if 'calendar_month__id__exact' in request.GET:
-            return ('day', 'hour', 'minute')
+            return ('event_date', *CalendarEvent.DAY_ORDERING)
         return super().get_ordering(request)
 
 class CalendarEventInline(admin.TabularInline):
     model = CalendarEvent
     extra = 0
-    ordering = ('day', 'hour', 'minute')
+    ordering = ('day', *CalendarEvent.DAY_ORDERING)
     fields = ('day', 'hour', 'minute', 'am_pm', 'title', 'color', 'all_day', 'featured')
 
 @admin.register(CalendarMonth)
 class CalendarMonthAdmin(admin.ModelAdmin):
-    list_display = ('id', 'created_at', 'status_display', 'month', 'year', 'successfully_parsed')
+    list_display = ('id', 'created_at', 'status_display', 'calendar', 'month', 'year', 'successfully_parsed')
     list_display_links = ('id', 'created_at')
     ordering = ('-year', '-month')
-    readonly_fields = ('parsed_data_pretty', 'created_at')
-    fields = ('image', 'created_at', 'month', 'year', 'successfully_parsed', 'notes_or_announcements', 'parsed_data_pretty')
+    readonly_fields = ('parsed_data_pretty', 'created_at', 'image_sizes')
+    fields = ('image', 'calendar', 'created_at', 'image_sizes', 'month', 'year', 'successfully_parsed', 'notes_or_announcements', 'parsed_data_pretty')
     inlines = [CalendarEventInline]
 
+    def save_formset(self, request, form, formset, change):
+        # Inline corrections and additions are kept on re-parse too (see CalendarEventAdmin.save_model)
+        for inline_form in formset.forms:
+            if inline_form.has_changed() and not inline_form.cleaned_data.get('DELETE'):
+                inline_form.instance.manually_edited = True
+        super().save_formset(request, form, formset, change)
+
     def status_display(self, obj):
         if not obj.parsed_data:
             return "Pending"
@@ -44,16 +59,59 @@ class CalendarMonthAdmin(admin.ModelAdmin):
         return "❌ Failed"
     status_display.short_description = "Status"
 
+    def image_sizes(self, obj):
+        if not obj.processed_image_bytes:
+            return "-"
+        return (
+            f"{obj.original_image_bytes / 1024:,.0f} KB uploaded, "
+            f"{obj.processed_image_bytes / 1024:,.0f} KB sent "
+            f"({obj.processed_image_width}x{obj.processed_image_height})"
+        )
+    image_sizes.short_description = "Image sizes"
+
     def parsed_data_pretty(self, obj):
         if not obj.parsed_data:
             return "-"
         
-        # If still processing, show a message
+        # If still processing, show a message; the change form script keeps it current
+        # from the parse status stream and reloads the page once parsing finishes
         if obj.parsed_data.get('status') == 'processing':
-            return "Processing in background... Refresh page in a few seconds."
+            return format_html(
+                '<span data-parse-status-url="{}">⏳ Processing in background...</span>',
+                reverse('parse_status_stream', args=[obj.pk]),
+            )
 
         # Format JSON for display
         json_str = json.dumps(obj.parsed_data, indent=2)
         return format_html('<pre>{}</pre>', json_str)
     
     parsed_data_pretty.short_description = "Parsed Data (JSON)"
+
+
+@admin.register(ParseJob)
+class ParseJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'calendar_month', 'status', 'attempts', 'max_attempts', 'available_at', 'locked_by', 'finished_at')
+    list_select_related = ('calendar_month',)
+    list_filter = ('status',)
+    readonly_fields = ('calendar_month', 'attempts', 'locked_by', 'leased_until', 'last_error', 'created_at', 'finished_at')
+
+
+@admin.register(TwilioConversation)
+class TwilioConversationAdmin(admin.ModelAdmin):
+    # Deleting a row makes the next send re-sync the conversation with Twilio
+    list_display = ('unique_name', 'sid', 'synced_at')
+    readonly_fields = ('unique_name', 'sid', 'participant_addresses', 'synced_at')
+
+
+@admin.register(GeminiUpload)
+class GeminiUploadAdmin(admin.ModelAdmin):
+    # Deleting a row only forgets the upload; `manage.py cleanup_gemini_uploads` deletes the file too
+    list_display = ('name', 'content_sha256', 'size_bytes', 'created_at', 'last_used_at', 'expires_at')
+    readonly_fields = ('content_sha256', 'name', 'uri', 'mime_type', 'size_bytes', 'expires_at', 'created_at', 'last_used_at')
+
+
+@admin.register(RecipientGroup)
+class RecipientGroupAdmin(admin.ModelAdmin):
+    list_display = ('name', 'conversation_name', 'calendars', 'active')
+    list_filter = ('active',)
+    search_fields = ('name', 'conversation_name', 'participants')
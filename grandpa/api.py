@@ -1,9 +1,21 @@
 from ninja import NinjaAPI, Schema
 from typing import List, Optional
+from django.conf import settings
+from django.db.models import Count, Max
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
-from .models import CalendarEvent, CalendarMonth
+from django.utils.cache import get_conditional_response
+from .models import CalendarEvent, CalendarMonth, MonthSnapshot
+from . import snapshots
 from datetime import datetime, timedelta, date
+import calendar
+import hashlib
+import json
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the stdlib encoder
+    orjson = None
 
 api = NinjaAPI()
 
@@ -23,21 +35,28 @@ class CalendarEventSchema(Schema):
 
     @staticmethod
     def resolve_month(obj):
-        return obj.calendar_month.month
+        return obj.event_date.month
 
     @staticmethod
     def resolve_year(obj):
-        return obj.calendar_month.year
+        return obj.event_date.year
 
-@api.get("/events", response=List[CalendarEventSchema])
-def list_events(request, 
-                month: Optional[int] = None, 
-                day: Optional[int] = None, 
-                year: Optional[int] = None, 
-                scope: str = "day",
-                start: Optional[str] = None,
-                end: Optional[str] = None):
-    qs = CalendarEvent.objects.all().select_related('calendar_month')
+def month_bounds(year, month):
+    """
+    First and last day of a month.
+    """
+    first = date(year, month, 1)
+    last = date(year, month, calendar.monthrange(year, month)[1])
+    return first, last
+
+def events_queryset(month=None, day=None, year=None, scope="day", start=None, end=None):
+    """
+    The filtered (unordered) events for /api/events parameters, or None if the
+    parameters name a date that doesn't exist.
+    """
+    # Every filter is a range over the indexed event_date column; no join needed.
+    # Events without a valid date can't be placed on the calendar.
+    qs = CalendarEvent.objects.filter(event_date__isnull=False)
 
     # Default to current year if not provided, for date calculations
     current_year = year or datetime.now().year
@@ -49,22 +68,8 @@ def list_events(request,
             start_date = datetime.fromisoformat(start.replace("Z", "+00:00")).date()
             end_date = datetime.fromisoformat(end.replace("Z", "+00:00")).date()
             
-            # Filter for months that overlap with the range
-            q_filter = Q()
-            curr = start_date.replace(day=1)
-            # Adjust end_date to include the full month of the end date
-            target_end_month = end_date.replace(day=1)
-            
-            while curr <= target_end_month:
-                q_filter |= Q(calendar_month__year=curr.year, calendar_month__month=curr.month)
-                
-                # Move to next month
-                if curr.month == 12:
-                    curr = curr.replace(year=curr.year + 1, month=1)
-                else:
-                    curr = curr.replace(month=curr.month + 1)
-            
-            qs = qs.filter(q_filter)
+            # FullCalendar's end is exclusive
+            qs = qs.filter(event_date__gte=start_date, event_date__lt=end_date)
             
         except Exception as e:
             # If parsing fails, ignore start/end and fall back to other filters
@@ -75,31 +80,201 @@ def list_events(request,
         try:
             start_date = date(current_year, month, day)
         except ValueError:
-            return []
+            return None
 
         end_date = start_date + timedelta(days=6)
-        
-        target_dates = []
-        curr = start_date
-        while curr <= end_date:
-            target_dates.append((curr.year, curr.month, curr.day))
-            curr += timedelta(days=1)
-            
-        q_filter = Q()
-        for y, m, d in target_dates:
-            q_filter |= Q(calendar_month__year=y, calendar_month__month=m, day=d)
-            
-        qs = qs.filter(q_filter)
+        qs = qs.filter(event_date__range=(start_date, end_date))
         
     elif month:
-        qs = qs.filter(calendar_month__month=month)
-        if day:
-            qs = qs.filter(day=day)
-            
         if year:
-            qs = qs.filter(calendar_month__year=year)
+            try:
+                if day:
+                    qs = qs.filter(event_date=date(year, month, day))
+                else:
+                    qs = qs.filter(event_date__range=month_bounds(year, month))
+            except ValueError:
+                return None
+        else:
+            # Same month (and day) across every year
+            qs = qs.filter(event_date__month=month)
+            if day:
+                qs = qs.filter(event_date__day=day)
             
     elif year:
-        qs = qs.filter(calendar_month__year=year)
+        try:
+            qs = qs.filter(event_date__range=(date(year, 1, 1), date(year, 12, 31)))
+        except ValueError:
+            return None
+
+    return qs
+
+def snapshot_period(month=None, day=None, year=None, scope="day", start=None, end=None):
+    """
+    The inclusive (first, last) dates of a whole-month, year or start/end range request,
+    which can be answered from month snapshots; None for anything else (single days,
+    weeks, a month across every year, or ranges too long to be worth snapshotting).
+    """
+    first = last = None
+    if start and end and month is None and year is None:
+        try:
+            first = datetime.fromisoformat(start.replace("Z", "+00:00")).date()
+            # FullCalendar's end is exclusive
+            last = datetime.fromisoformat(end.replace("Z", "+00:00")).date() - timedelta(days=1)
+        except (ValueError, OverflowError):
+            return None
+    elif not (start and end) and year and not day:
+        try:
+            first, last = month_bounds(year, month) if month else (date(year, 1, 1), date(year, 12, 31))
+        except ValueError:
+            return None
+
+    if first is None or first > last or len(snapshots.months_between(first, last)) > snapshots.MAX_SNAPSHOT_MONTHS:
+        return None
+    return first, last
+
+def events_etag(request, qs):
+    """
+    Strong ETag for an events response: the query parameters plus the range's row
+    count and newest updated_at. A deletion changes the count and any insert or edit
+    moves updated_at, so the tag changes whenever the response body would.
+    """
+    stats = qs.order_by().aggregate(count=Count('id'), last_updated=Max('updated_at'))
+    params = sorted(request.GET.items())
+    last_updated = stats['last_updated'].isoformat() if stats['last_updated'] else '-'
+    key = f"{params}:{stats['count']}:{last_updated}"
+    return '"%s"' % hashlib.md5(key.encode()).hexdigest()
+
+def snapshot_etag(request, month_snapshots):
+    """
+    events_etag computed from the count and newest updated_at each snapshot was built
+    from, so serving from snapshots needs no query against the events table.
+    """
+    params = sorted(request.GET.items())
+    parts = [
+        f"{s.year}-{s.month}:{s.event_count}:{s.last_updated.isoformat() if s.last_updated else '-'}"
+        for s in month_snapshots
+    ]
+    key = f"{params}:{','.join(parts)}"
+    return '"%s"' % hashlib.md5(key.encode()).hexdigest()
+
+def conditional_headers(request, etag):
+    """
+    Returns (headers, not_modified): the caching headers for an events response, and a
+    ready 304 response if the client's If-None-Match is still current (else None).
+    """
+    headers = {
+        'ETag': etag,
+        'Cache-Control': f"public, max-age={getattr(settings, 'EVENTS_API_MAX_AGE', 0)}, must-revalidate",
+    }
+    not_modified = get_conditional_response(request, etag=headers['ETag'])
+    if not_modified is not None:
+        for name, value in headers.items():
+            not_modified[name] = value
+    return headers, not_modified
+
+# Order of events in every response, and within month snapshots
+EVENTS_ORDERING = ('event_date', *CalendarEvent.DAY_ORDERING)
+
+def snapshot_response(request, kind, first, last):
+    """
+    Serves first..last by concatenating month snapshots: one query for the snapshots,
+    which also supply the ETag.
+    """
+    month_snapshots = snapshots.month_snapshots(kind, first, last)
+    headers, not_modified = conditional_headers(request, snapshot_etag(request, month_snapshots))
+    if not_modified is not None:
+        return not_modified
+
+    response = HttpResponse(snapshots.concatenate(month_snapshots, first, last), content_type='application/json')
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+@api.get("/events", response=List[CalendarEventSchema])
+def list_events(request, 
+                response: HttpResponse,
+                month: Optional[int] = None, 
+                day: Optional[int] = None, 
+                year: Optional[int] = None, 
+                scope: str = "day",
+                start: Optional[str] = None,
+                end: Optional[str] = None):
+    period = snapshot_period(month=month, day=day, year=year, scope=scope, start=start, end=end)
+    if period is not None:
+        return snapshot_response(request, MonthSnapshot.KIND_EVENTS, *period)
+
+    qs = events_queryset(month=month, day=day, year=year, scope=scope, start=start, end=end)
+    if qs is None:
+        return []
+
+    # One aggregate query decides whether the client's copy is current; no rows are loaded for a 304
+    headers, not_modified = conditional_headers(request, events_etag(request, qs))
+    if not_modified is not None:
+        return not_modified
+
+    for name, value in headers.items():
+        response[name] = value
+    return qs.order_by(*EVENTS_ORDERING)
+
+# Column order for the fast path; see fullcalendar_event
+FEED_FIELDS = ('id', 'title', 'event_date', 'start_minute_of_day', 'hour', 'minute', 'am_pm', 'all_day', 'color', 'original_text')
+
+def fullcalendar_event(row):
+    """
+    Turns a FEED_FIELDS tuple into FullCalendar's native event object. The start time
+    comes from start_minute_of_day, normalized to 24 hours when the event was stored.
+    """
+    event_id, title, event_date, start_minute, hour, minute, am_pm, all_day, color, original_text = row
+    start = event_date.isoformat()
+    if not all_day and start_minute is not None:
+        start = f"{start}T{start_minute // 60:02d}:{start_minute % 60:02d}:00"
+
+    return {
+        'id': event_id,
+        'title': title,
+        'start': start,
+        'allDay': all_day,
+        'backgroundColor': color or '#3788d8',
+        'extendedProps': {
+            'original_text': original_text,
+            'am_pm': am_pm,
+            'hour': hour,
+            'minute': minute,
+        },
+    }
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':')).encode()
+
+@api.get("/events/feed")
+def events_feed(request,
+                month: Optional[int] = None,
+                day: Optional[int] = None,
+                year: Optional[int] = None,
+                scope: str = "day",
+                start: Optional[str] = None,
+                end: Optional[str] = None):
+    """
+    Fast path for the calendar page: same filters as /events, but rows are read as
+    plain tuples and written straight out in FullCalendar's event format, skipping
+    model instances and per-row schema validation.
+    """
+    period = snapshot_period(month=month, day=day, year=year, scope=scope, start=start, end=end)
+    if period is not None:
+        return snapshot_response(request, MonthSnapshot.KIND_FEED, *period)
+
+    qs = events_queryset(month=month, day=day, year=year, scope=scope, start=start, end=end)
+    if qs is None:
+        return HttpResponse(b'[]', content_type='application/json')
+
+    headers, not_modified = conditional_headers(request, events_etag(request, qs))
+    if not_modified is not None:
+        return not_modified
 
-    return qs.order_by('calendar_month__year', 'calendar_month__month', 'day', 'hour', 'minute')
+    rows = qs.order_by(*EVENTS_ORDERING).values_list(*FEED_FIELDS)
+    response = HttpResponse(dumps([fullcalendar_event(row) for row in rows]), content_type='application/json')
+    for name, value in headers.items():
+        response[name] = value
+    return response
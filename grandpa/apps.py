@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class GrandpaConfig(AppConfig):
     name = "grandpa"
+
+    def ready(self):
+        from . import signals  # noqa: F401
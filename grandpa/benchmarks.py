@@ -0,0 +1,82 @@
+"""
+Small helpers shared by the `bench_*` management commands.
+"""
+import statistics
+import time
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from .utils import percentile
+
+
+def summarize(samples):
+    """
+    Latency summary (milliseconds) for a list of durations in seconds.
+    """
+    ms = [s * 1000 for s in samples]
+    return {
+        'n': len(ms),
+        'mean_ms': round(statistics.fmean(ms), 3) if ms else None,
+        'p50_ms': round(percentile(ms, 50), 3) if ms else None,
+        'p95_ms': round(percentile(ms, 95), 3) if ms else None,
+        'p99_ms': round(percentile(ms, 99), 3) if ms else None,
+        'max_ms': round(max(ms), 3) if ms else None,
+    }
+
+
+def measure(fn, iterations, warmup=0):
+    """
+    Calls `fn` `iterations` times and returns the per-call durations in seconds.
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def format_summary(label, summary):
+    return (
+        f"{label}: n={summary['n']} mean={summary['mean_ms']}ms p50={summary['p50_ms']}ms "
+        f"p95={summary['p95_ms']}ms p99={summary['p99_ms']}ms max={summary['max_ms']}ms"
+    )
+
+
+def api_client():
+    """
+    A test Client for timing views. Its default Host (testserver) isn't in
+    ALLOWED_HOSTS, and every request would time a 400 page instead.
+    """
+    host = next((h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')), 'localhost')
+    return Client(HTTP_HOST=host)
+
+
+def get_ok(client, path, params=None):
+    """
+    GETs `path` and raises unless it answered 200, so an error page is never timed as a sample.
+    """
+    response = client.get(path, params)
+    if response.status_code != 200:
+        raise RuntimeError(f"GET {path} {params or ''} returned {response.status_code}")
+    return response
+
+
+def count_queries(fn):
+    """
+    Calls `fn` once and returns how many SQL statements it ran. Counts through an
+    execute wrapper, since CaptureQueriesContext loses queries when a test Client
+    request resets the query log.
+    """
+    count = 0
+
+    def wrapper(execute, sql, params, many, context):
+        nonlocal count
+        count += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        fn()
+    return count
@@ -0,0 +1,30 @@
+"""
+Shared cache helpers.
+
+The "events version" is a timestamp (ns) bumped whenever calendar data changes (see
+signals.py). Cached renderings include it in their keys, so a bump invalidates them
+everywhere at once; it doubles as the Last-Modified time for HTTP responses.
+It lives in the shared cache so the parse worker's writes reach every web worker.
+"""
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.core.cache import cache
+
+EVENTS_VERSION_KEY = 'grandpa:events_version'
+
+
+def events_version():
+    version = cache.get(EVENTS_VERSION_KEY)
+    if version is None:
+        # Unknown (cache cleared or first run): start a new version now
+        cache.add(EVENTS_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(EVENTS_VERSION_KEY) or time.time_ns()
+    return version
+
+
+def bump_events_version():
+    cache.set(EVENTS_VERSION_KEY, time.time_ns(), None)
+
+
+def version_datetime(version):
+    return datetime.fromtimestamp(version / 1e9, tz=dt_timezone.utc)
@@ -0,0 +1,145 @@
+"""
+Offline stand-ins for the Gemini extraction backend (see gemini.GeminiBackend).
+
+FakeGeminiBackend replays recorded CalendarResponse fixtures with configurable
+latency and error injection, so the upload -> parse -> bulk_create path can be
+tested and profiled without network access. RecordingGeminiBackend calls the real
+API and saves every response as a fixture for later replay.
+
+Fixtures are JSON files in GEMINI_FAKE_FIXTURES_DIR named `<sha256 of the prepared
+image bytes>.json`. Images without a matching fixture get one of the available
+fixtures, chosen by hash so the choice is stable.
+
+Enable with e.g. GEMINI_BACKEND=grandpa.fake_gemini.FakeGeminiBackend.
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from .gemini import CalendarResponse, GeminiBackend
+
+class FakeGeminiError(Exception):
+    """An injected failure from FakeGeminiBackend."""
+    # Like the SDK's APIError, so metrics.failure_reason sees a 503
+    code = 503
+
+
+def image_key(prepared):
+    return hashlib.sha256(prepared.data).hexdigest()
+
+
+def fixtures_path(fixtures_dir=None):
+    return Path(fixtures_dir or getattr(settings, 'GEMINI_FAKE_FIXTURES_DIR', None)
+                or settings.BASE_DIR / 'grandpa' / 'testdata' / 'gemini')
+
+
+class FakeGeminiBackend:
+    requires_api_key = False
+
+    # Across every instance (each parse loads its own backend): extract calls running
+    # right now, and the most seen at once, so tests can check concurrency directly
+    in_flight = 0
+    max_in_flight = 0
+    _in_flight_lock = threading.Lock()
+
+    def __init__(self, api_key=None, fixtures_dir=None, latency=None, jitter=None, error_rate=None, seed=None):
+        self.fixtures_dir = fixtures_path(fixtures_dir)
+        self.latency = latency if latency is not None else getattr(settings, 'GEMINI_FAKE_LATENCY_SECONDS', 0.0)
+        self.jitter = jitter if jitter is not None else getattr(settings, 'GEMINI_FAKE_JITTER_SECONDS', 0.0)
+        self.error_rate = error_rate if error_rate is not None else getattr(settings, 'GEMINI_FAKE_ERROR_RATE', 0.0)
+        self.random = random.Random(seed)
+        self.fail_next = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._fixtures = self._load_fixtures()
+
+    def _load_fixtures(self):
+        fixtures = {}
+        if self.fixtures_dir.is_dir():
+            for path in sorted(self.fixtures_dir.glob('*.json')):
+                data = json.loads(path.read_text())
+                # Validate against the same schema the real API is held to
+                fixtures[path.stem] = CalendarResponse.model_validate(data).model_dump()
+        return fixtures
+
+    def _response_for(self, prepared):
+        key = image_key(prepared)
+        if key in self._fixtures:
+            return copy.deepcopy(self._fixtures[key])
+        if not self._fixtures:
+            raise ImproperlyConfigured(f"No Gemini fixtures found in {self.fixtures_dir}")
+        keys = list(self._fixtures)
+        return copy.deepcopy(self._fixtures[keys[int(key, 16) % len(keys)]])
+
+    def _next_call(self):
+        """
+        Counts the call and decides its latency and whether it fails.
+        """
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+            if self.fail_next:
+                self.fail_next -= 1
+                fail = True
+            else:
+                fail = self.random.random() < self.error_rate
+        return delay, fail
+
+    @classmethod
+    @contextmanager
+    def _running(cls):
+        with cls._in_flight_lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            yield
+        finally:
+            with cls._in_flight_lock:
+                cls.in_flight -= 1
+
+    def extract(self, prepared, prompt_text):
+        delay, fail = self._next_call()
+        with self._running():
+            if delay:
+                time.sleep(delay)
+        if fail:
+            raise FakeGeminiError("Injected Gemini failure (503 UNAVAILABLE)")
+        return self._response_for(prepared)
+
+    async def aextract(self, prepared, prompt_text):
+        delay, fail = self._next_call()
+        with self._running():
+            if delay:
+                await asyncio.sleep(delay)
+        if fail:
+            raise FakeGeminiError("Injected Gemini failure (503 UNAVAILABLE)")
+        return self._response_for(prepared)
+
+
+class RecordingGeminiBackend(GeminiBackend):
+    """
+    Calls the real API and records each response as a replayable fixture.
+    """
+
+    def __init__(self, api_key=None, fixtures_dir=None):
+        super().__init__(api_key=api_key)
+        self.fixtures_dir = fixtures_path(fixtures_dir)
+
+    def _record(self, prepared, result):
+        self.fixtures_dir.mkdir(parents=True, exist_ok=True)
+        path = self.fixtures_dir / f"{image_key(prepared)}.json"
+        path.write_text(json.dumps(result, indent=2))
+        return result
+
+    def extract(self, prepared, prompt_text):
+        return self._record(prepared, super().extract(prepared, prompt_text))
+
+    async def aextract(self, prepared, prompt_text):
+        return self._record(prepared, await super().aextract(prepared, prompt_text))
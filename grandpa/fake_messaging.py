@@ -0,0 +1,182 @@
+"""
+In-process stand-in for the Twilio client (see notifications.messaging_client).
+
+FakeTwilioClient implements the small part of the Conversations API the notification
+path uses: fetch/create a conversation, list/add participants and create messages.
+It keeps everything in memory, records each message and participant, counts API calls
+by operation, and can simulate latency, provider rate limiting (429) and failures
+(500), so send_next_day_events, the recipient group fan-out and `bench_notifications`
+run without network access or a Twilio account.
+
+Enable with e.g. TWILIO_CLIENT_BACKEND=grandpa.fake_messaging.FakeTwilioClient.
+"""
+import itertools
+import random
+import threading
+import time
+from collections import Counter, deque
+from types import SimpleNamespace
+from django.conf import settings
+from twilio.base.exceptions import TwilioRestException
+
+
+class FakeConversation:
+    def __init__(self, sid, unique_name, friendly_name):
+        self.sid = sid
+        self.unique_name = unique_name
+        self.friendly_name = friendly_name
+        self.participants = {}  # address -> participant sid
+        self.messages = []  # (message sid, body)
+
+
+class FakeTwilioClient:
+    requires_credentials = False
+
+    def __init__(self, account_sid=None, auth_token=None, latency=None, jitter=None, max_rps=None, error_rate=None, seed=None):
+        self.latency = latency if latency is not None else getattr(settings, 'TWILIO_FAKE_LATENCY_SECONDS', 0.0)
+        self.jitter = jitter if jitter is not None else getattr(settings, 'TWILIO_FAKE_JITTER_SECONDS', 0.0)
+        # Requests per rolling second before answering 429; 0 for no limit
+        self.max_rps = max_rps if max_rps is not None else getattr(settings, 'TWILIO_FAKE_MAX_RPS', 0)
+        self.error_rate = error_rate if error_rate is not None else getattr(settings, 'TWILIO_FAKE_ERROR_RATE', 0.0)
+        self.random = random.Random(seed)
+        self.fail_next = 0
+        # Calls to answer with a 429 regardless of max_rps, for deterministic retry tests
+        self.throttle_next = 0
+        self.calls = Counter()
+        self.throttled = 0  # calls answered with a 429
+        self.conversation_store = {}  # sid -> FakeConversation
+        self._ids = itertools.count(1)
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self.conversations = SimpleNamespace(v1=SimpleNamespace(conversations=_ConversationList(self)))
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def sid(self, prefix):
+        return f"{prefix}{next(self._ids):032x}"
+
+    def find(self, sid_or_unique_name):
+        for conversation in self.conversation_store.values():
+            if sid_or_unique_name in (conversation.sid, conversation.unique_name):
+                return conversation
+        return None
+
+    def request(self, operation, uri):
+        """
+        Counts the call, waits out its latency and raises any injected failure.
+        """
+        with self._lock:
+            self.calls[operation] += 1
+            now = time.monotonic()
+            while self._recent and self._recent[0] <= now - 1:
+                self._recent.popleft()
+            throttled = bool(self.max_rps) and len(self._recent) >= self.max_rps
+            if self.throttle_next:
+                self.throttle_next -= 1
+                throttled = True
+            if throttled:
+                self.throttled += 1
+            else:
+                self._recent.append(now)
+            if self.fail_next:
+                self.fail_next -= 1
+                fail = True
+            else:
+                fail = self.random.random() < self.error_rate
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+        if delay:
+            time.sleep(delay)
+        if throttled:
+            raise TwilioRestException(429, uri, "Too Many Requests", code=20429, method='POST')
+        if fail:
+            raise TwilioRestException(500, uri, "Injected Twilio failure", method='POST')
+
+
+class _ConversationList:
+    def __init__(self, client):
+        self.client = client
+
+    def __call__(self, sid_or_unique_name):
+        return _ConversationContext(self.client, sid_or_unique_name)
+
+    def create(self, friendly_name=None, unique_name=None):
+        self.client.request('conversations.create', '/Conversations')
+        with self.client._lock:
+            if unique_name and self.client.find(unique_name):
+                raise TwilioRestException(409, '/Conversations', "Conversation with provided unique name already exists",
+                                          code=50353, method='POST')
+            conversation = FakeConversation(self.client.sid('CH'), unique_name, friendly_name)
+            self.client.conversation_store[conversation.sid] = conversation
+        return _ConversationContext(self.client, conversation.sid)
+
+
+class _ConversationContext:
+    """
+    Like Twilio's ConversationContext: building it makes no request, calls on it do.
+    """
+
+    def __init__(self, client, sid_or_unique_name):
+        self.client = client
+        self.key = sid_or_unique_name
+        self.participants = _Participants(self)
+        self.messages = _Messages(self)
+
+    @property
+    def sid(self):
+        return self.resolve().sid
+
+    def resolve(self):
+        conversation = self.client.find(self.key)
+        if conversation is None:
+            raise TwilioRestException(404, f'/Conversations/{self.key}', "The requested resource was not found",
+                                      code=20404)
+        return conversation
+
+    def fetch(self):
+        self.client.request('conversations.fetch', f'/Conversations/{self.key}')
+        return _ConversationContext(self.client, self.resolve().sid)
+
+
+class _Participants:
+    def __init__(self, context):
+        self.context = context
+
+    def list(self):
+        client = self.context.client
+        client.request('participants.list', f'/Conversations/{self.context.key}/Participants')
+        with client._lock:
+            conversation = self.context.resolve()
+            return [
+                SimpleNamespace(sid=sid, messaging_binding={'type': 'sms', 'address': address})
+                for address, sid in conversation.participants.items()
+            ]
+
+    def create(self, messaging_binding_address=None, messaging_binding_proxy_address=None):
+        client = self.context.client
+        uri = f'/Conversations/{self.context.key}/Participants'
+        client.request('participants.create', uri)
+        with client._lock:
+            conversation = self.context.resolve()
+            if messaging_binding_address in conversation.participants:
+                raise TwilioRestException(409, uri, "A participant with the provided address already exists",
+                                          code=50416, method='POST')
+            sid = client.sid('MB')
+            conversation.participants[messaging_binding_address] = sid
+        return SimpleNamespace(sid=sid, messaging_binding={'type': 'sms', 'address': messaging_binding_address})
+
+
+class _Messages:
+    def __init__(self, context):
+        self.context = context
+
+    def create(self, body=None):
+        client = self.context.client
+        client.request('messages.create', f'/Conversations/{self.context.key}/Messages')
+        with client._lock:
+            conversation = self.context.resolve()
+            sid = client.sid('IM')
+            conversation.messages.append((sid, body))
+        return SimpleNamespace(sid=sid, body=body)
@@ -0,0 +1,113 @@
+"""
+Daily events fan-out to every active RecipientGroup.
+
+Tomorrow's events for all calendars are read in one query and each distinct message
+is formatted once. Groups are then sent in parallel, with every API call (sends and
+conversation syncs alike) taking a token from one shared bucket, so the request rate
+towards Twilio stays within TWILIO_SEND_RATE however many groups there are. A 429
+is retried with exponential backoff (see notifications.twilio_call).
+"""
+import datetime
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from .models import CalendarEvent, RecipientGroup
+from .notifications import TokenBucket, format_events_message, send_message
+
+MessageEvent = namedtuple('MessageEvent', ['all_day', 'hour', 'minute', 'am_pm', 'title'])
+
+
+@dataclass
+class GroupResult:
+    group: str
+    recipients: int
+    events: int
+    status: str  # 'sent', 'skipped' or 'failed'
+    sid: str = ''
+    error: str = ''
+    seconds: float = 0.0
+
+
+@dataclass
+class FanoutReport:
+    results: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def count(self, status):
+        return sum(1 for r in self.results if r.status == status)
+
+    @property
+    def messages_per_second(self):
+        return self.count('sent') / self.elapsed if self.elapsed else 0.0
+
+
+def build_messages(target_date, groups):
+    """
+    Returns {group.pk: (event_count, message)} for every group with events on
+    target_date, from a single query over that day's events.
+    """
+    rows = [
+        (calendar_name, MessageEvent(*fields))
+        for calendar_name, *fields in CalendarEvent.objects.filter(event_date=target_date)
+        .order_by(*CalendarEvent.DAY_ORDERING)
+        .values_list('calendar_month__calendar', 'all_day', 'hour', 'minute', 'am_pm', 'title')
+    ]
+
+    messages, formatted = {}, {}
+    for group in groups:
+        names = frozenset(group.calendars) if group.calendars else None
+        if names not in formatted:
+            # Filtering keeps the query's order, so mixed calendars need no re-sort
+            events = [e for name, e in rows if names is None or name in names]
+            formatted[names] = (len(events), format_events_message(target_date, events) if events else None)
+        if formatted[names][1]:
+            messages[group.pk] = formatted[names]
+    return messages
+
+
+def fan_out(client, groups=None, target_date=None):
+    """
+    Sends tomorrow's events (or target_date's) to every active recipient group.
+    Returns a FanoutReport with a GroupResult per group.
+    """
+    if target_date is None:
+        target_date = (timezone.now() + datetime.timedelta(days=1)).date()
+    if groups is None:
+        groups = RecipientGroup.objects.filter(active=True)
+    groups = list(groups)
+
+    messages = build_messages(target_date, groups)
+    bucket = TokenBucket(getattr(settings, 'TWILIO_SEND_RATE', 10), getattr(settings, 'TWILIO_SEND_BURST', 10))
+
+    def deliver(group):
+        try:
+            return deliver_group(group)
+        finally:
+            # Pool threads each open their own connection (conversation state lookups)
+            connection.close()
+
+    def deliver_group(group):
+        numbers = group.participant_numbers()
+        if group.pk not in messages:
+            return GroupResult(group.name, len(numbers), 0, 'skipped')
+        event_count, body = messages[group.pk]
+        started = time.monotonic()
+        try:
+            sid = send_message(client, group.conversation_name, group.name, numbers, body, throttle=bucket.acquire)
+        except Exception as e:
+            return GroupResult(group.name, len(numbers), event_count, 'failed', error=str(e) or e.__class__.__name__,
+                               seconds=time.monotonic() - started)
+        return GroupResult(group.name, len(numbers), event_count, 'sent', sid=sid,
+                           seconds=time.monotonic() - started)
+
+    report = FanoutReport()
+    started = time.monotonic()
+    if groups:
+        with ThreadPoolExecutor(max_workers=getattr(settings, 'TWILIO_SEND_CONCURRENCY', 4)) as pool:
+            report.results = list(pool.map(deliver, groups))
+    report.elapsed = time.monotonic() - started
+    return report
@@ -1,11 +1,22 @@
 import os
 import json
+import hashlib
+import re
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from google import genai
 from google.genai import types
+from asgiref.sync import async_to_sync, sync_to_async
 from django.conf import settings
+from django.utils.module_loading import import_string
 from datetime import datetime
 from pydantic import BaseModel, Field
 from typing import List, Optional
+from . import hedging, metrics
+from .imaging import prepare_image, split_week_rows, PreparedImage
 
 class CalendarEvent(BaseModel):
     day: int = Field(..., description="Day of the month (1-31)")
@@ -24,38 +35,11 @@ class CalendarResponse(BaseModel):
     year: Optional[int] = Field(None, description="Year (4 digits)")
     events: List[CalendarEvent] = Field(default_factory=list, description="List of events found")
     notes_or_announcements: Optional[List[str]] = Field(None, description="List of notes or announcements found not tied to a specific day")
-class CalendarProcessor:
-    def __init__(self, api_key=None):
-        self.api_key = api_key or getattr(settings, 'GOOGLE_API_KEY', None)
-        if not self.api_key:
-            # We allow initialization without key, but processing will fail
-            pass
-        else:
-            self.client = genai.Client(api_key=self.api_key)
-
-    def process_image(self, image_path):
-        """
-        Uploads an image to Gemini and extracts calendar events using Structured Outputs.
-        """
-        if not self.api_key:
-             return {
-                "successfully_parsed": False,
-                "error": "GOOGLE_API_KEY not configured.",
-                "month": None,
-                "year": None,
-                "events": []
-            }
 
-        try:
-            # 1. Upload File (Best Practice: Use client.files.upload)
-            # This handles large files better and returns a file reference URI
-            file_ref = self.client.files.upload(file=image_path)
-            
-            # The prompt configuration
-            current_month = datetime.now().month
-            current_year = datetime.now().year
+# Using model='gemini-3-pro-preview' as requested and verified.
+MODEL_NAME = "gemini-3-pro-preview"
 
-            prompt_text = f"""
+PROMPT_TEMPLATE = """
             Analyze this image of a calendar. 
             Identify the month and year. Extract all events written on the days and sort them by day, hour, and minute, with all-day events last in the day. For the event title, make sure it matches exactly as the image shows.
             
@@ -73,54 +57,369 @@ class CalendarProcessor:
             
             Defaults if not visible: Month {current_month}, Year {current_year}.
             """
-            
-            # 2. Use Structured Outputs with Pydantic Schema
-            # Using model='gemini-3-pro-preview' as requested and verified.
-            model_name = "gemini-3-pro-preview"
-            
-            # Configure generation with schema
-            # We enable "thinking" by using a model that supports it (gemini-3-pro-preview does)
-            # and we can encourage it via the prompt or config if explicit thinking params exist.
-            # Currently for gemini-3-pro-preview, 'thinking' is often implicit or enabled via specific config if available.
-            # We will rely on the prompt's instruction to "Double-check" which aligns with thinking models.
-            
+
+# Appended to the prompt for tiled extraction, where each image is one week row
+TILE_PROMPT_SUFFIX = """
+            This image shows the calendar's header followed by a SINGLE week row of the grid.
+            Use the header only to identify the month, year and weekday columns, and extract
+            only the events written in the week row.
+            """
+
+
+def build_prompt():
+    now = datetime.now()
+    return PROMPT_TEMPLATE.format(current_month=now.month, current_year=now.year)
+
+
+def prompt_version():
+    """
+    Short hash of everything that shapes a parse result: backend, model, prompt,
+    response schema and preprocessing settings. Cached results are only reused for the same version.
+    """
+    parts = [
+        getattr(settings, 'GEMINI_BACKEND', 'grandpa.gemini.GeminiBackend'),
+        MODEL_NAME,
+        PROMPT_TEMPLATE,
+        json.dumps(CalendarResponse.model_json_schema(), sort_keys=True),
+        str(getattr(settings, 'GEMINI_IMAGE_MAX_EDGE', None)),
+        str(getattr(settings, 'GEMINI_IMAGE_FORMAT', None)),
+        str(getattr(settings, 'GEMINI_IMAGE_QUALITY', None)),
+        str(getattr(settings, 'GEMINI_IMAGE_DESKEW', None)),
+        TILE_PROMPT_SUFFIX if getattr(settings, 'GEMINI_TILED_EXTRACTION', False) else '',
+    ]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()[:16]
+
+
+def _event_key(event):
+    text = event.get('original_text') or event.get('title') or ''
+    return (event.get('day'), re.sub(r'\s+', ' ', text).strip().casefold())
+
+
+def merge_results(results):
+    """
+    Merges per-tile CalendarResponse dicts: month/year by majority vote, events
+    deduplicated by (day, original_text), notes deduplicated in order.
+    Any failed tile fails the whole parse so the job is retried.
+    """
+    for result in results:
+        if result.get('error'):
+            return result
+
+    parsed = [r for r in results if r.get('successfully_parsed')]
+    month_votes = Counter(r.get('month') for r in parsed if r.get('month'))
+    year_votes = Counter(r.get('year') for r in parsed if r.get('year'))
+
+    events, seen = [], set()
+    notes, seen_notes = [], set()
+    for result in results:
+        for event in result.get('events') or []:
+            key = _event_key(event)
+            if key not in seen:
+                seen.add(key)
+                events.append(event)
+        for note in result.get('notes_or_announcements') or []:
+            if note not in seen_notes:
+                seen_notes.add(note)
+                notes.append(note)
+
+    return {
+        "successfully_parsed": bool(parsed),
+        "month": month_votes.most_common(1)[0][0] if month_votes else None,
+        "year": year_votes.most_common(1)[0][0] if year_votes else None,
+        "events": events,
+        "notes_or_announcements": notes or None,
+    }
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key):
+    """
+    Returns the process-wide genai.Client for `api_key`, creating it on first use.
+    Sharing one client keeps its HTTP connection pools (sync and `.aio`) warm, so
+    each parse doesn't pay for a new session and TLS handshake.
+    Its HTTP timeout is the per-attempt deadline (see hedging.py), so an attempt
+    abandoned by a worker thread still ends.
+    """
+    timeout = getattr(settings, 'GEMINI_REQUEST_TIMEOUT_SECONDS', 120)
+    key = (api_key, timeout)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = genai.Client(
+                    api_key=api_key,
+                    http_options=types.HttpOptions(timeout=int(timeout * 1000)),
+                )
+    return client
+
+
+def generation_config():
+    # Configure generation with schema
+    # We enable "thinking" by using a model that supports it (gemini-3-pro-preview does)
+    # and we can encourage it via the prompt or config if explicit thinking params exist.
+    # Currently for gemini-3-pro-preview, 'thinking' is often implicit or enabled via specific config if available.
+    # We will rely on the prompt's instruction to "Double-check" which aligns with thinking models.
+    return types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=CalendarResponse, # Pass the Pydantic model directly!
+        # "thinking_config": {"include_thoughts": True} # If supported by the SDK/Model version for debugging, but currently we just want better results.
+    )
+
+
+def response_to_dict(response):
+    """
+    Converts a structured-output response into a CalendarResponse dict.
+    """
+    if response.parsed:
+        # response.parsed is already a CalendarResponse object (or dict depending on client version)
+        # We can convert it to a dict for our Django model
+        if hasattr(response.parsed, 'model_dump'):
+            return response.parsed.model_dump()
+        elif hasattr(response.parsed, 'dict'):
+            return response.parsed.dict()
+        else:
+            return response.parsed # Already a dict?
+
+    # Fallback if parsed isn't populated for some reason
+    text = response.text
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return json.loads(text.strip())
+
+
+def error_result(error, reason='other'):
+    return {
+        "successfully_parsed": False,
+        "error": error,
+        # One of metrics.FAILURE_REASONS
+        "error_reason": reason,
+        "month": None,
+        "year": None,
+        "events": []
+    }
+
+
+@dataclass
+class ParseOutcome:
+    result: dict
+    prepared: Optional[PreparedImage] = None
+    cache_hit: bool = False
+
+
+class GeminiBackend:
+    """
+    Extraction backend that calls the real Gemini API.
+
+    A backend turns one prepared image plus a prompt into a CalendarResponse dict via
+    `extract` (and `aextract` for asyncio callers). CalendarProcessor loads the class
+    named by settings.GEMINI_BACKEND, so tests and benchmarks can swap in the offline
+    fake from grandpa/fake_gemini.py.
+    """
+    requires_api_key = True
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key
+        self.client = get_client(api_key)
+
+    def extract(self, prepared, prompt_text):
+        """
+        Runs one structured-output call over a prepared image and returns the result dict.
+        Raises on API errors.
+        """
+        from . import uploads
+
+        # 1. Upload (Best Practice: Use client.files.upload), or reuse an earlier upload
+        # of the same bytes (see uploads.py). Returns a file reference URI.
+        upload, reused = uploads.acquire(self.client, prepared)
+
+        # 2. Use Structured Outputs with Pydantic Schema
+        try:
+            response = self._generate(upload, prompt_text)
+        except Exception as e:
+            if not (reused and uploads.is_missing(e)):
+                raise
+            # The reused file was deleted or expired server-side: upload it again, once
+            uploads.forget(upload)
+            upload, _ = uploads.acquire(self.client, prepared)
+            response = self._generate(upload, prompt_text)
+
+        # 3. Handle Response
+        return response_to_dict(response)
+
+    def _generate(self, upload, prompt_text):
+        from . import uploads
+        with metrics.timed('grandpa_gemini_generate_seconds'):
             response = self.client.models.generate_content(
-                model=model_name,
+                model=MODEL_NAME,
                 contents=[
-                    file_ref, # Pass the file reference directly
+                    uploads.part(upload), # Pass the file reference directly
                     prompt_text
                 ],
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json",
-                    response_schema=CalendarResponse, # Pass the Pydantic model directly!
-                    # "thinking_config": {"include_thoughts": True} # If supported by the SDK/Model version for debugging, but currently we just want better results.
-                )
+                config=generation_config()
             )
-            
-            # 3. Handle Response
-            if response.parsed:
-                # response.parsed is already a CalendarResponse object (or dict depending on client version)
-                # We can convert it to a dict for our Django model
-                if hasattr(response.parsed, 'model_dump'):
-                    return response.parsed.model_dump()
-                elif hasattr(response.parsed, 'dict'):
-                    return response.parsed.dict()
-                else:
-                    return response.parsed # Already a dict?
-
-            # Fallback if parsed isn't populated for some reason
-            text = response.text
-            if text.startswith("```json"):
-                text = text[7:]
-            if text.endswith("```"):
-                text = text[:-3]
-            return json.loads(text.strip())
+        metrics.record_usage(getattr(response, 'usage_metadata', None))
+        return response
 
+    async def aextract(self, prepared, prompt_text):
+        from . import uploads
+        upload, reused = await uploads.aacquire(self.client, prepared)
+        try:
+            response = await self._agenerate(upload, prompt_text)
         except Exception as e:
-            return {
-                "successfully_parsed": False,
-                "error": str(e),
-                "month": None,
-                "year": None,
-                "events": []
-            }
+            if not (reused and uploads.is_missing(e)):
+                raise
+            await sync_to_async(uploads.forget)(upload)
+            upload, _ = await uploads.aacquire(self.client, prepared)
+            response = await self._agenerate(upload, prompt_text)
+        return response_to_dict(response)
+
+    async def _agenerate(self, upload, prompt_text):
+        from . import uploads
+        # The metrics store is a cache (file I/O, never the DB), so it is called directly
+        with metrics.timed('grandpa_gemini_generate_seconds'):
+            response = await self.client.aio.models.generate_content(
+                model=MODEL_NAME,
+                contents=[uploads.part(upload), prompt_text],
+                config=generation_config()
+            )
+        metrics.record_usage(getattr(response, 'usage_metadata', None))
+        return response
+
+
+def load_backend(api_key=None):
+    backend_class = import_string(getattr(settings, 'GEMINI_BACKEND', 'grandpa.gemini.GeminiBackend'))
+    if backend_class.requires_api_key and not api_key:
+        return None
+    return backend_class(api_key=api_key)
+
+
+class CalendarProcessor:
+    def __init__(self, api_key=None, backend=None):
+        self.api_key = api_key or getattr(settings, 'GOOGLE_API_KEY', None)
+        # We allow initialization without key, but processing with the real backend will fail
+        self.backend = backend or load_backend(self.api_key)
+
+    def parse(self, image_path, prepared=None):
+        """
+        Parses an image, serving repeat uploads of the same photo from the parse cache.
+        Concurrent parses of the same image share a single model call. Pass `prepared`
+        if the image was already preprocessed (e.g. in a process pool by bulk_parse).
+        """
+        from .parse_cache import cached_parse
+        outcome = ParseOutcome(result={})
+
+        def parse_uncached():
+            outcome.prepared = prepared or self.prepare_image(image_path)
+            return self.process_image(image_path, prepared=outcome.prepared)
+
+        outcome.result, outcome.cache_hit = cached_parse(image_path, parse_uncached)
+        return outcome
+
+    def prepare_image(self, image_path):
+        """
+        Orients, straightens, downsizes and re-encodes the image before upload.
+        """
+        return prepare_image(image_path)
+
+    def process_image(self, image_path, prepared=None):
+        """
+        Uploads an image to Gemini and extracts calendar events using Structured Outputs.
+        Pass `prepared` to reuse an already preprocessed image.
+        """
+        if self.backend is None:
+            return error_result("GOOGLE_API_KEY not configured.", 'not_configured')
+
+        try:
+            # 1. Preprocess (orientation, deskew, downsizing; see imaging.py)
+            prepared = prepared or self.prepare_image(image_path)
+
+            # Optionally split the month grid into week rows and parse them concurrently
+            if getattr(settings, 'GEMINI_TILED_EXTRACTION', False):
+                tiles = split_week_rows(prepared)
+                if tiles:
+                    return self._extract_tiles(tiles)
+
+            return self._extract(prepared, build_prompt())
+
+        except Exception as e:
+            return error_result(str(e), metrics.failure_reason(e))
+
+    def _extract(self, prepared, prompt_text):
+        """
+        Runs one structured-output call over a prepared image and returns the result dict,
+        with a deadline, retries on transient errors and optional hedging (hedging.py).
+        Raises on API errors.
+        """
+        return hedging.call(lambda: self.backend.extract(prepared, prompt_text))
+
+    def _extract_tiles(self, tiles):
+        """
+        Parses week-row tiles concurrently and merges them into a single result, so
+        latency tracks the slowest row rather than the whole page.
+        """
+        prompt_text = build_prompt() + TILE_PROMPT_SUFFIX
+        max_workers = getattr(settings, 'GEMINI_TILE_CONCURRENCY', 6)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(lambda tile: self._extract(tile, prompt_text), tiles))
+        return merge_results(results)
+
+
+class AsyncCalendarProcessor(CalendarProcessor):
+    """
+    asyncio flavour of CalendarProcessor built on the SDK's `client.aio` interface.
+    Many parses can be in flight on one event loop, sharing the process-wide
+    client's connection pool.
+    """
+
+    async def parse(self, image_path):
+        from .parse_cache import cached_parse
+        outcome = ParseOutcome(result={})
+
+        async def parse_uncached():
+            outcome.prepared = await asyncio.to_thread(self.prepare_image, image_path)
+            return await self.process_image(image_path, prepared=outcome.prepared)
+
+        # The cache does blocking DB work and thread-based single-flight, so it runs in a
+        # worker thread; async_to_sync hops back onto this loop for the model call.
+        outcome.result, outcome.cache_hit = await sync_to_async(cached_parse, thread_sensitive=False)(
+            image_path, async_to_sync(parse_uncached)
+        )
+        return outcome
+
+    async def process_image(self, image_path, prepared=None):
+        if self.backend is None:
+            return error_result("GOOGLE_API_KEY not configured.", 'not_configured')
+
+        try:
+            # Preprocessing is CPU-bound; keep it off the event loop
+            prepared = prepared or await asyncio.to_thread(self.prepare_image, image_path)
+
+            if getattr(settings, 'GEMINI_TILED_EXTRACTION', False):
+                tiles = await asyncio.to_thread(split_week_rows, prepared)
+                if tiles:
+                    return await self._extract_tiles(tiles)
+
+            return await self._extract(prepared, build_prompt())
+
+        except Exception as e:
+            return error_result(str(e), metrics.failure_reason(e))
+
+    async def _extract(self, prepared, prompt_text):
+        return await hedging.acall(lambda: self.backend.aextract(prepared, prompt_text))
+
+    async def _extract_tiles(self, tiles):
+        prompt_text = build_prompt() + TILE_PROMPT_SUFFIX
+        semaphore = asyncio.Semaphore(getattr(settings, 'GEMINI_TILE_CONCURRENCY', 6))
+
+        async def extract(tile):
+            async with semaphore:
+                return await self._extract(tile, prompt_text)
+
+        results = await asyncio.gather(*(extract(tile) for tile in tiles))
+        return merge_results(results)
@@ -0,0 +1,217 @@
+"""
+Deadlines, retries and request hedging for extraction calls.
+
+Every model call made by CalendarProcessor goes through `call` (or `acall`):
+
+- Each attempt has a deadline (GEMINI_REQUEST_TIMEOUT_SECONDS). The real backend
+  also hands it to the SDK's HTTP client, so an abandoned thread ends on its own.
+- Transient failures (429, 5xx, timeouts; see metrics.failure_reason) are retried
+  up to GEMINI_MAX_RETRIES times with full-jitter exponential backoff.
+- With GEMINI_HEDGING, a second identical request is sent once the first has run
+  longer than the GEMINI_HEDGE_PERCENTILE of recent attempt latencies. Whichever
+  succeeds first wins; the other is cancelled (asyncio) or abandoned (threads).
+
+Attempt durations go to the grandpa_gemini_attempt_seconds histogram on /metrics, so
+the percentile can be tuned from data, and into an in-process window that the
+hedge delay is computed from.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from django.conf import settings
+from django.db import connections
+from . import metrics
+from .utils import percentile
+
+TRANSIENT_REASONS = ('rate_limited', 'timeout', 'server_error')
+
+
+class DeadlineExceeded(TimeoutError):
+    """No attempt finished within GEMINI_REQUEST_TIMEOUT_SECONDS."""
+
+
+class LatencyWindow:
+    """
+    The most recent successful attempt durations, for picking the hedge delay.
+    """
+
+    def __init__(self, size=200):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def hedge_delay(self):
+        """
+        The configured percentile of recent latencies, or GEMINI_HEDGE_AFTER_SECONDS
+        until GEMINI_HEDGE_MIN_SAMPLES attempts have been seen.
+        """
+        with self.lock:
+            samples = list(self.samples)
+        if len(samples) < getattr(settings, 'GEMINI_HEDGE_MIN_SAMPLES', 20):
+            return getattr(settings, 'GEMINI_HEDGE_AFTER_SECONDS', 30)
+        return percentile(samples, getattr(settings, 'GEMINI_HEDGE_PERCENTILE', 95))
+
+
+latencies = LatencyWindow()
+
+
+def backoff(attempt):
+    """Full jitter: uniform in [0, base * 2^attempt], capped at GEMINI_RETRY_MAX_BACKOFF_SECONDS."""
+    base = getattr(settings, 'GEMINI_RETRY_BACKOFF_SECONDS', 1)
+    cap = getattr(settings, 'GEMINI_RETRY_MAX_BACKOFF_SECONDS', 30)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def is_transient(exc):
+    return metrics.failure_reason(exc) in TRANSIENT_REASONS
+
+
+def _record(start, outcome):
+    elapsed = time.perf_counter() - start
+    metrics.observe('grandpa_gemini_attempt_seconds', elapsed)
+    metrics.inc('grandpa_gemini_attempts_total', outcome)
+    if outcome == 'ok':
+        latencies.add(elapsed)
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    try:
+        result = fn()
+    except Exception:
+        _record(start, 'error')
+        raise
+    finally:
+        # Attempts run in throwaway threads: close any connection the backend's ORM
+        # work opened here (e.g. uploads.acquire), as nothing else ever would
+        connections.close_all()
+    _record(start, 'ok')
+    return result
+
+
+def _hedged(fn):
+    """
+    One deadline-bounded call of `fn`, hedged with a second call if enabled.
+    """
+    timeout = getattr(settings, 'GEMINI_REQUEST_TIMEOUT_SECONDS', 120)
+    hedge_at = latencies.hedge_delay() if getattr(settings, 'GEMINI_HEDGING', False) else None
+    start = time.monotonic()
+
+    # Not a `with` block: leaving it would wait for an attempt that is being abandoned
+    pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='gemini-attempt')
+    pending = {pool.submit(_timed, fn)}
+    error = None
+    try:
+        while pending:
+            elapsed = time.monotonic() - start
+            if elapsed >= timeout:
+                for _ in pending:
+                    metrics.inc('grandpa_gemini_attempts_total', 'abandoned')
+                raise DeadlineExceeded(f"Gemini request exceeded {timeout}s")
+            wait_for = timeout - elapsed
+            if hedge_at is not None:
+                wait_for = min(wait_for, max(0, hedge_at - elapsed))
+
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for _ in pending:
+                        metrics.inc('grandpa_gemini_attempts_total', 'abandoned')
+                    return future.result()
+                error = future.exception()
+
+            if hedge_at is not None and pending and time.monotonic() - start >= hedge_at:
+                metrics.inc('grandpa_gemini_hedges_total')
+                pending.add(pool.submit(_timed, fn))
+                hedge_at = None
+        raise error
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def call(fn):
+    """
+    Calls `fn` (a no-argument model call) with deadlines, retries and hedging.
+    """
+    attempt = 0
+    while True:
+        try:
+            return _hedged(fn)
+        except Exception as e:
+            if not is_transient(e) or attempt >= getattr(settings, 'GEMINI_MAX_RETRIES', 2):
+                raise
+            metrics.inc('grandpa_gemini_retries_total')
+            time.sleep(backoff(attempt))
+            attempt += 1
+
+
+async def _atimed(fn):
+    start = time.perf_counter()
+    try:
+        result = await fn()
+    except asyncio.CancelledError:
+        _record(start, 'cancelled')
+        raise
+    except Exception:
+        _record(start, 'error')
+        raise
+    _record(start, 'ok')
+    return result
+
+
+async def _ahedged(fn):
+    timeout = getattr(settings, 'GEMINI_REQUEST_TIMEOUT_SECONDS', 120)
+    hedge_at = latencies.hedge_delay() if getattr(settings, 'GEMINI_HEDGING', False) else None
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    pending = {asyncio.ensure_future(_atimed(fn))}
+    error = None
+    try:
+        while pending:
+            elapsed = loop.time() - start
+            if elapsed >= timeout:
+                raise DeadlineExceeded(f"Gemini request exceeded {timeout}s")
+            wait_for = timeout - elapsed
+            if hedge_at is not None:
+                wait_for = min(wait_for, max(0, hedge_at - elapsed))
+
+            done, pending = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+
+            if hedge_at is not None and pending and loop.time() - start >= hedge_at:
+                metrics.inc('grandpa_gemini_hedges_total')
+                pending.add(asyncio.ensure_future(_atimed(fn)))
+                hedge_at = None
+        raise error
+    finally:
+        # The loser (or every attempt, past the deadline) is cancelled outright
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def acall(fn):
+    """
+    asyncio flavour of `call`; `fn` returns an awaitable.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await _ahedged(fn)
+        except Exception as e:
+            if not is_transient(e) or attempt >= getattr(settings, 'GEMINI_MAX_RETRIES', 2):
+                raise
+            metrics.inc('grandpa_gemini_retries_total')
+            await asyncio.sleep(backoff(attempt))
+            attempt += 1
@@ -0,0 +1,215 @@
+"""
+Image preprocessing applied to calendar photos before they are sent to Gemini.
+
+Phone photos are often 4-12 MB HEIC/JPEG files at far higher resolution than the
+model needs. We fix the EXIF orientation, straighten slightly rotated shots, trim
+flat margins, downsize to a maximum long edge and re-encode to a compact JPEG/WebP.
+"""
+import io
+from dataclasses import dataclass
+from django.conf import settings
+from PIL import Image, ImageChops, ImageOps
+from pillow_heif import register_heif_opener
+
+# Lets Image.open read HEIC/HEIF photos straight from iPhones
+register_heif_opener()
+
+MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'WEBP': 'image/webp',
+    'PNG': 'image/png',
+}
+
+# Deskew search: +/- this many degrees, in DESKEW_STEP increments
+DESKEW_MAX_ANGLE = 4.0
+DESKEW_STEP = 0.5
+
+
+@dataclass
+class PreparedImage:
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    original_bytes: int
+
+    @property
+    def processed_bytes(self):
+        return len(self.data)
+
+
+def _projection_score(gray, angle):
+    """
+    Variance of the row means after rotating by `angle`.
+    Calendar grid lines line up with pixel rows when the image is straight, which
+    makes the horizontal projection profile as "spiky" as it can get.
+    """
+    rotated = gray.rotate(angle, resample=Image.BILINEAR, fillcolor=255)
+    # Resizing to a single column with a box filter averages each row
+    rows = list(rotated.resize((1, rotated.height), Image.BOX).getdata())
+    mean = sum(rows) / len(rows)
+    return sum((r - mean) ** 2 for r in rows) / len(rows)
+
+
+def detect_skew(image):
+    """
+    Returns the rotation (in degrees) that best straightens the calendar grid, or 0.
+    """
+    gray = image.convert('L')
+    gray.thumbnail((600, 600))
+
+    baseline = _projection_score(gray, 0)
+    best_angle, best_score = 0.0, baseline
+    steps = int(DESKEW_MAX_ANGLE / DESKEW_STEP)
+    for i in range(-steps, steps + 1):
+        angle = i * DESKEW_STEP
+        if angle == 0:
+            continue
+        score = _projection_score(gray, angle)
+        if score > best_score:
+            best_angle, best_score = angle, score
+
+    # Ignore marginal wins; they are usually noise rather than real rotation
+    if best_score < baseline * 1.05:
+        return 0.0
+    return best_angle
+
+
+def trim_margins(image, tolerance=24):
+    """
+    Crops flat borders (scanner bed, table top) that match the top-left corner color.
+    """
+    background = Image.new(image.mode, image.size, image.getpixel((0, 0)))
+    diff = ImageChops.difference(image, background).convert('L')
+    diff = diff.point(lambda p: 255 if p > tolerance else 0)
+    bbox = diff.getbbox()
+    if not bbox:
+        return image
+
+    # Don't crop away most of the image because of an odd corner pixel
+    left, top, right, bottom = bbox
+    if (right - left) * (bottom - top) < image.width * image.height * 0.5:
+        return image
+    return image.crop(bbox)
+
+
+def prepare_image(image_path, max_long_edge=None, image_format=None, quality=None, deskew=None):
+    """
+    Loads an image from disk and returns a PreparedImage ready for upload.
+    """
+    max_long_edge = max_long_edge or getattr(settings, 'GEMINI_IMAGE_MAX_EDGE', 2048)
+    image_format = (image_format or getattr(settings, 'GEMINI_IMAGE_FORMAT', 'JPEG')).upper()
+    quality = quality or getattr(settings, 'GEMINI_IMAGE_QUALITY', 85)
+    if deskew is None:
+        deskew = getattr(settings, 'GEMINI_IMAGE_DESKEW', True)
+
+    with open(image_path, 'rb') as f:
+        original = f.read()
+
+    image = Image.open(io.BytesIO(original))
+    image = ImageOps.exif_transpose(image)
+    image = image.convert('RGB')
+
+    # Downsize first so the remaining steps work on far fewer pixels
+    if max(image.size) > max_long_edge:
+        image.thumbnail((max_long_edge, max_long_edge), Image.LANCZOS)
+
+    if deskew:
+        angle = detect_skew(image)
+        if angle:
+            image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=(255, 255, 255))
+
+    image = trim_margins(image)
+    # Rotating with expand=True can push the long edge back over the limit
+    image.thumbnail((max_long_edge, max_long_edge), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=quality, optimize=True)
+
+    return PreparedImage(
+        data=buffer.getvalue(),
+        mime_type=MIME_TYPES.get(image_format, 'application/octet-stream'),
+        width=image.width,
+        height=image.height,
+        original_bytes=len(original),
+    )
+
+
+def detect_week_rows(image, min_rows=4, max_rows=6):
+    """
+    Finds the week rows of a month grid from its horizontal ruling lines.
+    Returns (header_bottom, [(top, bottom), ...]) in image pixels, or None if the
+    grid can't be found confidently.
+    """
+    gray = image.convert('L')
+    scale = min(1.0, 1000 / gray.height)
+    small = gray.resize((max(1, int(gray.width * scale)), max(1, int(gray.height * scale))), Image.BOX)
+    rows = list(small.resize((1, small.height), Image.BOX).getdata())
+
+    ordered = sorted(rows)
+    median, darkest = ordered[len(ordered) // 2], ordered[0]
+    if median - darkest < 40:
+        return None
+    threshold = median - (median - darkest) * 0.5
+
+    # Group consecutive dark rows into ruling lines, keeping each line's center
+    lines = []
+    start = None
+    for y, value in enumerate(rows + [255]):
+        if value < threshold and start is None:
+            start = y
+        elif value >= threshold and start is not None:
+            lines.append((start + y - 1) / 2)
+            start = None
+
+    bands = [(top, bottom) for top, bottom in zip(lines, lines[1:]) if bottom - top > 2]
+    if not bands:
+        return None
+
+    # Week rows are the tall bands; the weekday-name strip and stray lines are short
+    tallest = max(bottom - top for top, bottom in bands)
+    week_rows = [(top, bottom) for top, bottom in bands if bottom - top >= tallest * 0.5]
+    if not min_rows <= len(week_rows) <= max_rows:
+        return None
+
+    def to_full(y):
+        return int(round(y / scale))
+
+    header_bottom = to_full(week_rows[0][0])
+    return header_bottom, [(to_full(top), min(image.height, to_full(bottom) + 1)) for top, bottom in week_rows]
+
+
+def split_week_rows(prepared, image_format=None, quality=None):
+    """
+    Splits a prepared month image into one PreparedImage per week row. Each tile keeps
+    the calendar header (month title, weekday names) stacked above its row so the model
+    can still read the month, year and day-of-week columns. Returns [] if no grid is found.
+    """
+    image_format = (image_format or getattr(settings, 'GEMINI_IMAGE_FORMAT', 'JPEG')).upper()
+    quality = quality or getattr(settings, 'GEMINI_IMAGE_QUALITY', 85)
+
+    image = Image.open(io.BytesIO(prepared.data)).convert('RGB')
+    grid = detect_week_rows(image)
+    if not grid:
+        return []
+
+    header_bottom, week_rows = grid
+    header = image.crop((0, 0, image.width, header_bottom))
+
+    tiles = []
+    for top, bottom in week_rows:
+        row = image.crop((0, top, image.width, bottom))
+        tile = Image.new('RGB', (image.width, header.height + row.height), (255, 255, 255))
+        tile.paste(header, (0, 0))
+        tile.paste(row, (0, header.height))
+
+        buffer = io.BytesIO()
+        tile.save(buffer, format=image_format, quality=quality, optimize=True)
+        tiles.append(PreparedImage(
+            data=buffer.getvalue(),
+            mime_type=MIME_TYPES.get(image_format, 'application/octet-stream'),
+            width=tile.width,
+            height=tile.height,
+            original_bytes=prepared.processed_bytes,
+        ))
+    return tiles
@@ -0,0 +1,136 @@
+"""
+Database-backed job queue for calendar image parsing.
+
+Uploads enqueue a ParseJob; `manage.py run_parse_worker` claims jobs with
+SELECT ... FOR UPDATE SKIP LOCKED, holds them under a lease (visibility timeout)
+and retries failures with exponential backoff. A job whose worker died keeps its
+expired lease and is simply claimed again by the next worker.
+"""
+import random
+import socket
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import CalendarMonth, ParseJob
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_parse(calendar_month):
+    """
+    Queues a parse of the CalendarMonth's image.
+    """
+    return ParseJob.objects.create(
+        calendar_month=calendar_month,
+        max_attempts=getattr(settings, 'PARSE_JOB_MAX_ATTEMPTS', 5),
+    )
+
+
+def claim_jobs(worker_id, limit, lease_seconds=None, ids=None):
+    """
+    Leases up to `limit` runnable jobs for this worker (only those in `ids`, if given).
+    Runnable means pending and due, or running with an expired lease (crashed worker).
+    """
+    if limit <= 0:
+        return []
+
+    lease_seconds = lease_seconds or getattr(settings, 'PARSE_JOB_LEASE_SECONDS', 600)
+    now = timezone.now()
+    claimed = []
+
+    with transaction.atomic():
+        candidates = (
+            ParseJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                Q(status=ParseJob.STATUS_PENDING, available_at__lte=now) |
+                Q(status=ParseJob.STATUS_RUNNING, leased_until__lt=now)
+            )
+            .order_by('available_at', 'id')
+        )
+        if ids is not None:
+            candidates = candidates.filter(pk__in=ids)
+        candidates = candidates[:limit]
+
+        for job in candidates:
+            if job.attempts >= job.max_attempts:
+                # The worker holding this job died on its last attempt
+                _mark_failed(job, job.last_error or "Worker lease expired on final attempt.")
+                continue
+
+            job.status = ParseJob.STATUS_RUNNING
+            job.attempts += 1
+            job.locked_by = worker_id
+            job.leased_until = now + timedelta(seconds=lease_seconds)
+            job.save(update_fields=['status', 'attempts', 'locked_by', 'leased_until'])
+            claimed.append(job)
+
+    return claimed
+
+
+def retry_delay(attempts):
+    """
+    Exponential backoff with jitter for the given (1-based) attempt number.
+    """
+    base = getattr(settings, 'PARSE_JOB_RETRY_BACKOFF_SECONDS', 30)
+    cap = getattr(settings, 'PARSE_JOB_MAX_BACKOFF_SECONDS', 3600)
+    delay = min(cap, base * (2 ** (attempts - 1)))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _owned(job):
+    # Only the worker still holding the lease may finish the job
+    return ParseJob.objects.filter(
+        pk=job.pk,
+        status=ParseJob.STATUS_RUNNING,
+        locked_by=job.locked_by,
+        attempts=job.attempts,
+    )
+
+
+def _mark_failed(job, error):
+    ParseJob.objects.filter(pk=job.pk).update(
+        status=ParseJob.STATUS_FAILED,
+        last_error=error,
+        leased_until=None,
+        finished_at=timezone.now(),
+    )
+    error_data = {"successfully_parsed": False, "error": error, "status": "failed"}
+    CalendarMonth.objects.filter(pk=job.calendar_month_id).update(parsed_data=error_data, updated_at=timezone.now())
+
+
+def run_job(job, prepared=None):
+    """
+    Runs one claimed job and records the outcome. Returns the job's new status.
+    `prepared` is the month's image, already preprocessed.
+    """
+    try:
+        calendar_month = CalendarMonth.objects.get(pk=job.calendar_month_id)
+        CalendarMonth._process_image_background(calendar_month.pk, calendar_month.image.path, prepared=prepared)
+    except Exception as e:
+        error = str(e) or e.__class__.__name__
+        if job.attempts >= job.max_attempts:
+            if _owned(job).exists():
+                _mark_failed(job, error)
+            return ParseJob.STATUS_FAILED
+
+        _owned(job).update(
+            status=ParseJob.STATUS_PENDING,
+            last_error=error,
+            leased_until=None,
+            available_at=timezone.now() + timedelta(seconds=retry_delay(job.attempts)),
+        )
+        return ParseJob.STATUS_PENDING
+
+    _owned(job).update(
+        status=ParseJob.STATUS_SUCCEEDED,
+        last_error='',
+        leased_until=None,
+        finished_at=timezone.now(),
+    )
+    return ParseJob.STATUS_SUCCEEDED
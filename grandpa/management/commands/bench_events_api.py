@@ -0,0 +1,87 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+from grandpa.api import EVENTS_ORDERING, events_queryset
+from grandpa.benchmarks import measure, summarize, format_summary
+from grandpa.models import CalendarEvent
+from grandpa.synthetic import generate_calendar_data
+
+
+def legacy_range_queryset(start_date, end_date):
+    """
+    The pre-event_date /api/events range query: an OR of (year, month) pairs over a join.
+    """
+    q_filter = Q()
+    curr = start_date.replace(day=1)
+    while curr <= end_date.replace(day=1):
+        q_filter |= Q(calendar_month__year=curr.year, calendar_month__month=curr.month)
+        curr = curr.replace(year=curr.year + 1, month=1) if curr.month == 12 else curr.replace(month=curr.month + 1)
+    return (CalendarEvent.objects.select_related('calendar_month').filter(q_filter)
+            .order_by('calendar_month__year', 'calendar_month__month', 'day', 'hour', 'minute'))
+
+
+def legacy_week_queryset(start_date):
+    q_filter = Q()
+    for offset in range(7):
+        d = start_date + timedelta(days=offset)
+        q_filter |= Q(calendar_month__year=d.year, calendar_month__month=d.month, day=d.day)
+    return (CalendarEvent.objects.select_related('calendar_month').filter(q_filter)
+            .order_by('calendar_month__year', 'calendar_month__month', 'day', 'hour', 'minute'))
+
+
+def ordered(qs):
+    return qs.order_by(*EVENTS_ORDERING)
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks /api/events queries over synthetic data (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=int, default=5)
+        parser.add_argument('--events-per-day', type=int, default=6)
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        start_year = 2020
+        with transaction.atomic():
+            months, events = generate_calendar_data(start_year, options['years'], options['events_per_day'])
+            with connection.cursor() as cursor:
+                table = CalendarEvent._meta.db_table
+                cursor.execute(f"ANALYZE {table}")
+            self.stdout.write(f'Generated {months} months / {events} events')
+
+            mid_year = start_year + options['years'] // 2
+            range_start, range_end = date(mid_year, 5, 26), date(mid_year, 7, 7)
+            week_start = date(mid_year, 6, 28)
+
+            scenarios = [
+                ('range (FullCalendar month view)',
+                 lambda: list(legacy_range_queryset(range_start, range_end)),
+                 lambda: list(ordered(events_queryset(start=range_start.isoformat(), end=range_end.isoformat())))),
+                ('week',
+                 lambda: list(legacy_week_queryset(week_start)),
+                 lambda: list(ordered(events_queryset(scope='week', year=mid_year, month=6, day=28)))),
+                ('day',
+                 lambda: list(CalendarEvent.objects.select_related('calendar_month').filter(
+                     calendar_month__year=mid_year, calendar_month__month=6, day=28)),
+                 lambda: list(ordered(events_queryset(year=mid_year, month=6, day=28)))),
+                ('year',
+                 lambda: list(CalendarEvent.objects.select_related('calendar_month').filter(
+                     calendar_month__year=mid_year)),
+                 lambda: list(ordered(events_queryset(year=mid_year)))),
+            ]
+
+            for label, legacy, current in scenarios:
+                with CaptureQueriesContext(connection) as legacy_queries:
+                    legacy()
+                with CaptureQueriesContext(connection) as current_queries:
+                    current()
+                before = summarize(measure(legacy, options['iterations'], warmup=2))
+                after = summarize(measure(current, options['iterations'], warmup=2))
+                self.stdout.write(self.style.MIGRATE_HEADING(label))
+                self.stdout.write('  ' + format_summary(f'join + OR   ({len(legacy_queries)}q)', before))
+                self.stdout.write('  ' + format_summary(f'event_date  ({len(current_queries)}q)', after))
+
+            transaction.set_rollback(True)
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from grandpa.api import orjson
+from grandpa.benchmarks import api_client, get_ok, measure, summarize, format_summary
+from grandpa.synthetic import generate_calendar_data
+
+
+class Command(BaseCommand):
+    help = 'Compares /api/events (schema) with /api/events/feed (fast path) on synthetic data (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=int, default=2)
+        parser.add_argument('--events-per-day', type=int, default=8)
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        start_year = 2020
+        client = api_client()
+        self.stdout.write(f"JSON encoder for the fast path: {'orjson' if orjson else 'json (stdlib)'}")
+
+        with transaction.atomic():
+            _, events = generate_calendar_data(start_year, options['years'], options['events_per_day'])
+            self.stdout.write(f'Generated {events} events')
+
+            for label, query in [
+                ('year', f'year={start_year}'),
+                ('month range', f'start={start_year}-05-26&end={start_year}-07-07'),
+            ]:
+                rows = len(get_ok(client, f'/api/events/feed?{query}').json())
+                self.stdout.write(self.style.MIGRATE_HEADING(f'{label} ({rows} rows)'))
+                for path in ('/api/events', '/api/events/feed'):
+                    url = f'{path}?{query}'
+                    samples = measure(lambda: get_ok(client, url), options['iterations'], warmup=2)
+                    summary = summarize(samples)
+                    rows_per_sec = rows / (summary['mean_ms'] / 1000) if summary['mean_ms'] else 0
+                    self.stdout.write(f'  {format_summary(path.ljust(17), summary)} -> {rows_per_sec:,.0f} rows/sec')
+
+            transaction.set_rollback(True)
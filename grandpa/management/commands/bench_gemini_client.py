@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from google import genai
+from grandpa.benchmarks import measure, summarize, format_summary
+from grandpa.gemini import CalendarProcessor, GeminiBackend, MODEL_NAME, get_client
+
+
+class Command(BaseCommand):
+    help = 'Compares per-job Gemini client setup cost: a new client per job vs the shared process-wide client'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--live', action='store_true',
+                            help='Also make one lightweight API call per job (needs GOOGLE_API_KEY and network), '
+                                 'which includes connection setup and the TLS handshake')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        live = options['live']
+        api_key = settings.GOOGLE_API_KEY or 'benchmark-placeholder-key'
+        if live and not settings.GOOGLE_API_KEY:
+            self.stdout.write(self.style.ERROR('--live needs GOOGLE_API_KEY.'))
+            return
+
+        def per_job_client():
+            # What every job used to do: a brand new client (and HTTP session)
+            client = genai.Client(api_key=api_key)
+            if live:
+                client.models.get(model=MODEL_NAME)
+
+        def shared_client():
+            processor = CalendarProcessor(api_key=api_key, backend=GeminiBackend(api_key=api_key))
+            if live:
+                processor.backend.client.models.get(model=MODEL_NAME)
+
+        get_client(api_key)  # exclude the one-off creation from the shared numbers
+        warmup = 1 if live else 5
+        if live:
+            iterations = min(iterations, 20)
+        before = measure(per_job_client, iterations, warmup)
+        after = measure(shared_client, iterations, warmup)
+
+        self.stdout.write(format_summary('New client per job', summarize(before)))
+        self.stdout.write(format_summary('Shared client     ', summarize(after)))
+        saved_ms = (sum(before) - sum(after)) / iterations * 1000
+        self.stdout.write(self.style.SUCCESS(f'Setup saved per job: {saved_ms:.2f}ms'))
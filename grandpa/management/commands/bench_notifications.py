@@ -0,0 +1,109 @@
+import io
+import time
+import uuid
+from contextlib import redirect_stdout
+from datetime import date
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from grandpa.fake_messaging import FakeTwilioClient
+from grandpa.fanout import fan_out
+from grandpa.models import CalendarEvent, CalendarMonth, RecipientGroup, TwilioConversation
+from grandpa.notifications import TokenBucket, send_message
+
+# Far from any real calendar so the benchmark events don't show up on the site
+TARGET_DATE = date(2099, 1, 1)
+
+
+class Command(BaseCommand):
+    help = 'Measures send time and Twilio API calls per run for the notification path, against the in-process fake client'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', default='1,100,10000', help='Comma-separated recipient counts')
+        parser.add_argument('--group-size', type=int, default=100, help='Recipients per group in the fan-out scenario')
+        parser.add_argument('--latency', type=float, default=0.01, help='Simulated seconds per API call')
+        parser.add_argument('--max-rps', type=int, default=0, help='Simulated provider limit (429s above it); 0 for none')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of API calls that fail with a 500')
+        parser.add_argument('--rate', type=float, default=1000,
+                            help='Client-side limit on API calls/sec (TWILIO_SEND_RATE); pass the real value for real-world timings')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.prefix = f"bench-{uuid.uuid4().hex[:8]}"
+        counts = [int(n) for n in options['recipients'].split(',')]
+        rate = options['rate']
+
+        try:
+            # Everything written on this connection is rolled back, like run_benchmarks' data
+            # (and no snapshot rebuilds or cache bumps are scheduled for it)
+            with transaction.atomic():
+                month = CalendarMonth.objects.create(image='', calendar=self.prefix, year=TARGET_DATE.year,
+                                                     month=TARGET_DATE.month)
+                CalendarEvent.objects.bulk_create([
+                    CalendarEvent(calendar_month=month, day=TARGET_DATE.day, event_date=TARGET_DATE, hour=h, minute=0,
+                                  am_pm='am' if h < 12 else 'pm', title=f"Activity {h}", original_text='')
+                    for h in (9, 10, 11, 1, 2, 3)
+                ])
+                # self.stdout keeps the real stream; the per-participant prints go nowhere
+                with override_settings(TWILIO_SEND_RATE=rate, TWILIO_SEND_BURST=max(1, int(rate)),
+                                       TWILIO_RETRY_BACKOFF_SECONDS=0.05, TWILIO_PHONE_NUMBER='+15550000000'), \
+                        redirect_stdout(io.StringIO()):
+                    for count in counts:
+                        self.stdout.write(self.style.MIGRATE_HEADING(f'{count} recipients'))
+                        self.single_conversation(count)
+                        self.fan_out_groups(count)
+                transaction.set_rollback(True)
+        finally:
+            # Fan-out threads store conversation state on their own connections, outside the transaction
+            TwilioConversation.objects.filter(unique_name__startswith=self.prefix).delete()
+
+    def client(self):
+        return FakeTwilioClient(latency=self.options['latency'], max_rps=self.options['max_rps'],
+                                error_rate=self.options['error_rate'], seed=0)
+
+    def numbers(self, count, offset=0):
+        return [f"+1555{offset + i:07d}" for i in range(count)]
+
+    def report(self, label, client, seconds, recipients, extra=''):
+        calls = ', '.join(f'{op}={n}' for op, n in sorted(client.calls.items()))
+        self.stdout.write(
+            f'  {label:<28} {seconds:8.3f}s  {client.total_calls:6} API calls '
+            f'({client.total_calls / recipients:.2f}/recipient, {client.throttled} throttled){extra}\n    {calls}'
+        )
+
+    def single_conversation(self, count):
+        """One conversation holding every recipient, as send_next_day_events uses."""
+        name = f"{self.prefix}-single-{count}"
+        numbers = self.numbers(count)
+        body = "Benchmark message"
+        client = self.client()
+        throttle = TokenBucket(settings.TWILIO_SEND_RATE, settings.TWILIO_SEND_BURST).acquire
+        for label in ('conversation, cold', 'conversation, warm'):
+            client.calls.clear()
+            client.throttled = 0
+            started = time.monotonic()
+            try:
+                send_message(client, name, "Benchmark", numbers, body, throttle=throttle)
+                extra = ''
+            except Exception as e:
+                extra = f', failed: {e}'
+            self.report(label, client, time.monotonic() - started, count, extra)
+
+    def fan_out_groups(self, count):
+        """Recipients split into groups of --group-size, each with its own conversation."""
+        size = self.options['group_size']
+        groups = [
+            RecipientGroup.objects.create(
+                name=f"{self.prefix} {count}/{start}", conversation_name=f"{self.prefix}-{count}-{start}",
+                calendars=[self.prefix], participants='\n'.join(self.numbers(min(size, count - start), start)),
+            )
+            for start in range(0, count, size)
+        ]
+        client = self.client()
+        for label in (f'{len(groups)} groups, cold', f'{len(groups)} groups, warm'):
+            client.calls.clear()
+            client.throttled = 0
+            report = fan_out(client, groups=groups, target_date=TARGET_DATE)
+            extra = f", {report.count('sent')} sent, {report.count('failed')} failed, {report.messages_per_second:.1f} msg/s"
+            self.report(label, client, report.elapsed, count, extra)
@@ -0,0 +1,224 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from grandpa.benchmarks import format_summary, summarize
+from grandpa.imaging import prepare_image
+from grandpa.jobs import claim_jobs, default_worker_id, enqueue_parse, run_job
+from grandpa.models import CalendarMonth, ParseJob
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.heic', '.heif', '.webp'}
+
+
+class Checkpoint:
+    """
+    Per-item progress of a bulk run ({key: {"month": pk, "status": ...}}), saved
+    after every change so an interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, path, restart=False):
+        self.path = path
+        self.items = {}
+        if os.path.exists(path) and not restart:
+            with open(path) as f:
+                self.items = json.load(f)['items']
+
+    def update(self, key, **values):
+        self.items.setdefault(key, {}).update(values)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'updated_at': timezone.now().isoformat(), 'items': self.items}, f, indent=1)
+        # Atomic: a crash mid-write leaves the previous checkpoint intact
+        os.replace(tmp, self.path)
+
+
+class Command(BaseCommand):
+    help = ('Parses a directory of calendar photos (--ingest) or re-parses existing months (--reparse) '
+            'with a preprocessing process pool and bounded model concurrency; resumable')
+
+    def add_arguments(self, parser):
+        mode = parser.add_mutually_exclusive_group(required=True)
+        mode.add_argument('--ingest', metavar='DIR', help='Create and parse a month for every image in DIR')
+        mode.add_argument('--reparse', action='store_true', help='Re-parse existing months matching the filters')
+        parser.add_argument('--calendar', default=None,
+                            help='Calendar of the ingested months; with --reparse, only months of this calendar')
+        parser.add_argument('--year', type=int, default=None)
+        parser.add_argument('--month', type=int, default=None)
+        parser.add_argument('--failed-only', action='store_true', help='Only months that did not parse successfully')
+        parser.add_argument('--ids', type=int, nargs='+', default=None, help='Only these CalendarMonth ids')
+        parser.add_argument('--concurrency', type=int, default=getattr(settings, 'PARSE_WORKER_CONCURRENCY', 2),
+                            help='Model calls in flight at once')
+        parser.add_argument('--prepare-workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes preprocessing images (0: preprocess in the parsing threads)')
+        parser.add_argument('--checkpoint', default=None,
+                            help='Progress file (default: one per distinct command line under .bulk_parse/)')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+        parser.add_argument('--retry-failed', action='store_true', help='Also redo items that failed in an earlier run')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds between checks while a job waits for its retry or another worker')
+
+    def handle(self, *args, **options):
+        checkpoint = Checkpoint(options['checkpoint'] or self.default_checkpoint(options), restart=options['restart'])
+        items = self.ingest_items(options) if options['ingest'] else self.reparse_items(options)
+
+        skip = {'succeeded'} | (set() if options['retry_failed'] else {'failed'})
+        todo = [(key, label, source) for key, label, source in items
+                if checkpoint.items.get(key, {}).get('status') not in skip]
+        self.stdout.write(f'{len(items)} items, {len(items) - len(todo)} already done '
+                          f'(checkpoint: {checkpoint.path})')
+        if not todo:
+            return
+
+        self.worker_id = f'{default_worker_id()}:bulk'
+        self.poll_interval = options['poll_interval']
+        concurrency = max(1, options['concurrency'])
+        prepare_workers = max(0, options['prepare_workers'])
+        statuses, durations = {}, []
+        start = time.perf_counter()
+
+        # spawn, not fork: children must not inherit (and later close) this process's DB connections
+        preparing = ProcessPoolExecutor(prepare_workers, mp_context=multiprocessing.get_context('spawn')) \
+            if prepare_workers else None
+        parsing = ThreadPoolExecutor(concurrency)
+        prepare_futures, parse_futures = {}, {}
+        queue = iter(todo)
+        try:
+            while True:
+                # Keep the model calls busy, with at most `concurrency` images prepared ahead
+                while len(prepare_futures) + len(parse_futures) < 2 * concurrency:
+                    item = next(queue, None)
+                    if item is None:
+                        break
+                    month = self.month_for(item, checkpoint, options)
+                    if preparing:
+                        prepare_futures[preparing.submit(prepare_image, month.image.path)] = (item, month)
+                    else:
+                        parse_futures[parsing.submit(self.parse, month, None)] = (item, time.perf_counter())
+
+                if not prepare_futures and not parse_futures:
+                    break
+                done, _ = wait([*prepare_futures, *parse_futures], return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in prepare_futures:
+                        item, month = prepare_futures.pop(future)
+                        # Unreadable image: let the job itself fail and record the error
+                        prepared = future.result() if future.exception() is None else None
+                        parse_futures[parsing.submit(self.parse, month, prepared)] = (item, time.perf_counter())
+                        continue
+
+                    (key, label, _), started = parse_futures.pop(future)
+                    try:
+                        status = future.result()
+                    except Exception as e:
+                        self.stdout.write(self.style.ERROR(f'{label} crashed: {e}'))
+                        status = 'crashed'
+                    checkpoint.update(key, status=status)
+                    statuses[status] = statuses.get(status, 0) + 1
+                    durations.append(time.perf_counter() - started)
+                    self.report_progress(label, status, durations[-1], len(durations), len(todo), start)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Interrupted; waiting for in-flight parses. Rerun the same command to resume.'))
+            for future in [*prepare_futures, *parse_futures]:
+                future.cancel()
+        finally:
+            parsing.shutdown(cancel_futures=True)
+            if preparing:
+                preparing.shutdown(cancel_futures=True)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {", ".join(f"{count} {status}" for status, count in sorted(statuses.items()))} '
+            f'in {elapsed:.1f}s ({len(durations) / elapsed * 60:.1f} images/min)'
+        ))
+        if durations:
+            self.stdout.write(format_summary('per image', summarize(durations)))
+
+    @staticmethod
+    def default_checkpoint(options):
+        # The same command line resumes the same run
+        selection = {k: options[k] for k in ('ingest', 'reparse', 'calendar', 'year', 'month', 'failed_only', 'ids')}
+        if selection['ingest']:
+            selection['ingest'] = str(Path(selection['ingest']).resolve())
+        digest = hashlib.sha1(json.dumps(selection, sort_keys=True).encode()).hexdigest()[:12]
+        return os.path.join(settings.BASE_DIR, '.bulk_parse', f"{'ingest' if options['ingest'] else 'reparse'}-{digest}.json")
+
+    def ingest_items(self, options):
+        directory = Path(options['ingest'])
+        if not directory.is_dir():
+            raise CommandError(f'{directory} is not a directory')
+        paths = sorted(p for p in directory.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+        return [(str(path.resolve()), path.name, path) for path in paths]
+
+    def reparse_items(self, options):
+        months = CalendarMonth.objects.exclude(image='').order_by('year', 'month', 'pk')
+        if options['calendar'] is not None:
+            months = months.filter(calendar=options['calendar'])
+        if options['year']:
+            months = months.filter(year=options['year'])
+        if options['month']:
+            months = months.filter(month=options['month'])
+        if options['failed_only']:
+            months = months.filter(successfully_parsed=False)
+        if options['ids']:
+            months = months.filter(pk__in=options['ids'])
+        return [(f'month:{month.pk}', str(month), month) for month in months]
+
+    def month_for(self, item, checkpoint, options):
+        """
+        The CalendarMonth to parse for an item: an ingested file's month is created
+        once (and found again on resume), so a rerun never duplicates it.
+        """
+        key, _, source = item
+        if isinstance(source, CalendarMonth):
+            return source
+        month = CalendarMonth.objects.filter(pk=checkpoint.items.get(key, {}).get('month')).first()
+        if month is None:
+            # Saving a new month with an image queues its parse job
+            month = CalendarMonth(calendar=options['calendar'] or '')
+            with open(source, 'rb') as f:
+                month.image.save(source.name, File(f), save=True)
+            checkpoint.update(key, month=month.pk, status='queued')
+        return month
+
+    def parse(self, month, prepared):
+        """
+        Runs the month's parse job here: an open one if there is one, else a new one.
+        Retries wait out the job's backoff; a job another worker holds is waited for.
+        Returns the job's final status.
+        """
+        try:
+            job = month.parse_jobs.filter(
+                status__in=[ParseJob.STATUS_PENDING, ParseJob.STATUS_RUNNING]
+            ).order_by('-created_at').first() or enqueue_parse(month)
+            # A bulk run means now, not after an earlier failure's backoff
+            ParseJob.objects.filter(pk=job.pk, status=ParseJob.STATUS_PENDING).update(available_at=timezone.now())
+            while True:
+                claimed = claim_jobs(self.worker_id, 1, ids=[job.pk])
+                if claimed:
+                    status = run_job(claimed[0], prepared=prepared)
+                else:
+                    status = ParseJob.objects.values_list('status', flat=True).get(pk=job.pk)
+                if status in (ParseJob.STATUS_SUCCEEDED, ParseJob.STATUS_FAILED):
+                    return status
+                time.sleep(self.poll_interval)
+        finally:
+            connection.close()
+
+    def report_progress(self, label, status, seconds, done, total, start):
+        elapsed = time.perf_counter() - start
+        rate = done / elapsed
+        eta = (total - done) / rate if rate else 0
+        style = self.style.SUCCESS if status == ParseJob.STATUS_SUCCEEDED else self.style.WARNING
+        self.stdout.write(style(
+            f'[{done}/{total}] {label}: {status} in {seconds:.1f}s '
+            f'({rate * 60:.1f} images/min, ~{eta:.0f}s left)'
+        ))
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from grandpa.models import GeminiUpload
+from grandpa.uploads import cleanup_with_default_client
+
+
+class Command(BaseCommand):
+    help = 'Deletes Gemini Files API uploads that are near expiry or no longer used (the parse worker also does this)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'GEMINI_UPLOAD_CLEANUP_BATCH', 100))
+        parser.add_argument('--keep-seconds', type=int, default=None,
+                            help='Delete uploads unused for this long (default: GEMINI_UPLOAD_KEEP_SECONDS)')
+        parser.add_argument('--all', action='store_true', help='Delete every tracked upload')
+
+    def handle(self, *args, **options):
+        keep_seconds = 0 if options['all'] else options['keep_seconds']
+        total_deleted = total_failed = 0
+        while True:
+            deleted, failed = cleanup_with_default_client(batch_size=options['batch_size'], keep_seconds=keep_seconds)
+            total_deleted += deleted
+            total_failed += failed
+            # A batch with failures would be picked again; leave those for the next run
+            if not deleted or failed:
+                break
+
+        remaining = GeminiUpload.objects.count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {total_deleted} uploads ({total_failed} failed, {remaining} still tracked).'
+        ))
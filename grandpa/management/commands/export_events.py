@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from grandpa.transfer import export_rows, open_stream
+
+
+class Command(BaseCommand):
+    help = 'Streams every calendar month and event to NDJSON (restore with import_events)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help='File to write, or - for stdout (default)')
+        parser.add_argument('--gzip', action='store_true', default=None,
+                            help='Compress with gzip (implied by an --output ending in .gz)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per cursor round-trip')
+
+    def handle(self, *args, **options):
+        with open_stream(options['output'], 'wb', compress=options['gzip']) as stream:
+            counts = export_rows(stream, chunk_size=options['chunk_size'])
+
+        # The summary goes to stderr so it doesn't end up in a piped export
+        self.stderr.write(self.style.SUCCESS(
+            f"Exported {counts['calendarmonth']} months / {counts['calendarevent']} events."
+        ))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from grandpa import snapshots
+from grandpa.caching import bump_events_version
+from grandpa.models import CalendarMonth
+from grandpa.synthetic import generate_calendar_data
+
+
+class Command(BaseCommand):
+    help = 'Creates synthetic parsed months and events (for local testing and benchmarks; not for production data)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-year', type=int, default=None, help='First year (default: this year)')
+        parser.add_argument('--years', type=int, default=1)
+        parser.add_argument('--events-per-day', type=int, default=6)
+        parser.add_argument('--all-day-rate', type=float, default=0.1, help='Share of days with an all-day event')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear', action='store_true', help='Delete previously generated synthetic months first')
+
+    def handle(self, *args, **options):
+        start_year = options['start_year'] or timezone.now().year
+
+        with transaction.atomic():
+            if options['clear']:
+                deleted, _ = CalendarMonth.objects.filter(parsed_data__synthetic=True).delete()
+                self.stdout.write(f'Deleted {deleted} synthetic rows.')
+
+            months, events = generate_calendar_data(
+                start_year, options['years'], options['events_per_day'],
+                seed=options['seed'], all_day_rate=options['all_day_rate'],
+            )
+
+            # bulk_create sends no signals, so refresh snapshots and cached text explicitly
+            for year in range(start_year, start_year + options['years']):
+                for month in range(1, 13):
+                    snapshots.schedule_rebuild(year, month)
+            transaction.on_commit(bump_events_version)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {months} months / {events} events ({start_year}-{start_year + options["years"] - 1}).'
+        ))
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from grandpa.transfer import import_rows, open_stream
+
+
+class Command(BaseCommand):
+    help = 'Loads an export_events NDJSON file (COPY on PostgreSQL) in one transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='File to read, or - for stdin')
+        parser.add_argument('--gzip', action='store_true', default=None,
+                            help='Input is gzip-compressed (implied by a name ending in .gz)')
+        parser.add_argument('--clear', action='store_true',
+                            help='Delete all existing months and events first (a full restore)')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            with open_stream(options['input'], 'rb', compress=options['gzip']) as stream:
+                counts = import_rows(stream, clear=options['clear'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        except IntegrityError as e:
+            raise CommandError(f'{e}\nThe export reuses existing ids; use --clear for a full restore.')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {counts['calendarmonth']} months / {counts['calendarevent']} events "
+            f"in {time.perf_counter() - start:.1f}s."
+        ))
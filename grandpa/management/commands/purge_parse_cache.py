@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from grandpa.models import ParseCacheEntry
+from grandpa.parse_cache import evict
+
+
+class Command(BaseCommand):
+    help = 'Evicts old or excess entries from the calendar parse result cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Delete every cached result')
+        parser.add_argument('--older-than-days', type=int, default=None,
+                            help='Delete entries unused for this many days (default: PARSE_CACHE_MAX_AGE_DAYS)')
+        parser.add_argument('--max-bytes', type=int, default=None,
+                            help='Trim least recently used entries to this total size (default: PARSE_CACHE_MAX_BYTES)')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            deleted, _ = ParseCacheEntry.objects.all().delete()
+        else:
+            deleted = evict(max_age_days=options['older_than_days'], max_bytes=options['max_bytes'])
+
+        remaining = ParseCacheEntry.objects.count()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} cached results ({remaining} remaining).'))
@@ -0,0 +1,113 @@
+import glob
+import json
+import os
+from collections import defaultdict
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from grandpa.utils import percentile
+
+
+class Command(BaseCommand):
+    help = 'Summarizes the QUERY_PROFILING log: slowest endpoints, query shapes and N+1 suspects'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=None,
+                            help='QUERY_PROFILING_LOG to read; every process\'s file (<log>.<pid>) is included')
+        parser.add_argument('--top', type=int, default=10)
+        parser.add_argument('--clear', action='store_true',
+                            help='After the report, remove the files of processes that have exited and empty the rest')
+
+    def files(self, path):
+        # One file per process (<path>.<pid>), each with its rotated-out <path>.<pid>.1
+        return sorted(glob.glob(f'{glob.escape(path)}.*'))
+
+    @staticmethod
+    def running(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def clear(self, path, files):
+        """
+        Removes the log files, except that a running process's current file is
+        emptied instead: it keeps appending to it, and a removed file would take
+        its records with it until the next rotation.
+        """
+        for name in files:
+            pid = name[len(path) + 1:]
+            if pid.isdigit() and self.running(int(pid)):
+                open(name, 'w').close()
+            else:
+                # Exited processes' files and every rotated-out <path>.<pid>.1
+                os.remove(name)
+        self.stdout.write(self.style.SUCCESS(f'Cleared {len(files)} files at {path}.*'))
+
+    def read(self, files):
+        for name in files:
+            with open(name) as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash mid-write
+                        continue
+
+    def handle(self, *args, **options):
+        path = options['log'] or getattr(settings, 'QUERY_PROFILING_LOG', '')
+        files = self.files(path) if path else []
+        if not files:
+            raise CommandError(f'No profile log at {path!r}; set QUERY_PROFILING=True and make some requests.')
+
+        endpoints = defaultdict(lambda: {'total_ms': [], 'db_ms': [], 'queries': []})
+        shapes = defaultdict(lambda: {'count': 0, 'ms': 0.0, 'routes': set()})
+        repeats = defaultdict(lambda: {'requests': 0, 'max_count': 0, 'routes': set()})
+        records = 0
+        for record in self.read(files):
+            records += 1
+            endpoint = endpoints[f"{record['method']} {record['route']}"]
+            endpoint['total_ms'].append(record['total_ms'])
+            endpoint['db_ms'].append(record['db_ms'])
+            endpoint['queries'].append(record['queries'])
+            for shape in record['shapes']:
+                entry = shapes[shape['sql']]
+                entry['count'] += shape['count']
+                entry['ms'] += shape['ms']
+                entry['routes'].add(record['route'])
+            for shape in record['repeated']:
+                entry = repeats[shape['sql']]
+                entry['requests'] += 1
+                entry['max_count'] = max(entry['max_count'], shape['count'])
+                entry['routes'].add(record['route'])
+
+        top = options['top']
+        self.stdout.write(f'{records} requests in {len(files)} files at {path}.*')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Slowest endpoints (by p95)'))
+        ranked = sorted(endpoints.items(), key=lambda item: -percentile(item[1]['total_ms'], 95))
+        for label, stats in ranked[:top]:
+            self.stdout.write(
+                f"  {label}: n={len(stats['total_ms'])} "
+                f"p50={percentile(stats['total_ms'], 50)}ms p95={percentile(stats['total_ms'], 95)}ms "
+                f"db p95={percentile(stats['db_ms'], 95)}ms queries max={max(stats['queries'])}"
+            )
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Query shapes by total time'))
+        for sql, stats in sorted(shapes.items(), key=lambda item: -item[1]['ms'])[:top]:
+            self.stdout.write(f"  {stats['ms']:.1f}ms over {stats['count']} runs ({', '.join(sorted(stats['routes']))})")
+            self.stdout.write(f"    {sql[:300]}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Repeated within one request (possible N+1)'))
+        if not repeats:
+            self.stdout.write('  none')
+        for sql, stats in sorted(repeats.items(), key=lambda item: -item[1]['max_count'])[:top]:
+            self.stdout.write(self.style.WARNING(
+                f"  up to {stats['max_count']}x in {stats['requests']} requests ({', '.join(sorted(stats['routes']))})"
+            ))
+            self.stdout.write(f"    {sql[:300]}")
+
+        if options['clear']:
+            self.clear(path, files)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db.models.functions import TruncMonth
+from grandpa.models import CalendarEvent, MonthSnapshot
+from grandpa.snapshots import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the pre-serialized month snapshots behind /api/events (e.g. after bulk writes that skip signals)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-encode even months that look current')
+
+    def handle(self, *args, **options):
+        months = set(
+            (d.year, d.month)
+            for d in CalendarEvent.objects.filter(event_date__isnull=False).order_by()
+            .annotate(period=TruncMonth('event_date')).values_list('period', flat=True).distinct()
+        )
+        # Months that had snapshots but may have lost all their events
+        months |= set(MonthSnapshot.objects.values_list('year', 'month').distinct())
+
+        for year, month in sorted(months):
+            rebuild(year, month, force=options['force'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt snapshots for {len(months)} months.'))
@@ -0,0 +1,121 @@
+import json
+import platform
+import subprocess
+from datetime import timedelta
+from pathlib import Path
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from grandpa.benchmarks import api_client, count_queries, get_ok, measure, summarize, format_summary
+from grandpa.fake_gemini import fixtures_path
+from grandpa.models import CalendarMonth
+from grandpa.notifications import build_next_day_message
+from grandpa.synthetic import generate_calendar_data
+from grandpa.utils import get_current_date
+from grandpa.views import get_events_text
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Runs the benchmark suite (events API, /messages text, SMS message building, parse ingestion) '
+            'over synthetic data, rolled back afterwards, and writes latency and query counts as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=int, default=2)
+        parser.add_argument('--events-per-day', type=int, default=6)
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default=None,
+                            help='Results file (default: .benchmarks/benchmark-<timestamp>.json)')
+        parser.add_argument('--compare', default=None, help='Earlier results file to compare against')
+
+    def handle(self, *args, **options):
+        today = get_current_date()
+        # Data runs up to the end of this year, so today, tomorrow and next month all have events
+        start_year = today.year - options['years'] + 1
+
+        with transaction.atomic():
+            months, events = generate_calendar_data(start_year, options['years'], options['events_per_day'],
+                                                    seed=options['seed'], all_day_rate=0.1)
+            self.stdout.write(f'Generated {months} months / {events} events')
+
+            results = {}
+            # Every scenario runs warmup + iterations + 1 (query count) times
+            for name, fn in self.scenarios(today, options['iterations'] + 3):
+                summary = summarize(measure(fn, options['iterations'], warmup=2))
+                # Counted after warmup: steady state, e.g. with month snapshots already built
+                summary['queries'] = count_queries(fn)
+                results[name] = summary
+                self.stdout.write(f"  {format_summary(name.ljust(26), summary)} queries={summary['queries']}")
+
+            transaction.set_rollback(True)
+
+        report = {
+            'timestamp': timezone.now().isoformat(),
+            'git_commit': git_commit(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'params': {k: options[k] for k in ('years', 'events_per_day', 'iterations', 'seed')},
+            'data': {'months': months, 'events': events, 'ingest_events': self.ingest_events},
+            'results': results,
+        }
+
+        output = Path(options['output'] or settings.BASE_DIR / '.benchmarks' /
+                      f"benchmark-{timezone.now():%Y%m%d-%H%M%S}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS(f'Wrote {output}'))
+
+        if options['compare']:
+            self.compare(json.loads(Path(options['compare']).read_text()), report)
+
+    def scenarios(self, today, runs):
+        client = api_client()
+        day = today.date()
+        range_start = day.replace(day=1) - timedelta(days=6)
+        # A fresh month per run: storing the same result again into one month is a no-op diff,
+        # and the scenario is meant to time creating the events
+        ingest_months = iter([CalendarMonth.objects.create(image='') for _ in range(runs)])
+        fixture = json.loads((fixtures_path() / 'january_2026.json').read_text())
+        self.ingest_events = len(fixture['events'])
+
+        return [
+            ('list_events.day', lambda: get_ok(client, '/api/events', {'year': day.year, 'month': day.month, 'day': day.day})),
+            ('list_events.week', lambda: get_ok(client, '/api/events', {'scope': 'week', 'year': day.year,
+                                                                         'month': day.month, 'day': day.day})),
+            ('list_events.range', lambda: get_ok(client, '/api/events', {'start': range_start.isoformat(),
+                                                                          'end': (range_start + timedelta(days=42)).isoformat()})),
+            ('list_events.year', lambda: get_ok(client, '/api/events', {'year': day.year})),
+            ('events_feed.range', lambda: get_ok(client, '/api/events/feed', {'start': range_start.isoformat(),
+                                                                               'end': (range_start + timedelta(days=42)).isoformat()})),
+            ('get_events_text', lambda: get_events_text(today, "today")),
+            ('build_next_day_message', lambda: build_next_day_message(timezone.now())),
+            ('ingest.store_parse_result', lambda: CalendarMonth.store_parse_result(next(ingest_months).pk, fixture)),
+        ]
+
+    def compare(self, before, after):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Compared with {before.get('git_commit') or '?'} ({before.get('timestamp')})"
+        ))
+        for name, current in after['results'].items():
+            previous = before.get('results', {}).get(name)
+            if not previous:
+                self.stdout.write(f'  {name.ljust(26)} (new)')
+                continue
+            change = (current['p50_ms'] - previous['p50_ms']) / previous['p50_ms'] * 100 if previous['p50_ms'] else 0
+            line = (f"  {name.ljust(26)} p50 {previous['p50_ms']}ms -> {current['p50_ms']}ms ({change:+.1f}%), "
+                    f"queries {previous['queries']} -> {current['queries']}")
+            regressed = change > 10 or current['queries'] > previous['queries']
+            self.stdout.write(self.style.WARNING(line) if regressed else line)
@@ -0,0 +1,91 @@
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from grandpa.jobs import claim_jobs, run_job, default_worker_id
+from grandpa.uploads import cleanup_with_default_client
+
+
+class Command(BaseCommand):
+    help = 'Runs a worker that processes queued calendar image parse jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=getattr(settings, 'PARSE_WORKER_CONCURRENCY', 2),
+                            help='Maximum number of jobs processed at once')
+        parser.add_argument('--lease-seconds', type=int, default=getattr(settings, 'PARSE_JOB_LEASE_SECONDS', 600),
+                            help='Visibility timeout; jobs held longer than this are handed to another worker')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait between polls when the queue is empty')
+        parser.add_argument('--worker-id', default=None)
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is drained instead of polling forever')
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        worker_id = options['worker_id'] or default_worker_id()
+        self.stopping = False
+
+        def request_stop(signum, frame):
+            self.stdout.write('Stopping after in-flight jobs finish...')
+            self.stopping = True
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        self.stdout.write(f'Parse worker {worker_id} started (concurrency={concurrency})')
+
+        in_flight = {}
+        # Gemini upload cleanup runs in its own thread so it never delays jobs
+        cleanup_interval = getattr(settings, 'GEMINI_UPLOAD_CLEANUP_INTERVAL_SECONDS', 600)
+        next_cleanup, cleanup = time.monotonic(), None
+        with ThreadPoolExecutor(max_workers=concurrency) as executor, \
+                ThreadPoolExecutor(max_workers=1) as cleanup_executor:
+            while True:
+                if not self.stopping and cleanup_interval and time.monotonic() >= next_cleanup \
+                        and (cleanup is None or cleanup.done()):
+                    cleanup = cleanup_executor.submit(self._cleanup_uploads)
+                    next_cleanup = time.monotonic() + cleanup_interval
+
+                if not self.stopping:
+                    for job in claim_jobs(worker_id, concurrency - len(in_flight), options['lease_seconds']):
+                        self.stdout.write(f'Claimed job {job.id} (attempt {job.attempts}/{job.max_attempts})')
+                        in_flight[executor.submit(self._run, job)] = job
+
+                if not in_flight:
+                    if self.stopping or options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, _ = wait(in_flight, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = in_flight.pop(future)
+                    try:
+                        status = future.result()
+                    except Exception as e:
+                        self.stdout.write(self.style.ERROR(f'Job {job.id} crashed: {e}'))
+                        continue
+                    style = self.style.SUCCESS if status == 'succeeded' else self.style.WARNING
+                    self.stdout.write(style(f'Job {job.id} {status}'))
+
+        self.stdout.write(self.style.SUCCESS('Parse worker stopped.'))
+
+    def _cleanup_uploads(self):
+        try:
+            deleted, failed = cleanup_with_default_client()
+            if deleted or failed:
+                self.stdout.write(f'Cleaned up {deleted} Gemini uploads ({failed} failed)')
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Gemini upload cleanup failed: {e}'))
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _run(job):
+        try:
+            return run_job(job)
+        finally:
+            # Each pool thread has its own connection; don't leave it open between jobs
+            connection.close()
@@ -1,10 +1,15 @@
 from django.core.management.base import BaseCommand
-from grandpa.notifications import send_next_day_events
+from grandpa.fanout import fan_out
+from grandpa.models import RecipientGroup
+from grandpa.notifications import messaging_client, send_next_day_events
 
 class Command(BaseCommand):
-    help = 'Sends the next day events to the Twilio conversation'
+    help = 'Sends the next day events to the Twilio conversation, or to every active recipient group if there are any'
 
     def handle(self, *args, **options):
+        if RecipientGroup.objects.filter(active=True).exists():
+            return self.send_to_groups()
+
         self.stdout.write('Sending next day events...')
         try:
             sid = send_next_day_events()
@@ -14,3 +19,24 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.WARNING('No message sent (maybe no events or error).'))
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Error: {e}'))
+
+    def send_to_groups(self):
+        client = messaging_client()
+        if client is None:
+            self.stdout.write(self.style.ERROR('Twilio credentials missing in settings.'))
+            return
+
+        self.stdout.write('Sending next day events to recipient groups...')
+        report = fan_out(client)
+
+        for r in report.results:
+            line = f'  {r.group}: {r.status} ({r.recipients} recipients, {r.events} events'
+            if r.status != 'skipped':
+                line += f', {r.seconds:.2f}s'
+            line += f') {r.sid or r.error}'
+            style = {'sent': self.style.SUCCESS, 'failed': self.style.ERROR}.get(r.status, self.style.WARNING)
+            self.stdout.write(style(line.rstrip()))
+
+        summary = (f"{report.count('sent')} sent, {report.count('skipped')} skipped, {report.count('failed')} failed "
+                   f"in {report.elapsed:.2f}s ({report.messages_per_second:.1f} messages/sec)")
+        self.stdout.write((self.style.ERROR if report.count('failed') else self.style.SUCCESS)(summary))
@@ -0,0 +1,196 @@
+"""
+Ingestion pipeline metrics, served in Prometheus text format at /metrics.
+
+Values live in the cache named by METRICS_CACHE, so the parse worker's observations
+show up on every web worker's /metrics (the same reason the events version lives
+there, see caching.py). That cache should be a dedicated alias with TIMEOUT None and
+room for every key (see the 'metrics' alias in settings): an evicted key silently
+resets a counter. Point METRICS_CACHE at a locmem cache to keep them per
+process instead. Updates are read-modify-write on backends without atomic incr
+(the file cache), so simultaneous observations may occasionally lose one; that's
+acceptable at ingestion rates.
+
+Metrics are declared up front with fixed label values so every series can be read
+back with one get_many, without keeping an index of keys.
+"""
+import json
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import caches
+
+KEY_PREFIX = 'grandpa:metrics:'
+
+# Sums are stored as integers (micro-units) so backends with integer-only incr work
+SUM_SCALE = 1_000_000
+
+SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+BYTES_BUCKETS = (64 * 1024, 256 * 1024, 512 * 1024, 1024 ** 2, 2 * 1024 ** 2, 5 * 1024 ** 2, 10 * 1024 ** 2, 20 * 1024 ** 2)
+EVENTS_BUCKETS = (0, 5, 10, 25, 50, 75, 100, 150, 200, 300)
+
+FAILURE_REASONS = (
+    'not_configured', 'rate_limited', 'timeout', 'server_error', 'client_error',
+    'invalid_response', 'db_error', 'other',
+)
+
+HISTOGRAMS = {
+    'grandpa_gemini_upload_bytes': ('Size of images uploaded to Gemini', BYTES_BUCKETS),
+    'grandpa_gemini_upload_seconds': ('Time spent uploading an image to Gemini', SECONDS_BUCKETS),
+    'grandpa_gemini_generate_seconds': ('Time spent in the generate_content call', SECONDS_BUCKETS),
+    'grandpa_gemini_attempt_seconds': ('Duration of each extraction attempt, including hedges (see hedging.py)', SECONDS_BUCKETS),
+    'grandpa_parse_seconds': ('End-to-end parse time of one image, including cache hits', SECONDS_BUCKETS),
+    'grandpa_parse_db_write_seconds': ('Time spent storing a parse result and its events', SECONDS_BUCKETS),
+    'grandpa_parse_events': ('Events extracted per successfully parsed image', EVENTS_BUCKETS),
+}
+
+COUNTERS = {
+    'grandpa_gemini_tokens_total': (
+        'Tokens reported in Gemini usage metadata',
+        ('kind', ('prompt', 'candidates', 'thoughts', 'total')),
+    ),
+    'grandpa_gemini_attempts_total': (
+        'Extraction attempts by outcome (abandoned: outlived by a winner or the deadline)',
+        ('outcome', ('ok', 'error', 'cancelled', 'abandoned')),
+    ),
+    'grandpa_gemini_upload_reuse_total': (
+        'Image uploads served by an earlier Files API upload (hit) or uploaded (miss)',
+        ('result', ('hit', 'miss')),
+    ),
+    'grandpa_gemini_hedges_total': ('Hedged second requests sent', None),
+    'grandpa_gemini_retries_total': ('Extraction calls retried after a transient failure', None),
+    'grandpa_parse_results_total': (
+        'Parsed images by outcome (unparsed: no calendar was recognized)',
+        ('outcome', ('parsed', 'unparsed', 'failed')),
+    ),
+    'grandpa_parse_event_changes_total': (
+        'Event rows written by re-parses (see reconcile.py)',
+        ('change', ('created', 'updated', 'deleted')),
+    ),
+    'grandpa_parse_failures_total': ('Failed parses by reason', ('reason', FAILURE_REASONS)),
+    'grandpa_parse_cache_hits_total': ('Parses served from the parse result cache', None),
+}
+
+
+def store():
+    return caches[getattr(settings, 'METRICS_CACHE', 'metrics')]
+
+
+def _incr(cache, key, delta):
+    # add() is a no-op if the key exists; incr() raises if it doesn't
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Evicted in between: start over from this observation
+        cache.set(key, delta, None)
+        return
+    # BaseCache.incr (used by the file cache) re-set()s the value with the alias'
+    # default TIMEOUT; make the key permanent again (atomic backends just keep it)
+    cache.touch(key, None)
+
+
+def inc(name, label=None, amount=1):
+    """Adds `amount` to a counter (`label` is its single label's value, if it has one)."""
+    _incr(store(), f"{KEY_PREFIX}{name}:{label or ''}", int(amount))
+
+
+def observe(name, value):
+    """Records one observation in a histogram."""
+    _, buckets = HISTOGRAMS[name]
+    cache = store()
+    # Per-bucket (non-cumulative) counts; the text format's cumulative counts are built on read
+    bucket = next((str(b) for b in buckets if value <= b), '+Inf')
+    _incr(cache, f"{KEY_PREFIX}{name}:bucket:{bucket}", 1)
+    _incr(cache, f"{KEY_PREFIX}{name}:sum", round(value * SUM_SCALE))
+    _incr(cache, f"{KEY_PREFIX}{name}:count", 1)
+
+
+@contextmanager
+def timed(name):
+    """Observes the duration of the block (also when it raises) in a seconds histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def record_usage(usage):
+    """Counts the tokens in a Gemini response's usage_metadata (None is ignored)."""
+    if usage is None:
+        return
+    for kind in ('prompt', 'candidates', 'thoughts', 'total'):
+        count = getattr(usage, f'{kind}_token_count', None)
+        if count:
+            inc('grandpa_gemini_tokens_total', kind, count)
+
+
+def failure_reason(exc):
+    """
+    Buckets an extraction exception into one of FAILURE_REASONS. Works from the
+    status code SDK errors carry (google.genai.errors.APIError.code) and the type.
+    """
+    code = getattr(exc, 'code', None) or getattr(exc, 'status_code', None)
+    if isinstance(code, int):
+        if code == 429:
+            return 'rate_limited'
+        if code in (408, 504):
+            return 'timeout'
+        if 500 <= code < 600:
+            return 'server_error'
+        if 400 <= code < 500:
+            return 'client_error'
+    if isinstance(exc, TimeoutError) or 'Timeout' in type(exc).__name__:
+        return 'timeout'
+    # json.JSONDecodeError and pydantic's ValidationError are both ValueErrors
+    if isinstance(exc, ValueError):
+        return 'invalid_response'
+    return 'other'
+
+
+def _histogram_keys(name, buckets):
+    return [f"{name}:bucket:{b}" for b in (*map(str, buckets), '+Inf')] + [f"{name}:sum", f"{name}:count"]
+
+
+def _counter_keys(name, labels):
+    return [f"{name}:{value}" for value in (labels[1] if labels else ('',))]
+
+
+def _all_keys():
+    keys = []
+    for name, (_, buckets) in HISTOGRAMS.items():
+        keys += _histogram_keys(name, buckets)
+    for name, (_, labels) in COUNTERS.items():
+        keys += _counter_keys(name, labels)
+    return [KEY_PREFIX + key for key in keys]
+
+
+def render():
+    """The current metrics in the Prometheus text exposition format (version 0.0.4)."""
+    stored = store().get_many(_all_keys())
+
+    def get(key):
+        return stored.get(KEY_PREFIX + key, 0)
+
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        cumulative = 0
+        for bucket in (*map(str, buckets), '+Inf'):
+            cumulative += get(f"{name}:bucket:{bucket}")
+            lines.append(f'{name}_bucket{{le="{bucket}"}} {cumulative}')
+        lines.append(f"{name}_sum {get(f'{name}:sum') / SUM_SCALE!r}")
+        lines.append(f"{name}_count {get(f'{name}:count')}")
+    for name, (help_text, labels) in COUNTERS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        if labels:
+            label, values = labels
+            lines += [f'{name}{{{label}={json.dumps(value)}}} {get(f"{name}:{value}")}' for value in values]
+        else:
+            lines.append(f"{name} {get(f'{name}:')}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Clears every stored value (tests and benchmarks)."""
+    store().delete_many(_all_keys())
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-16 23:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grandpa", "0002_parsejob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="calendarmonth",
+            name="original_image_bytes",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="calendarmonth",
+            name="processed_image_bytes",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="calendarmonth",
+            name="processed_image_height",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="calendarmonth",
+            name="processed_image_width",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-16 23:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grandpa", "0003_calendarmonth_image_sizes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ParseCacheEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=100, unique=True)),
+                ("image_sha256", models.CharField(db_index=True, max_length=64)),
+                ("prompt_version", models.CharField(max_length=32)),
+                ("result", models.JSONField()),
+                ("size_bytes", models.PositiveIntegerField(default=0)),
+                ("hits", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "last_used_at",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Parse Cache Entry",
+                "verbose_name_plural": "Parse Cache Entries",
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 6.0 on 2026-10-16 23:58
+
+from datetime import date
+
+from django.db import migrations, models
+
+
+def backfill_event_dates(apps, schema_editor):
+    CalendarEvent = apps.get_model("grandpa", "CalendarEvent")
+    batch = []
+    events = CalendarEvent.objects.select_related("calendar_month").only(
+        "id", "day", "calendar_month__year", "calendar_month__month"
+    )
+    for event in events.iterator(chunk_size=2000):
+        try:
+            event.event_date = date(
+                event.calendar_month.year, event.calendar_month.month, event.day
+            )
+        except (TypeError, ValueError):
+            continue
+        batch.append(event)
+        if len(batch) >= 2000:
+            CalendarEvent.objects.bulk_update(batch, ["event_date"])
+            batch = []
+    if batch:
+        CalendarEvent.objects.bulk_update(batch, ["event_date"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grandpa", "0004_parsecacheentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="calendarevent",
+            name="event_date",
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_event_dates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="calendarevent",
+            index=models.Index(
+                fields=["event_date", "hour", "minute"],
+                name="grandpa_cal_event_d_99c337_idx",
+            ),
+        ),
+    ]
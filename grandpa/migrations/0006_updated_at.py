@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-17 00:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grandpa", "0005_calendarevent_event_date"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="calendarevent",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="calendarmonth",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0 on 2026-10-17 00:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grandpa", "0006_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MonthSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("events", "/api/events"),
+                            ("feed", "/api/events/feed"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("year", models.IntegerField()),
+                ("month", models.IntegerField()),
+                ("body", models.BinaryField()),
+                ("day_offsets", models.JSONField(default=list)),
+                ("event_count", models.PositiveIntegerField(default=0)),
+                ("last_updated", models.DateTimeField(blank=True, null=True)),
+                ("built_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Month Snapshot",
+                "verbose_name_plural": "Month Snapshots",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("kind", "year", "month"), name="unique_month_snapshot"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-17 00:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grandpa", "0007_monthsnapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TwilioConversation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("unique_name", models.CharField(max_length=100, unique=True)),
+                ("sid", models.CharField(max_length=64)),
+                ("participant_addresses", models.JSONField(blank=True, default=list)),
+                ("synced_at", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name": "Twilio Conversation",
+                "verbose_name_plural": "Twilio Conversations",
+            },
+        ),
+    ]
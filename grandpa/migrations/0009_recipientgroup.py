@@ -0,0 +1,61 @@
+# Generated by Django 6.0 on 2026-10-17 00:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grandpa", "0008_twilioconversation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecipientGroup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                (
+                    "conversation_name",
+                    models.SlugField(
+                        max_length=100,
+                        unique=True,
+                        verbose_name="Twilio conversation unique name",
+                    ),
+                ),
+                ("calendars", models.JSONField(blank=True, default=list)),
+                (
+                    "participants",
+                    models.TextField(
+                        verbose_name="Phone numbers (one per line or comma-separated)"
+                    ),
+                ),
+                ("active", models.BooleanField(default=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Recipient Group",
+                "verbose_name_plural": "Recipient Groups",
+                "ordering": ["name"],
+            },
+        ),
+        migrations.AddField(
+            model_name="calendarmonth",
+            name="calendar",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                default="",
+                max_length=100,
+                verbose_name="Calendar (blank for the main one)",
+            ),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 6.0 on 2026-10-17 00:18
+
+from django.db import migrations, models
+
+
+def start_minute(hour, minute, am_pm, all_day):
+    # Same rule as CalendarEvent.compute_start_minute at the time of this migration
+    if all_day or hour is None:
+        return None
+    h = hour
+    ap = (am_pm or "").lower()
+    if h <= 12:
+        if ap == "am" and h == 12:
+            h = 0
+        elif ap == "pm" and h < 12:
+            h += 12
+    m = minute or 0
+    if not (0 <= h <= 23 and 0 <= m <= 59):
+        return None
+    return h * 60 + m
+
+
+def backfill_start_minutes(apps, schema_editor):
+    CalendarEvent = apps.get_model("grandpa", "CalendarEvent")
+    batch = []
+    events = CalendarEvent.objects.only("id", "hour", "minute", "am_pm", "all_day")
+    for event in events.iterator(chunk_size=2000):
+        event.start_minute_of_day = start_minute(
+            event.hour, event.minute, event.am_pm, event.all_day
+        )
+        if event.start_minute_of_day is None:
+            continue
+        batch.append(event)
+        if len(batch) >= 2000:
+            CalendarEvent.objects.bulk_update(batch, ["start_minute_of_day"])
+            batch = []
+    if batch:
+        CalendarEvent.objects.bulk_update(batch, ["start_minute_of_day"])
+
+    # Snapshots were encoded in the old order; they are rebuilt on first read
+    apps.get_model("grandpa", "MonthSnapshot").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grandpa", "0009_recipientgroup"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="calendarevent",
+            name="grandpa_cal_event_d_99c337_idx",
+        ),
+        migrations.AddField(
+            model_name="calendarevent",
+            name="start_minute_of_day",
+            field=models.PositiveSmallIntegerField(
+                blank=True, editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(backfill_start_minutes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="calendarevent",
+            index=models.Index(
+                fields=["event_date", "-all_day", "start_minute_of_day"],
+                name="grandpa_event_date_start_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-17 00:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grandpa", "0010_calendarevent_start_minute_of_day"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="calendarevent",
+            name="manually_edited",
+            field=models.BooleanField(
+                default=False, verbose_name="Manually edited (kept on re-parse)"
+            ),
+        ),
+    ]
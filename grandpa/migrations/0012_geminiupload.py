@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-17 00:35
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grandpa", "0011_calendarevent_manually_edited"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GeminiUpload",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("content_sha256", models.CharField(db_index=True, max_length=64)),
+                ("name", models.CharField(max_length=200, unique=True)),
+                ("uri", models.CharField(max_length=500)),
+                ("mime_type", models.CharField(max_length=100)),
+                ("size_bytes", models.PositiveIntegerField(default=0)),
+                ("expires_at", models.DateTimeField(db_index=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "last_used_at",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Gemini Upload",
+                "verbose_name_plural": "Gemini Uploads",
+            },
+        ),
+    ]
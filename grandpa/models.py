@@ -1,6 +1,16 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
 import json
-import threading
+import logging
+from datetime import date
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CalendarParseError(Exception):
+    """Raised when the model call for a calendar image does not produce a usable result."""
 
 class CalendarMonth(models.Model):
     MONTH_CHOICES = [
@@ -10,7 +20,11 @@ class CalendarMonth(models.Model):
     ]
 
     image = models.ImageField(upload_to='calendar_images/')
+    # Which calendar the photo is of (e.g. a building or unit); recipient groups can subscribe to a subset
+    calendar = models.CharField(max_length=100, blank=True, default='', db_index=True,
+                                verbose_name="Calendar (blank for the main one)")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     parsed_data = models.JSONField(blank=True, null=True)
     
     # Fields from CalendarResponse Pydantic model
@@ -18,6 +32,12 @@ class CalendarMonth(models.Model):
     month = models.IntegerField(null=True, blank=True)
     year = models.IntegerField(null=True, blank=True)
     notes_or_announcements = models.JSONField(default=list, blank=True, null=True)
+
+    # Sizes of the uploaded photo and the preprocessed image actually sent to Gemini
+    original_image_bytes = models.PositiveIntegerField(null=True, blank=True)
+    processed_image_bytes = models.PositiveIntegerField(null=True, blank=True)
+    processed_image_width = models.PositiveIntegerField(null=True, blank=True)
+    processed_image_height = models.PositiveIntegerField(null=True, blank=True)
     
     class Meta:
         verbose_name = "Calendar Month"
@@ -33,33 +53,96 @@ class CalendarMonth(models.Model):
 
     def save(self, *args, **kwargs):
         is_new = self.pk is None
+        previous = None
+        if not is_new:
+            previous = CalendarMonth.objects.filter(pk=self.pk).values_list('year', 'month').first()
+        # Read by the post_save handler in signals.py to refresh the old month's snapshots
+        self._previous_period = previous
+
         super().save(*args, **kwargs)
+
+        # Moving the month to another month/year moves all of its events
+        if previous is not None and previous != (self.year, self.month):
+            self.refresh_event_dates()
         
         # Process image if it's new and has an image
         if is_new and self.image:
-            # Run processing in a background thread
-            thread = threading.Thread(target=self._process_image_background, args=(self.pk, self.image.path))
-            thread.daemon = True # Daemonize so it doesn't block server shutdown
-            thread.start()
-            
             # Immediately set parsed_data to indicate processing
-            CalendarMonth.objects.filter(pk=self.pk).update(parsed_data={"status": "processing", "successfully_parsed": False})
+            CalendarMonth.objects.filter(pk=self.pk).update(
+                parsed_data={"status": "processing", "successfully_parsed": False},
+                updated_at=timezone.now(),
+            )
+
+            # Queue the parse; a `run_parse_worker` process picks it up
+            from .jobs import enqueue_parse
+            enqueue_parse(self)
+
+    def refresh_event_dates(self):
+        events = list(self.events.only('id', 'day'))
+        now = timezone.now()
+        for event in events:
+            event.event_date = CalendarEvent.compute_event_date(self.year, self.month, event.day)
+            # bulk_update doesn't apply auto_now
+            event.updated_at = now
+        CalendarEvent.objects.bulk_update(events, ['event_date', 'updated_at'], batch_size=500)
 
     @staticmethod
-    def _process_image_background(pk, image_path):
+    def _process_image_background(pk, image_path, prepared=None):
         """
-        Background task to process the image.
-        Note: We must handle database connections carefully in threads in older Django, 
-        but usually safe for simple updates in new threads if connection is closed.
+        Parses the image and stores the results on the CalendarMonth.
+        Runs inside a parse worker (see grandpa/jobs.py). Raises CalendarParseError
+        on failure so the job can be retried; the worker records the final error.
+        `prepared` is an already preprocessed image (see CalendarProcessor.parse).
         """
-        from django.db import connection
+        from .gemini import CalendarProcessor
+        processor = CalendarProcessor()
+        with metrics.timed('grandpa_parse_seconds'):
+            outcome = processor.parse(image_path, prepared=prepared)
+        result, prepared = outcome.result, outcome.prepared
+        if outcome.cache_hit:
+            metrics.inc('grandpa_parse_cache_hits_total')
+
+        if result.get('error'):
+            metrics.inc('grandpa_parse_results_total', 'failed')
+            metrics.inc('grandpa_parse_failures_total', result.get('error_reason', 'other'))
+            raise CalendarParseError(result['error'])
+
         try:
-            from .gemini import CalendarProcessor
-            processor = CalendarProcessor()
-            result = processor.process_image(image_path)
-            
-            # Re-fetch object
-            calendar_month = CalendarMonth.objects.get(pk=pk)
+            with metrics.timed('grandpa_parse_db_write_seconds'):
+                diff = CalendarMonth.store_parse_result(pk, result, prepared)
+        except Exception:
+            metrics.inc('grandpa_parse_results_total', 'failed')
+            metrics.inc('grandpa_parse_failures_total', 'db_error')
+            raise
+        logger.info("Calendar month %s events: %s", pk, diff)
+        for change in ('created', 'updated', 'deleted'):
+            if getattr(diff, change):
+                metrics.inc('grandpa_parse_event_changes_total', change, getattr(diff, change))
+
+        if result.get('successfully_parsed'):
+            metrics.inc('grandpa_parse_results_total', 'parsed')
+            metrics.observe('grandpa_parse_events', len(result.get('events') or []))
+        else:
+            metrics.inc('grandpa_parse_results_total', 'unparsed')
+
+    # Set from a parse result by store_parse_result
+    PARSE_FIELDS = (
+        'parsed_data', 'successfully_parsed', 'month', 'year', 'notes_or_announcements',
+        'original_image_bytes', 'processed_image_bytes', 'processed_image_width', 'processed_image_height',
+    )
+
+    @staticmethod
+    def store_parse_result(pk, result, prepared=None):
+        """
+        Saves a successful parse in one transaction: the month's fields and image sizes,
+        and its events, reconciled with the existing ones (see reconcile.py).
+        Returns the EventDiff.
+        """
+        from .reconcile import reconcile_events
+        with transaction.atomic():
+            # Locked so two parses of the same month can't reconcile concurrently
+            calendar_month = CalendarMonth.objects.select_for_update().get(pk=pk)
+            previous_period = (calendar_month.year, calendar_month.month)
             
             # Update CalendarMonth fields
             calendar_month.parsed_data = result
@@ -67,37 +150,30 @@ class CalendarMonth(models.Model):
             calendar_month.month = result.get('month')
             calendar_month.year = result.get('year')
             calendar_month.notes_or_announcements = result.get('notes_or_announcements')
-            calendar_month.save()
-            
-            # Create CalendarEvent objects
-            events_data = result.get('events', [])
-            
-            # Clear existing events if any (though this is usually a new object)
-            calendar_month.events.all().delete()
-            
-            new_events = []
-            for event_data in events_data:
-                new_events.append(CalendarEvent(
-                    calendar_month=calendar_month,
-                    day=event_data.get('day'),
-                    hour=event_data.get('hour'),
-                    minute=event_data.get('minute'),
-                    am_pm=event_data.get('am_pm'),
-                    title=event_data.get('title'),
-                    color=event_data.get('color'),
-                    all_day=event_data.get('all_day', False),
-                    featured=event_data.get('featured', False),
-                    original_text=event_data.get('original_text', '')
-                ))
-            
-            if new_events:
-                CalendarEvent.objects.bulk_create(new_events)
-                
-        except Exception as e:
-            error_data = {"successfully_parsed": False, "error": str(e), "status": "failed"}
-            CalendarMonth.objects.filter(pk=pk).update(parsed_data=error_data)
-        finally:
-            connection.close()
+            # Cache hits skip preprocessing, so sizes are only known for fresh parses
+            if prepared:
+                calendar_month.original_image_bytes = prepared.original_bytes
+                calendar_month.processed_image_bytes = prepared.processed_bytes
+                calendar_month.processed_image_width = prepared.width
+                calendar_month.processed_image_height = prepared.height
+
+            period_changed = previous_period != (calendar_month.year, calendar_month.month)
+            if period_changed:
+                # Moves the existing events' dates before they are compared
+                calendar_month.save()
+
+            diff = reconcile_events(calendar_month, result.get('events', []))
+
+            if diff.changed and not period_changed:
+                # The post_save signals invalidate snapshots and cached text
+                calendar_month.save()
+            elif not period_changed:
+                # Nothing visible changed: store the result without signals, so caches stay valid
+                CalendarMonth.objects.filter(pk=pk).update(
+                    updated_at=timezone.now(),
+                    **{name: getattr(calendar_month, name) for name in CalendarMonth.PARSE_FIELDS},
+                )
+        return diff
 
 
 class CalendarEvent(models.Model):
@@ -112,11 +188,253 @@ class CalendarEvent(models.Model):
     featured = models.BooleanField(default=False, verbose_name="Featured")
     original_text = models.TextField(verbose_name="The exact raw text")
 
+    # Denormalized from calendar_month.year/month + day so date queries skip the join
+    event_date = models.DateField(null=True, blank=True, editable=False)
+    # Start time as minutes after midnight (24-hour), from hour/minute/am_pm; null for
+    # all-day events and events without a time. Sort by this, never by raw `hour`.
+    start_minute_of_day = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Set when an event is corrected in the admin; re-parses then leave it alone
+    manually_edited = models.BooleanField(default=False, verbose_name="Manually edited (kept on re-parse)")
+
+    # Order within a day: all-day events first, then by start time, untimed events last
+    DAY_ORDERING = ('-all_day', F('start_minute_of_day').asc(nulls_last=True), 'id')
+
     class Meta:
         ordering = ['-day', '-hour', '-minute']
         verbose_name = "Calendar Event"
         verbose_name_plural = "Calendar Events"
+        indexes = [
+            # Matches ('event_date', *DAY_ORDERING), so day and range listings read the index in
+            # order (ascending indexes already keep NULLs last on PostgreSQL)
+            models.Index(fields=['event_date', '-all_day', 'start_minute_of_day'], name='grandpa_event_date_start_idx'),
+        ]
+
+    @staticmethod
+    def compute_event_date(year, month, day):
+        """
+        The calendar date for a day of a month, or None if it isn't a real date
+        (unparsed month, or a misread day like February 30).
+        """
+        try:
+            return date(year, month, day)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def compute_start_minute(hour, minute, am_pm, all_day=False):
+        """
+        Minutes after midnight for a 12-hour (or already 24-hour) time: 12 am is
+        midnight, 12 pm is noon, hours 13-23 are taken as 24-hour. None for all-day
+        events, events without an hour, and times that can't be real.
+        """
+        if all_day or hour is None:
+            return None
+        h = hour
+        ap = (am_pm or '').lower()
+        if h <= 12:
+            if ap == 'am' and h == 12:
+                h = 0
+            elif ap == 'pm' and h < 12:
+                h += 12
+        m = minute or 0
+        if not (0 <= h <= 23 and 0 <= m <= 59):
+            return None
+        return h * 60 + m
+
+    @classmethod
+    def from_parsed(cls, calendar_month, event_data):
+        """An unsaved event from one CalendarResponse event dict."""
+        return cls(
+            calendar_month=calendar_month,
+            day=event_data.get('day'),
+            event_date=cls.compute_event_date(calendar_month.year, calendar_month.month, event_data.get('day')),
+            start_minute_of_day=cls.compute_start_minute(
+                event_data.get('hour'), event_data.get('minute'), event_data.get('am_pm'), event_data.get('all_day', False)
+            ),
+            hour=event_data.get('hour'),
+            minute=event_data.get('minute'),
+            am_pm=event_data.get('am_pm'),
+            title=event_data.get('title'),
+            color=event_data.get('color'),
+            all_day=event_data.get('all_day', False),
+            featured=event_data.get('featured', False),
+            original_text=event_data.get('original_text', ''),
+        )
+
+    def save(self, *args, **kwargs):
+        # Read by the post_save handler in signals.py to refresh the old month's snapshots
+        # when the event moves to another month (new calendar_month or day)
+        self._previous_event_date = None
+        if self.pk is not None:
+            self._previous_event_date = CalendarEvent.objects.filter(pk=self.pk).values_list('event_date', flat=True).first()
+        self.event_date = self.compute_event_date(self.calendar_month.year, self.calendar_month.month, self.day)
+        self.start_minute_of_day = self.compute_start_minute(self.hour, self.minute, self.am_pm, self.all_day)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         time_str = "All Day" if self.all_day else f"{self.hour}:{self.minute:02d} {self.am_pm}"
         return f"Day {self.day} - {time_str} - {self.title}"
+
+
+class ParseJob(models.Model):
+    """
+    A queued parse of a CalendarMonth image, processed by `manage.py run_parse_worker`.
+    Workers lease jobs for a visibility timeout so a crashed worker's jobs are picked up again.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_SUCCEEDED, "Succeeded"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    calendar_month = models.ForeignKey(CalendarMonth, on_delete=models.CASCADE, related_name='parse_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    available_at = models.DateTimeField(default=timezone.now, verbose_name="Available to run at")
+    leased_until = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Parse Job"
+        verbose_name_plural = "Parse Jobs"
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+        ]
+
+    def __str__(self):
+        return f"Parse job {self.id} ({self.status}) - {self.calendar_month}"
+
+
+class ParseCacheEntry(models.Model):
+    """
+    A cached CalendarResponse dict for an image, keyed by image hash and prompt version.
+    """
+    key = models.CharField(max_length=100, unique=True)
+    image_sha256 = models.CharField(max_length=64, db_index=True)
+    prompt_version = models.CharField(max_length=32)
+    result = models.JSONField()
+    size_bytes = models.PositiveIntegerField(default=0)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = "Parse Cache Entry"
+        verbose_name_plural = "Parse Cache Entries"
+
+    def __str__(self):
+        return f"{self.image_sha256[:12]} ({self.prompt_version})"
+
+
+class GeminiUpload(models.Model):
+    """
+    A file uploaded to the Gemini Files API, reused by later parses of the same image
+    bytes until it nears expiry, then deleted (see grandpa/uploads.py).
+    """
+    content_sha256 = models.CharField(max_length=64, db_index=True)
+    # Server-side resource name (files/...), used to delete it
+    name = models.CharField(max_length=200, unique=True)
+    uri = models.CharField(max_length=500)
+    mime_type = models.CharField(max_length=100)
+    size_bytes = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = "Gemini Upload"
+        verbose_name_plural = "Gemini Uploads"
+
+    def __str__(self):
+        return f"{self.name} ({self.content_sha256[:12]})"
+
+
+class MonthSnapshot(models.Model):
+    """
+    One month's events pre-serialized in one of the events API formats.
+    Rebuilt whenever the month's events change; see grandpa/snapshots.py.
+    """
+    KIND_EVENTS = 'events'
+    KIND_FEED = 'feed'
+    KIND_CHOICES = [
+        (KIND_EVENTS, "/api/events"),
+        (KIND_FEED, "/api/events/feed"),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    year = models.IntegerField()
+    month = models.IntegerField()
+    body = models.BinaryField()
+    # Byte offset in body where each day of the month starts, followed by the body length
+    day_offsets = models.JSONField(default=list)
+    # What the body was built from; a rebuild is skipped while these still match
+    event_count = models.PositiveIntegerField(default=0)
+    last_updated = models.DateTimeField(null=True, blank=True)
+    built_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Month Snapshot"
+        verbose_name_plural = "Month Snapshots"
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'year', 'month'], name='unique_month_snapshot'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.year}-{self.month:02d} ({self.event_count} events)"
+
+
+class TwilioConversation(models.Model):
+    """
+    Locally stored state of a Twilio conversation, so a routine send doesn't have to
+    look up the conversation and its participants first (see notifications.py).
+    """
+    unique_name = models.CharField(max_length=100, unique=True)
+    sid = models.CharField(max_length=64)
+    # SMS addresses known to be bound to the conversation
+    participant_addresses = models.JSONField(default=list, blank=True)
+    synced_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Twilio Conversation"
+        verbose_name_plural = "Twilio Conversations"
+
+    def __str__(self):
+        return f"{self.unique_name} ({self.sid})"
+
+
+class RecipientGroup(models.Model):
+    """
+    A household or family that gets the daily events text in its own Twilio
+    conversation (see grandpa/fanout.py).
+    """
+    name = models.CharField(max_length=100)
+    conversation_name = models.SlugField(max_length=100, unique=True, verbose_name="Twilio conversation unique name")
+    # CalendarMonth.calendar values to include; empty for every calendar
+    calendars = models.JSONField(default=list, blank=True)
+    participants = models.TextField(verbose_name="Phone numbers (one per line or comma-separated)")
+    active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = "Recipient Group"
+        verbose_name_plural = "Recipient Groups"
+
+    def __str__(self):
+        return self.name
+
+    def participant_numbers(self):
+        from .notifications import normalize_number
+        numbers = self.participants.replace(',', '\n').splitlines()
+        return [normalize_number(n) for n in numbers if n.strip()]
@@ -1,126 +1,247 @@
 import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
 from django.utils import timezone
-from twilio.rest import Client
-from .models import CalendarEvent, CalendarMonth
+from twilio.base.exceptions import TwilioRestException
+from django.utils.module_loading import import_string
+from .models import CalendarEvent, CalendarMonth, TwilioConversation
 
 def send_next_day_events():
     """
     Finds or creates a Twilio conversation with participants from settings,
     fetches the next day's events, and sends them to the conversation.
     """
-    # 1. Calculate tomorrow
-    now = timezone.now()
-    tomorrow = now + datetime.timedelta(days=1)
-    
-    # Extract day, month, year
-    target_day = tomorrow.day
-    target_month = tomorrow.month
-    target_year = tomorrow.year
+    # 1-3. Calculate tomorrow, fetch its events and format the message
+    tomorrow, message_body = build_next_day_message()
     
-    # 2. Fetch events
-    events_qs = CalendarEvent.objects.filter(
-        calendar_month__month=target_month,
-        calendar_month__year=target_year,
-        day=target_day
-    )
-    
-    if not events_qs.exists():
+    if message_body is None:
         print(f"No events found for {tomorrow.date()}")
         return
 
-    # Sort events manually for correct 12h time ordering
-    def event_sort_key(event):
-        if event.all_day:
-            return (-1, 0, 0)
-            
-        h = event.hour or 0
-        m = event.minute or 0
-        ap = (event.am_pm or '').lower()
-        
-        # Convert to 24h for sorting
-        if ap == 'pm' and h != 12:
-            h += 12
-        elif ap == 'am' and h == 12:
-            h = 0
-            
-        return (0, h, m)
-        
-    events = sorted(list(events_qs), key=event_sort_key)
-        
-    # 3. Format message
-    date_str = tomorrow.strftime("%A, %B %d, %Y")
+    # 4. Setup Twilio
+    client = messaging_client()
+    if client is None:
+        print("Twilio credentials missing in settings.")
+        return
+
+    target_numbers = [normalize_number(n) for n in settings.TWILIO_PARTICIPANTS if n.strip()]
+
+    # 5. Send Message. Finding or creating the conversation and its participants is
+    # served from the locally stored state when it is fresh: no extra API calls.
+    unique_name = "grandpa_calendar_events"
+    throttle = TokenBucket(getattr(settings, 'TWILIO_SEND_RATE', 10), getattr(settings, 'TWILIO_SEND_BURST', 10)).acquire
+    try:
+        sid = send_message(client, unique_name, "Grandpa's Calendar", target_numbers, message_body, throttle=throttle)
+    except Exception as e:
+        print(f"Failed to send message: {e}")
+        return None
+
+    print(f"Message sent! SID: {sid}")
+    return sid
+
+def messaging_client():
+    """
+    A Twilio REST client, or an instance of the class named by TWILIO_CLIENT_BACKEND
+    (e.g. grandpa.fake_messaging.FakeTwilioClient). None if the backend needs
+    credentials that aren't configured.
+    """
+    backend = import_string(getattr(settings, 'TWILIO_CLIENT_BACKEND', 'twilio.rest.Client'))
+    if getattr(backend, 'requires_credentials', True) and not all(
+        [settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN, settings.TWILIO_PHONE_NUMBER]
+    ):
+        return None
+    return backend(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+
+def build_next_day_message(now=None):
+    """
+    Returns (tomorrow, message) for the day after `now` (default: the current time);
+    message is None if there are no events. One query.
+    """
+    now = now or timezone.now()
+    tomorrow = now + datetime.timedelta(days=1)
+    events = list(CalendarEvent.objects.filter(event_date=tomorrow.date()).order_by(*CalendarEvent.DAY_ORDERING))
+    if not events:
+        return tomorrow, None
+    return tomorrow, format_events_message(tomorrow, events)
+
+def format_events_message(target_date, events):
+    """
+    The text message for a day. `events` come in display order (CalendarEvent.DAY_ORDERING)
+    and need all_day, hour, minute, am_pm and title.
+    """
+    date_str = target_date.strftime("%A, %B %d, %Y")
     message_lines = [f"📅 Events for {date_str}:"]
     
     for event in events:
         time_str = "All Day"
         if not event.all_day and event.hour is not None:
-            minute_str = f"{event.minute:02d}"
+            minute_str = f"{event.minute or 0:02d}"
             time_str = f"{event.hour}:{minute_str} {event.am_pm}"
             
         message_lines.append(f"• {time_str}: {event.title}")
         
-    message_body = "\n".join(message_lines)
-    
-    # 4. Setup Twilio
-    if not all([settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN, settings.TWILIO_PHONE_NUMBER]):
-        print("Twilio credentials missing in settings.")
-        return
+    return "\n".join(message_lines)
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, holding at most `capacity`.
+    `clock` and `sleep` default to time.monotonic and time.sleep (tests pass fakes).
+    """
+
+    def __init__(self, rate, capacity, clock=None, sleep=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock or time.monotonic
+        self.sleep = sleep or time.sleep
+        self.tokens = capacity
+        self.updated = self.clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        # Waiting while holding the lock queues callers in turn
+        with self.lock:
+            while True:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                self.sleep((1 - self.tokens) / self.rate)
+
+def twilio_call(fn, *args, throttle=None, **kwargs):
+    """
+    Makes one Twilio API call, waiting for `throttle` (e.g. TokenBucket.acquire) first.
+    A 429 is retried with exponential backoff, up to TWILIO_SEND_MAX_RETRIES times.
+    """
+    max_retries = getattr(settings, 'TWILIO_SEND_MAX_RETRIES', 3)
+    backoff = getattr(settings, 'TWILIO_RETRY_BACKOFF_SECONDS', 1)
+    attempt = 0
+    while True:
+        if throttle:
+            throttle()
+        try:
+            return fn(*args, **kwargs)
+        except TwilioRestException as e:
+            if e.status != 429 or attempt >= max_retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+            attempt += 1
+
+def send_message(client, unique_name, friendly_name, numbers, body, throttle=None):
+    """
+    Sends `body` to the conversation (see get_conversation) and returns the message SID.
+    Every API call waits for `throttle`. Raises on failure.
+    """
+    conversation = get_conversation(client, unique_name, friendly_name, numbers, throttle=throttle)
+    try:
+        return twilio_call(conversation.messages.create, body=body, throttle=throttle).sid
+    except TwilioRestException as e:
+        if e.status != 404:
+            raise
+        # The conversation was deleted on Twilio's side: rebuild it and try once more
+        print(f"Stored conversation {unique_name} no longer exists, recreating...")
+        conversation = get_conversation(client, unique_name, friendly_name, numbers, refresh=True, throttle=throttle)
+        return twilio_call(conversation.messages.create, body=body, throttle=throttle).sid
+
+def normalize_number(number):
+    """
+    Normalizes US numbers to E.164 (+1XXXXXXXXXX); anything else is returned stripped.
+    """
+    clean_number = number.strip()
+    if not clean_number.startswith('+'):
+        # Remove non-digits
+        digits = ''.join(filter(str.isdigit, clean_number))
+        if len(digits) == 10:
+            clean_number = f"+1{digits}"
+        elif len(digits) == 11 and digits.startswith('1'):
+            clean_number = f"+{digits}"
+    return clean_number
+
+def get_conversation(client, unique_name, friendly_name, numbers, refresh=False, throttle=None):
+    """
+    Returns a conversation context with every number in `numbers` bound to it.
+
+    The conversation SID and its participants are stored in TwilioConversation. While
+    that state is younger than TWILIO_CONVERSATION_STATE_TTL and already lists every
+    number, no API call is made. Otherwise (or with refresh=True) the conversation is
+    fetched or created, its participants listed, and missing ones added concurrently.
+    """
+    state = TwilioConversation.objects.filter(unique_name=unique_name).first()
+    ttl = datetime.timedelta(seconds=getattr(settings, 'TWILIO_CONVERSATION_STATE_TTL', 24 * 60 * 60))
+    if (
+        not refresh
+        and state is not None
+        and state.synced_at > timezone.now() - ttl
+        and set(numbers) <= set(state.participant_addresses)
+    ):
+        return client.conversations.v1.conversations(state.sid)
 
-    client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-    
-    # 5. Find or Create Conversation
-    unique_name = "grandpa_calendar_events"
     conversation = None
-    
     try:
-        conversation = client.conversations.v1.conversations(unique_name).fetch()
+        conversation = twilio_call(client.conversations.v1.conversations(unique_name).fetch, throttle=throttle)
         print(f"Found existing conversation: {conversation.sid}")
-    except Exception:
+    except TwilioRestException as e:
+        # Anything but "not found" (rate limit, outage) must not lead to a duplicate
+        if e.status != 404:
+            raise
         print("Creating new conversation...")
-        conversation = client.conversations.v1.conversations.create(
-            friendly_name="Grandpa's Calendar",
-            unique_name=unique_name
+        conversation = twilio_call(
+            client.conversations.v1.conversations.create,
+            friendly_name=friendly_name,
+            unique_name=unique_name,
+            throttle=throttle,
         )
         print(f"Created conversation: {conversation.sid}")
 
-    # 6. Manage Participants
     # Get current participants to avoid duplicates
-    participants = conversation.participants.list()
     current_numbers = set()
-    for p in participants:
+    for p in twilio_call(conversation.participants.list, throttle=throttle):
         # Check if it's an SMS participant
         if p.messaging_binding and 'address' in p.messaging_binding:
             current_numbers.add(p.messaging_binding['address'])
-            
-    target_numbers = [n.strip() for n in settings.TWILIO_PARTICIPANTS if n.strip()]
-    
-    for number in target_numbers:
-        # Normalize US numbers
-        clean_number = number
-        if not clean_number.startswith('+'):
-            # Remove non-digits
-            digits = ''.join(filter(str.isdigit, clean_number))
-            if len(digits) == 10:
-                clean_number = f"+1{digits}"
-            elif len(digits) == 11 and digits.startswith('1'):
-                 clean_number = f"+{digits}"
-        
-        if clean_number not in current_numbers:
-            try:
-                conversation.participants.create(
-                    messaging_binding_address=clean_number,
-                    messaging_binding_proxy_address=settings.TWILIO_PHONE_NUMBER
-                )
-                print(f"Added participant: {clean_number}")
-            except Exception as e:
-                print(f"Failed to add participant {clean_number}: {e}")
-                
-    # 7. Send Message
-    try:
-        msg = conversation.messages.create(body=message_body)
-        print(f"Message sent! SID: {msg.sid}")
-        return msg.sid
-    except Exception as e:
-        print(f"Failed to send message: {e}")
+
+    missing = [n for n in dict.fromkeys(numbers) if n not in current_numbers]
+    current_numbers |= add_participants(conversation, missing, throttle=throttle)
+
+    TwilioConversation.objects.update_or_create(
+        unique_name=unique_name,
+        defaults={
+            'sid': conversation.sid,
+            'participant_addresses': sorted(current_numbers),
+            'synced_at': timezone.now(),
+        },
+    )
+    return conversation
+
+def add_participants(conversation, numbers, throttle=None):
+    """
+    Adds SMS participants in parallel, at most TWILIO_PARTICIPANT_CONCURRENCY at a time.
+    Returns the numbers that are now bound (including ones Twilio says already were).
+    """
+    def add(number):
+        try:
+            twilio_call(
+                conversation.participants.create,
+                messaging_binding_address=number,
+                messaging_binding_proxy_address=settings.TWILIO_PHONE_NUMBER,
+                throttle=throttle,
+            )
+            print(f"Added participant: {number}")
+            return number
+        except TwilioRestException as e:
+            if e.status == 409:
+                # Already in the conversation (added since we listed, or by another run)
+                return number
+            print(f"Failed to add participant {number}: {e}")
+        except Exception as e:
+            print(f"Failed to add participant {number}: {e}")
         return None
+
+    if not numbers:
+        return set()
+    workers = min(len(numbers), getattr(settings, 'TWILIO_PARTICIPANT_CONCURRENCY', 4))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return {number for number in pool.map(add, numbers) if number}
@@ -0,0 +1,169 @@
+"""
+Result cache for calendar parsing, keyed by the SHA-256 of the image bytes plus the
+prompt/schema version (see gemini.prompt_version).
+
+Concurrent parses of the same image are collapsed into one model call: threads in a
+worker process wait on a shared in-flight call, and on PostgreSQL an advisory lock
+makes other worker processes wait for the first one and then read its cached result.
+"""
+import hashlib
+import json
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from .models import ParseCacheEntry
+
+
+def file_digest(image_path):
+    digest = hashlib.sha256()
+    with open(image_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(image_sha256):
+    from .gemini import prompt_version
+    return f"{image_sha256}:{prompt_version()}"
+
+
+def get(key):
+    entry = ParseCacheEntry.objects.filter(key=key).only('pk', 'result').first()
+    if entry is None:
+        return None
+    ParseCacheEntry.objects.filter(pk=entry.pk).update(hits=F('hits') + 1, last_used_at=timezone.now())
+    return entry.result
+
+
+def store(key, result):
+    image_sha256, version = key.split(':', 1)
+    ParseCacheEntry.objects.update_or_create(
+        key=key,
+        defaults={
+            'image_sha256': image_sha256,
+            'prompt_version': version,
+            'result': result,
+            'size_bytes': len(json.dumps(result)),
+            'last_used_at': timezone.now(),
+        },
+    )
+
+
+def evict(max_age_days=None, max_bytes=None):
+    """
+    Drops entries unused for `max_age_days`, then the least recently used entries
+    until the cache fits in `max_bytes`. Returns the number of entries deleted.
+    """
+    if max_age_days is None:
+        max_age_days = getattr(settings, 'PARSE_CACHE_MAX_AGE_DAYS', 90)
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'PARSE_CACHE_MAX_BYTES', 50 * 1024 * 1024)
+
+    cutoff = timezone.now() - timedelta(days=max_age_days)
+    deleted, _ = ParseCacheEntry.objects.filter(last_used_at__lt=cutoff).delete()
+
+    total = 0
+    stale = []
+    for pk, size in ParseCacheEntry.objects.order_by('-last_used_at').values_list('pk', 'size_bytes').iterator():
+        total += size
+        if total > max_bytes:
+            stale.append(pk)
+    if stale:
+        count, _ = ParseCacheEntry.objects.filter(pk__in=stale).delete()
+        deleted += count
+    return deleted
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time within this process; concurrent callers
+    for the same key block and receive the leader's result (or exception).
+    """
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """
+        Returns (result, shared) where shared is True if another caller did the work.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+_in_flight = SingleFlight()
+
+
+@contextmanager
+def _cross_process_lock(key):
+    if connection.vendor != 'postgresql':
+        yield
+        return
+
+    lock_id = int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], 'big', signed=True)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", [lock_id])
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [lock_id])
+
+
+def cached_parse(image_path, parse):
+    """
+    Returns (result, cache_hit). `parse` is only called on a cache miss, and only
+    successful results are cached.
+    """
+    if not getattr(settings, 'PARSE_CACHE_ENABLED', True):
+        return parse(), False
+
+    key = cache_key(file_digest(image_path))
+    cached = get(key)
+    if cached is not None:
+        return cached, True
+
+    def parse_once():
+        with _cross_process_lock(key):
+            # Another process may have finished the same image while we waited
+            cached = get(key)
+            if cached is not None:
+                return cached, True
+            result = parse()
+            if not result.get('error'):
+                store(key, result)
+                evict()
+            return result, False
+
+    (result, hit), shared = _in_flight.do(key, parse_once)
+    return result, hit or shared
@@ -0,0 +1,155 @@
+"""
+Opt-in per-request SQL profiling (QUERY_PROFILING=True).
+
+QueryProfilingMiddleware counts and times every query a request runs, adds a
+Server-Timing header (visible in the browser's network panel) and flags query
+shapes that repeat within one request, which is what an N+1 pattern looks like.
+Each request is appended as a JSON line to a size-rotated log per process,
+QUERY_PROFILING_LOG suffixed with the pid (rotating a file several processes
+write to loses records); `manage.py query_profile_report` summarizes them all,
+and with --clear prunes them.
+"""
+import json
+import logging
+import os
+import re
+import time
+from logging.handlers import RotatingFileHandler
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils import timezone
+
+# `IN (%s, %s, %s)` and literal numbers vary between otherwise identical queries
+_PLACEHOLDER_LIST = re.compile(r'(%s|\?)(\s*,\s*(%s|\?))+')
+_NUMBER = re.compile(r'\b\d+\b')
+
+logger = logging.getLogger(__name__)
+
+
+def query_shape(sql):
+    """
+    The query with parameter lists and numbers collapsed, so repeats of the same
+    statement with different values compare equal.
+    """
+    return _NUMBER.sub('N', _PLACEHOLDER_LIST.sub('%s...', sql))
+
+
+class QueryProfile:
+    """
+    The queries run while it is installed as an execute wrapper.
+    """
+
+    def __init__(self):
+        self.queries = []  # (shape, seconds)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((query_shape(sql), time.perf_counter() - start))
+
+    @property
+    def db_seconds(self):
+        return sum(seconds for _, seconds in self.queries)
+
+    def shapes(self):
+        """
+        {shape: [count, total seconds]}, slowest total first.
+        """
+        totals = {}
+        for shape, seconds in self.queries:
+            entry = totals.setdefault(shape, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+        return dict(sorted(totals.items(), key=lambda item: -item[1][1]))
+
+    def repeated(self, threshold):
+        return {shape: entry for shape, entry in self.shapes().items() if entry[0] >= threshold}
+
+
+def process_log_path(path, pid=None):
+    """This process's log file for QUERY_PROFILING_LOG `path`."""
+    return f'{path}.{pid or os.getpid()}'
+
+
+def profile_log(path):
+    """
+    A logger appending bare lines to `path`, rotated at QUERY_PROFILING_LOG_MAX_BYTES.
+    Only one process may write to `path` (see process_log_path).
+    """
+    # Not registered with logging.getLogger: the records are JSON for
+    # query_profile_report, not for the console or the root handlers
+    log = logging.Logger('grandpa.profiling.requests', logging.INFO)
+    handler = RotatingFileHandler(
+        path,
+        maxBytes=getattr(settings, 'QUERY_PROFILING_LOG_MAX_BYTES', 10 * 1024 * 1024),
+        backupCount=1,
+    )
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    log.addHandler(handler)
+    return log
+
+
+class QueryProfilingMiddleware:
+    """
+    Profiles the queries of each request; see the module docstring. Does nothing
+    (and is dropped from the stack at startup) unless QUERY_PROFILING is set.
+    Queries run while a streaming response is being consumed aren't counted.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'QUERY_PROFILING_REPEAT_THRESHOLD', 5)
+        self.log_path = getattr(settings, 'QUERY_PROFILING_LOG', '')
+        self._log, self._log_pid = None, None
+
+    @property
+    def log(self):
+        # Opened on first use in each process: a server that loads the app before
+        # forking its workers would otherwise have them all write the parent's file
+        if self.log_path and self._log_pid != os.getpid():
+            self._log, self._log_pid = profile_log(process_log_path(self.log_path)), os.getpid()
+        return self._log
+
+    def __call__(self, request):
+        profile = QueryProfile()
+        start = time.perf_counter()
+        with connection.execute_wrapper(profile):
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        repeated = profile.repeated(self.threshold)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={profile.db_seconds * 1000:.1f};desc="{len(profile.queries)} queries"',
+            f'total;dur={total * 1000:.1f}',
+        ])
+        if repeated:
+            count, shape = max((entry[0], shape) for shape, entry in repeated.items())
+            logger.warning("Possible N+1 on %s: %s x %s", request.path, count, shape[:200])
+
+        if self.log:
+            match = request.resolver_match
+            self.log.info(json.dumps({
+                'at': timezone.now().isoformat(),
+                'method': request.method,
+                'path': request.path,
+                # The route pattern groups /calendar/months/1/status/ with .../2/status/
+                'route': match.route if match else request.path,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 3),
+                'db_ms': round(profile.db_seconds * 1000, 3),
+                'queries': len(profile.queries),
+                'shapes': [
+                    {'sql': shape, 'count': count, 'ms': round(seconds * 1000, 3)}
+                    for shape, (count, seconds) in list(profile.shapes().items())[:5]
+                ],
+                'repeated': [
+                    {'sql': shape, 'count': count, 'ms': round(seconds * 1000, 3)}
+                    for shape, (count, seconds) in repeated.items()
+                ],
+            }))
+        return response
@@ -0,0 +1,109 @@
+"""
+Applies a new parse of a month to its existing events as a minimal diff.
+
+Parsed events are matched to stored ones by day, time and text, so a re-parse
+that finds the same events writes nothing: rows keep their ids, manual admin
+corrections (CalendarEvent.manually_edited) are never overwritten or deleted,
+and caches are only invalidated when something actually changed.
+"""
+import re
+from dataclasses import dataclass, field
+from django.utils import timezone
+from .models import CalendarEvent
+
+# Fields a parse sets; compared to decide whether a matched event needs an update
+PARSED_FIELDS = (
+    'day', 'hour', 'minute', 'am_pm', 'title', 'color', 'all_day', 'featured',
+    'original_text', 'event_date', 'start_minute_of_day',
+)
+
+
+@dataclass
+class EventDiff:
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    # Manually edited events left alone, whether or not the new parse still has them
+    kept: int = 0
+    updated_fields: set = field(default_factory=set)
+
+    @property
+    def changed(self):
+        return bool(self.created or self.updated or self.deleted)
+
+    def __str__(self):
+        return (f"+{self.created} ~{self.updated} -{self.deleted} "
+                f"({self.unchanged} unchanged, {self.kept} manually edited kept)")
+
+
+def normalize_text(text):
+    return re.sub(r'\s+', ' ', text or '').strip().casefold()
+
+
+# Tried in order; each pass only sees what earlier passes left unmatched
+MATCH_KEYS = (
+    # Same event
+    lambda e: (e.day, e.all_day, e.start_minute_of_day, normalize_text(e.original_text or e.title)),
+    # Same slot and title, raw text re-read differently
+    lambda e: (e.day, e.all_day, e.start_minute_of_day, normalize_text(e.title)),
+    # Same title, time re-read differently (original_text includes the time, so it differs too)
+    lambda e: (e.day, normalize_text(e.title)),
+)
+
+
+def reconcile_events(calendar_month, events_data):
+    """
+    Brings calendar_month's events in line with a parse's `events` list using
+    bulk_update/bulk_create and one delete. Call inside a transaction, after the
+    month's year/month are saved. Returns an EventDiff.
+    """
+    incoming = [CalendarEvent.from_parsed(calendar_month, data) for data in events_data]
+    existing = list(calendar_month.events.all())
+    diff = EventDiff()
+    now = timezone.now()
+    updates = []
+
+    for key in MATCH_KEYS:
+        if not incoming or not existing:
+            break
+        by_key = {}
+        for event in existing:
+            by_key.setdefault(key(event), []).append(event)
+
+        unmatched, matched = [], set()
+        for new in incoming:
+            candidates = by_key.get(key(new))
+            if not candidates:
+                unmatched.append(new)
+                continue
+            old = candidates.pop(0)
+            matched.add(old.pk)
+            if old.manually_edited:
+                diff.kept += 1
+                continue
+            changed = [name for name in PARSED_FIELDS if getattr(old, name) != getattr(new, name)]
+            if not changed:
+                diff.unchanged += 1
+                continue
+            for name in changed:
+                setattr(old, name, getattr(new, name))
+            # bulk_update doesn't apply auto_now
+            old.updated_at = now
+            diff.updated_fields.update(changed)
+            updates.append(old)
+        incoming = unmatched
+        existing = [event for event in existing if event.pk not in matched]
+
+    stale = [event.pk for event in existing if not event.manually_edited]
+    diff.kept += len(existing) - len(stale)
+
+    if updates:
+        CalendarEvent.objects.bulk_update(updates, [*sorted(diff.updated_fields), 'updated_at'], batch_size=500)
+    if incoming:
+        CalendarEvent.objects.bulk_create(incoming)
+    if stale:
+        CalendarEvent.objects.filter(pk__in=stale).delete()
+
+    diff.updated, diff.created, diff.deleted = len(updates), len(incoming), len(stale)
+    return diff
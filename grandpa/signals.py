@@ -0,0 +1,36 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from . import snapshots
+from .caching import bump_events_version
+from .models import CalendarEvent, CalendarMonth
+
+
+@receiver(post_save, sender=CalendarEvent)
+@receiver(post_delete, sender=CalendarEvent)
+@receiver(post_save, sender=CalendarMonth)
+@receiver(post_delete, sender=CalendarMonth)
+def calendar_data_changed(sender, instance, **kwargs):
+    # Bump after commit: bumping earlier would let a reader cache pre-commit data under the new version.
+    # Writes that skip signals (a parse's bulk_create/bulk_update, see reconcile.py) happen inside
+    # the same transaction as a CalendarMonth save whenever they change anything, so they are covered too.
+    transaction.on_commit(bump_events_version)
+
+
+@receiver(post_save, sender=CalendarEvent)
+@receiver(post_delete, sender=CalendarEvent)
+def event_snapshot_stale(sender, instance, **kwargs):
+    periods = {(d.year, d.month) for d in (instance.event_date, getattr(instance, '_previous_event_date', None)) if d}
+    for year, month in periods:
+        snapshots.schedule_rebuild(year, month)
+
+
+@receiver(post_save, sender=CalendarMonth)
+@receiver(post_delete, sender=CalendarMonth)
+def month_snapshot_stale(sender, instance, **kwargs):
+    # Covers the events bulk-written by a parse and a month moved to another year/month,
+    # neither of which sends per-event signals
+    snapshots.schedule_rebuild(instance.year, instance.month)
+    previous = getattr(instance, '_previous_period', None)
+    if previous and previous != (instance.year, instance.month):
+        snapshots.schedule_rebuild(*previous)
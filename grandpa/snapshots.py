@@ -0,0 +1,124 @@
+"""
+Pre-serialized per-month event lists for the events API.
+
+Months are read far more often than they are written (a parse finishing or an admin
+edit), so each month's events are encoded once per output format and stored as a
+MonthSnapshot. A range request is answered by slicing and concatenating snapshot
+bodies instead of loading and serializing rows.
+
+Each body is the month's events, in API order, encoded as JSON objects that are each
+followed by a comma. day_offsets[d - 1] is the byte offset where day d starts and the
+last entry is the body length, so any run of days is a single slice.
+
+Snapshots are rebuilt after commit whenever a month's events change (see signals.py)
+and built on first read if missing. Writes that skip signals (bulk_create outside a
+parse, queryset.update) should be followed by `manage.py rebuild_month_snapshots`.
+"""
+from django.db import transaction
+from django.db.models import Count, Max
+from .models import CalendarEvent, MonthSnapshot
+
+# Ranges spanning more months than this are served from rows instead
+MAX_SNAPSHOT_MONTHS = 24
+
+
+def months_between(first, last):
+    """(year, month) pairs from first's month through last's month, inclusive."""
+    year, month = first.year, first.month
+    months = []
+    while (year, month) <= (last.year, last.month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def encoders():
+    # Imported lazily: api.py imports this module
+    from .api import CalendarEventSchema, FEED_FIELDS, fullcalendar_event, dumps
+    return {
+        MonthSnapshot.KIND_EVENTS: lambda e: dumps(CalendarEventSchema.from_orm(e).model_dump()),
+        MonthSnapshot.KIND_FEED: lambda e: dumps(fullcalendar_event(tuple(getattr(e, f) for f in FEED_FIELDS))),
+    }
+
+
+def encode_month(events, encode):
+    """Returns (body, day_offsets) for one month's ordered events."""
+    parts, offsets, size = [], [], 0
+    for event in events:
+        # Days with no events start where the next event does
+        while len(offsets) < event.event_date.day:
+            offsets.append(size)
+        chunk = encode(event) + b','
+        parts.append(chunk)
+        size += len(chunk)
+    while len(offsets) < 32:
+        offsets.append(size)
+    return b''.join(parts), offsets
+
+
+def rebuild(year, month, force=False):
+    """
+    Re-encodes one month's snapshots. Skipped when the month's event count and newest
+    updated_at already match what the snapshots were built from, so repeated
+    rebuilds after a multi-row edit cost one aggregate query each.
+    Returns the month's snapshots keyed by kind.
+    """
+    from .api import EVENTS_ORDERING, month_bounds
+    events = CalendarEvent.objects.filter(event_date__range=month_bounds(year, month))
+    stats = events.order_by().aggregate(count=Count('id'), last_updated=Max('updated_at'))
+
+    current = {s.kind: s for s in MonthSnapshot.objects.filter(year=year, month=month)}
+    if not force and len(current) == len(MonthSnapshot.KIND_CHOICES) and all(
+        s.event_count == stats['count'] and s.last_updated == stats['last_updated'] for s in current.values()
+    ):
+        return current
+
+    rows = list(events.order_by(*EVENTS_ORDERING))
+    for kind, encode in encoders().items():
+        body, offsets = encode_month(rows, encode)
+        current[kind], _ = MonthSnapshot.objects.update_or_create(
+            kind=kind, year=year, month=month,
+            defaults={
+                'body': body,
+                'day_offsets': offsets,
+                'event_count': stats['count'],
+                'last_updated': stats['last_updated'],
+            },
+        )
+    return current
+
+
+def schedule_rebuild(year, month):
+    """Rebuilds a month's snapshots once the current transaction commits."""
+    if year is None or month is None:
+        return
+    # robust: a failed rebuild must not turn a saved edit into an error page
+    transaction.on_commit(lambda: rebuild(year, month), robust=True)
+
+
+def month_snapshots(kind, first, last):
+    """
+    The snapshots of `kind` covering first..last, in month order, building any that
+    are missing.
+    """
+    months = months_between(first, last)
+    found = {
+        (s.year, s.month): s
+        for s in MonthSnapshot.objects.filter(kind=kind, year__range=(first.year, last.year))
+        if (s.year, s.month) in months
+    }
+    for year, month in months:
+        if (year, month) not in found:
+            found[(year, month)] = rebuild(year, month)[kind]
+    return [found[m] for m in months]
+
+
+def concatenate(snapshots, first, last):
+    """The JSON array of events dated first..last (inclusive) from month_snapshots()."""
+    parts = []
+    for snapshot in snapshots:
+        body = bytes(snapshot.body)
+        start_day = first.day if (snapshot.year, snapshot.month) == (first.year, first.month) else 1
+        end_day = last.day if (snapshot.year, snapshot.month) == (last.year, last.month) else 31
+        parts.append(body[snapshot.day_offsets[start_day - 1]:snapshot.day_offsets[end_day]])
+    return b'[' + b''.join(parts)[:-1] + b']' if any(parts) else b'[]'
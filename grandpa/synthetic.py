@@ -0,0 +1,84 @@
+"""
+Synthetic CalendarMonth/CalendarEvent data for benchmarks.
+"""
+import calendar
+import random
+from datetime import date
+from .models import CalendarEvent, CalendarMonth
+
+ACTIVITIES = [
+    "Bingo", "History Facts", "Chair Yoga", "Rosary", "Movie Matinee", "Hymn Sing",
+    "Manicures", "Trivia", "Bible Study", "Balloon Volleyball", "Coffee Social",
+    "Word Games", "Catholic Mass", "Pet Therapy", "Music with Dave", "Happy Hour",
+]
+
+ALL_DAY_EVENTS = ["Birthday Celebration", "Holiday Party", "Outing: Lake Park", "Family Day"]
+
+TIME_SLOTS = [
+    (9, 0, "am"), (9, 30, "am"), (10, 0, "am"), (10, 30, "am"), (11, 0, "am"),
+    (1, 0, "pm"), (1, 30, "pm"), (2, 0, "pm"), (3, 0, "pm"), (3, 30, "pm"), (6, 30, "pm"),
+]
+
+
+def generate_calendar_data(start_year, years, events_per_day, seed=0, batch_size=5000, all_day_rate=0.0):
+    """
+    Creates `years` years of parsed months starting at `start_year`, each day holding
+    `events_per_day` timed events, plus an all-day event on `all_day_rate` of days.
+    Uses bulk_create, so no parse jobs are queued and no signals are sent.
+    Returns (months_created, events_created).
+    """
+    rnd = random.Random(seed)
+    months = CalendarMonth.objects.bulk_create([
+        CalendarMonth(
+            image='',
+            year=year,
+            month=month,
+            successfully_parsed=True,
+            parsed_data={"successfully_parsed": True, "synthetic": True},
+        )
+        for year in range(start_year, start_year + years)
+        for month in range(1, 13)
+    ])
+
+    created = 0
+    batch = []
+    for calendar_month in months:
+        days = calendar.monthrange(calendar_month.year, calendar_month.month)[1]
+        for day in range(1, days + 1):
+            if all_day_rate and rnd.random() < all_day_rate:
+                title = rnd.choice(ALL_DAY_EVENTS)
+                batch.append(CalendarEvent(
+                    calendar_month=calendar_month,
+                    day=day,
+                    event_date=date(calendar_month.year, calendar_month.month, day),
+                    title=title,
+                    color="blue",
+                    all_day=True,
+                    original_text=f"All day: {title}",
+                ))
+            for hour, minute, am_pm in sorted(rnd.sample(TIME_SLOTS, min(events_per_day, len(TIME_SLOTS)))):
+                title = rnd.choice(ACTIVITIES)
+                featured = rnd.random() < 0.1
+                batch.append(CalendarEvent(
+                    calendar_month=calendar_month,
+                    day=day,
+                    event_date=date(calendar_month.year, calendar_month.month, day),
+                    hour=hour,
+                    minute=minute,
+                    am_pm=am_pm,
+                    start_minute_of_day=CalendarEvent.compute_start_minute(hour, minute, am_pm),
+                    title=title,
+                    color="red" if featured else "black",
+                    all_day=False,
+                    featured=featured,
+                    original_text=f"{hour}:{minute:02d}{am_pm} {title}",
+                ))
+            if len(batch) >= batch_size:
+                CalendarEvent.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+    if batch:
+        CalendarEvent.objects.bulk_create(batch)
+        created += len(batch)
+
+    return len(months), created
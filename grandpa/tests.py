@@ -1,3 +1,856 @@
-from django.test import TestCase
+import asyncio
+import io
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.test import (
+    AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.utils import timezone
+from google.genai import errors as genai_errors, types
+from PIL import Image
+from . import hedging, metrics
+from .fake_gemini import FakeGeminiBackend, FakeGeminiError
+from .fake_messaging import FakeTwilioClient
+from .fanout import fan_out
+from .gemini import CalendarProcessor, GeminiBackend
+from .imaging import PreparedImage
+from .jobs import claim_jobs, run_job
+from .models import (
+    CalendarEvent, CalendarMonth, GeminiUpload, MonthSnapshot, ParseCacheEntry, ParseJob, RecipientGroup, TwilioConversation,
+)
+from .notifications import TokenBucket, send_message
+from .profiling import QueryProfile, QueryProfilingMiddleware
+from .uploads import cleanup
+from .utils import get_current_date
+from .views import get_events_text
 
-# Create your tests here.
+FAKE_GEMINI = 'grandpa.fake_gemini.FakeGeminiBackend'
+
+
+def make_image(seed):
+    """
+    A small, unique PNG so every upload has its own content hash.
+    """
+    image = Image.new('RGB', (320, 240), (255, 255, 255))
+    image.putpixel((seed % 320, (seed // 320) % 240), (0, 0, 0))
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+@override_settings(GEMINI_BACKEND=FAKE_GEMINI, GEMINI_FAKE_LATENCY_SECONDS=0, GEMINI_FAKE_ERROR_RATE=0,
+                   PARSE_JOB_RETRY_BACKOFF_SECONDS=0, GEMINI_RETRY_BACKOFF_SECONDS=0)
+class OfflineIngestionTests(TransactionTestCase):
+    """
+    Upload -> parse -> bulk_create through the job queue, against the replay fake.
+    """
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def upload(self, seed=0):
+        calendar_month = CalendarMonth()
+        calendar_month.image.save(f'calendar_{seed}.png', ContentFile(make_image(seed)), save=False)
+        calendar_month.save()
+        return calendar_month
+
+    def run_worker(self, concurrency=2):
+        call_command('run_parse_worker', '--once', f'--concurrency={concurrency}', '--poll-interval=0.01',
+                     stdout=io.StringIO())
+
+    def test_upload_is_parsed_and_events_stored(self):
+        calendar_month = self.upload()
+        self.assertEqual(ParseJob.objects.get().status, ParseJob.STATUS_PENDING)
+
+        self.run_worker()
+
+        calendar_month.refresh_from_db()
+        self.assertTrue(calendar_month.successfully_parsed)
+        self.assertEqual((calendar_month.month, calendar_month.year), (1, 2026))
+        self.assertEqual(calendar_month.events.count(), len(calendar_month.parsed_data['events']))
+        self.assertEqual(ParseJob.objects.get().status, ParseJob.STATUS_SUCCEEDED)
+
+    def test_repeat_upload_is_served_from_cache(self):
+        self.upload(seed=1)
+        self.upload(seed=1)
+
+        self.run_worker(concurrency=1)
+
+        entry = ParseCacheEntry.objects.get()
+        self.assertEqual(entry.hits, 1)
+        self.assertEqual(CalendarMonth.objects.filter(successfully_parsed=True).count(), 2)
+
+    @override_settings(GEMINI_FAKE_ERROR_RATE=1.0)
+    def test_injected_failure_is_retried_then_fails(self):
+        calendar_month = self.upload()
+        ParseJob.objects.update(max_attempts=2)
+
+        job, = claim_jobs('test-worker', 1)
+        self.assertEqual(run_job(job), ParseJob.STATUS_PENDING)
+        self.assertIn('Injected', ParseJob.objects.get().last_error)
+
+        job, = claim_jobs('test-worker', 1)
+        self.assertEqual(run_job(job), ParseJob.STATUS_FAILED)
+        calendar_month.refresh_from_db()
+        self.assertEqual(calendar_month.parsed_data['status'], 'failed')
+        self.assertFalse(CalendarEvent.objects.exists())
+
+    def test_metrics_endpoint(self):
+        metrics.reset()
+        self.upload(seed=2)
+        self.upload(seed=2)
+        self.run_worker(concurrency=1)
+        with override_settings(GEMINI_FAKE_ERROR_RATE=1.0):
+            self.upload(seed=3)
+            ParseJob.objects.filter(status=ParseJob.STATUS_PENDING).update(max_attempts=1)
+            self.run_worker(concurrency=1)
+
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            response = self.client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        samples = dict(line.rsplit(' ', 1) for line in response.content.decode().splitlines()
+                       if not line.startswith('#'))
+        self.assertEqual(samples['grandpa_parse_results_total{outcome="parsed"}'], '2')
+        self.assertEqual(samples['grandpa_parse_results_total{outcome="failed"}'], '1')
+        self.assertEqual(samples['grandpa_parse_failures_total{reason="server_error"}'], '1')
+        self.assertEqual(samples['grandpa_parse_cache_hits_total'], '1')
+        self.assertEqual(samples['grandpa_parse_seconds_count'], '3')
+        self.assertEqual(samples['grandpa_parse_db_write_seconds_count'], '2')
+        self.assertEqual(samples['grandpa_parse_events_bucket{le="+Inf"}'], '2')
+
+    @override_settings(GEMINI_FAKE_LATENCY_SECONDS=0.2)
+    def test_concurrent_worker_throughput(self):
+        uploads = 12
+        for seed in range(uploads):
+            self.upload(seed=seed)
+        FakeGeminiBackend.max_in_flight = 0
+
+        self.run_worker(concurrency=6)
+
+        self.assertEqual(ParseJob.objects.filter(status=ParseJob.STATUS_SUCCEEDED).count(), uploads)
+        # Model calls overlapped, up to the worker's concurrency (not timed: CI speed varies)
+        self.assertGreater(FakeGeminiBackend.max_in_flight, 1)
+        self.assertLessEqual(FakeGeminiBackend.max_in_flight, 6)
+
+    def bulk_parse(self, *args):
+        out = io.StringIO()
+        call_command('bulk_parse', *args, f'--checkpoint={self.media_root}/bulk.json', '--poll-interval=0.01',
+                     stdout=out)
+        return out.getvalue()
+
+    def test_bulk_ingest_resumes_from_checkpoint(self):
+        photos = os.path.join(self.media_root, 'photos')
+        os.makedirs(photos)
+        for seed in range(3):
+            with open(os.path.join(photos, f'photo_{seed}.png'), 'wb') as f:
+                f.write(make_image(seed))
+
+        output = self.bulk_parse(f'--ingest={photos}', '--calendar=family', '--prepare-workers=1')
+        self.assertIn('[3/3]', output)
+        self.assertEqual(CalendarMonth.objects.filter(calendar='family', successfully_parsed=True).count(), 3)
+        self.assertEqual(ParseJob.objects.filter(status=ParseJob.STATUS_SUCCEEDED).count(), 3)
+
+        # A rerun skips everything already done and creates no duplicate months
+        output = self.bulk_parse(f'--ingest={photos}', '--calendar=family', '--prepare-workers=0')
+        self.assertIn('3 items, 3 already done', output)
+        self.assertEqual(CalendarMonth.objects.count(), 3)
+
+        # A reparse runs a fresh job per selected month in this process
+        month = CalendarMonth.objects.order_by('pk').first()
+        self.bulk_parse('--reparse', f'--ids={month.pk}', '--prepare-workers=0', '--restart')
+        self.assertEqual(month.parse_jobs.filter(status=ParseJob.STATUS_SUCCEEDED).count(), 2)
+
+
+class MetricsStoreTests(SimpleTestCase):
+    """
+    Metric keys never expire, even in a file cache with a default TIMEOUT.
+    """
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        # The file cache's incr() re-set()s with this alias' default 300s TIMEOUT
+        caches_setting = override_settings(METRICS_CACHE='metrics', CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'metrics': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory},
+        })
+        caches_setting.enable()
+        self.addCleanup(caches_setting.disable)
+
+    def stored_expiry(self, key):
+        # The file cache stores the expiry timestamp (None: never) ahead of the value
+        with open(metrics.store()._key_to_file(f'{metrics.KEY_PREFIX}{key}'), 'rb') as f:
+            return pickle.load(f)
+
+    def test_counters_and_histograms_never_expire(self):
+        for _ in range(2):
+            metrics.inc('grandpa_gemini_hedges_total')
+            metrics.observe('grandpa_parse_seconds', 0.2)
+
+        for key in ('grandpa_gemini_hedges_total:', 'grandpa_parse_seconds:bucket:0.25',
+                    'grandpa_parse_seconds:sum', 'grandpa_parse_seconds:count'):
+            self.assertIsNone(self.stored_expiry(key), key)
+        self.assertIn('grandpa_parse_seconds_count 2', metrics.render())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class EventsTextQueryTests(TestCase):
+    """
+    get_events_text and the /messages endpoints must not grow queries with the data.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.today = get_current_date()
+        self.month = CalendarMonth.objects.create(image='', year=self.today.year, month=self.today.month)
+
+    def add_event(self, title, hour=None, minute=None, am_pm=None, all_day=False, day=None):
+        return CalendarEvent.objects.create(
+            calendar_month=self.month, day=day or self.today.day, hour=hour, minute=minute, am_pm=am_pm,
+            all_day=all_day, title=title, original_text=title,
+        )
+
+    def test_constant_queries_regardless_of_event_count(self):
+        for count in (0, 1, 25):
+            for i in range(count):
+                self.add_event(f"Event {i}", hour=(i % 12) + 1, minute=0, am_pm='pm')
+            with self.assertNumQueries(1):
+                get_events_text(self.today, "today")
+
+    def test_empty_month_is_one_query(self):
+        CalendarEvent.objects.all().delete()
+        with self.assertNumQueries(1):
+            text = get_events_text(self.today, "today")
+        self.assertIn("No events entered yet", text)
+
+    def test_events_are_listed_in_time_order(self):
+        self.add_event("Bingo", hour=1, minute=30, am_pm='pm')
+        self.add_event("History Facts", hour=9, minute=0, am_pm='am')
+        self.add_event("Birthday Party", all_day=True)
+
+        lines = get_events_text(self.today, "today").splitlines()
+        self.assertEqual(lines[1:4], [
+            "All Day - Birthday Party",
+            "9:00 AM - History Facts",
+            "1:30 PM - Bingo",
+        ])
+
+    def test_same_start_time_keeps_a_fixed_order(self):
+        for title in ("Zumba", "Art", "Mass"):
+            self.add_event(title, hour=10, minute=0, am_pm='am')
+
+        lines = get_events_text(self.today, "today").splitlines()
+        # By id, the same order every render
+        self.assertEqual(lines[1:4], ["10:00 AM - Zumba", "10:00 AM - Art", "10:00 AM - Mass"])
+
+    def test_events_api_orders_by_24_hour_start(self):
+        self.add_event("Bingo", hour=1, minute=30, am_pm='pm')
+        self.add_event("Movie", hour=12, minute=0, am_pm='pm')
+        self.add_event("Coffee", hour=9, minute=0, am_pm='am')
+        self.add_event("Midnight Snack", hour=12, minute=0, am_pm='am')
+        self.add_event("Sometime")
+        self.add_event("Birthday Party", all_day=True)
+
+        expected = ["Birthday Party", "Midnight Snack", "Coffee", "Movie", "Bingo", "Sometime"]
+        day = {'year': self.today.year, 'month': self.today.month, 'day': self.today.day}
+        month = {'year': self.today.year, 'month': self.today.month}
+        for path, params in (('/api/events', day), ('/api/events', month), ('/api/events/feed', month)):
+            titles = [e['title'] for e in self.client.get(path, params).json()]
+            self.assertEqual(titles, expected, (path, params))
+
+    def test_out_of_range_year_returns_no_events(self):
+        for path in ('/api/events', '/api/events/feed'):
+            response = self.client.get(path, {'year': 10000})
+            self.assertEqual((response.status_code, response.json()), (200, []), path)
+
+    def test_endpoint_is_one_query_then_cached(self):
+        self.add_event("Bingo", hour=2, minute=0, am_pm='pm')
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/messages/today')
+        self.assertContains(response, "2:00 PM - Bingo")
+
+        with self.assertNumQueries(0):
+            cached = self.client.get('/messages/today', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+
+class EventsETagTests(TestCase):
+    """
+    /api/events revalidates with ETags: 304 while current, 200 once the range changes.
+    """
+
+    def setUp(self):
+        self.month = CalendarMonth.objects.create(image='', year=2026, month=3)
+        self.events = [
+            CalendarEvent.objects.create(calendar_month=self.month, day=10, hour=hour, minute=0, am_pm='am',
+                                         title=f"Event {hour}", original_text="-")
+            for hour in (9, 10)
+        ]
+        # A single day: served from rows, so the tag comes from events_etag
+        self.params = {'year': 2026, 'month': 3, 'day': 10}
+
+    def get(self, etag=None):
+        headers = {'If-None-Match': etag} if etag else {}
+        return self.client.get('/api/events', self.params, headers=headers)
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.get()['ETag']
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_edit_changes_the_etag(self):
+        etag = self.get()['ETag']
+        self.events[1].title = "Renamed"
+        self.events[1].save()
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Renamed", [e['title'] for e in response.json()])
+
+    def test_deletion_changes_the_etag(self):
+        etag = self.get()['ETag']
+        # Not the newest row: only the count tells the responses apart
+        self.events[0].delete()
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+
+
+class MonthSnapshotTests(TestCase):
+    """
+    Month and range requests served from snapshots must match the row-based responses.
+    """
+
+    def setUp(self):
+        self.months = [CalendarMonth.objects.create(image='', year=2026, month=m) for m in (1, 2)]
+        for calendar_month in self.months:
+            for day in (1, 2, 15, 28):
+                for hour, am_pm in ((9, 'am'), (2, 'pm')):
+                    CalendarEvent.objects.create(
+                        calendar_month=calendar_month, day=day, hour=hour, minute=0, am_pm=am_pm,
+                        title=f"Event {calendar_month.month}/{day} {hour}{am_pm}", original_text="-",
+                    )
+
+    def from_rows(self, path):
+        # A single day is never served from snapshots, so collect day by day
+        events = []
+        for month in (1, 2):
+            for day in range(1, 29):
+                events += self.client.get(path, {'year': 2026, 'month': month, 'day': day}).json()
+        return events
+
+    def test_range_matches_row_based_responses(self):
+        for path in ('/api/events', '/api/events/feed'):
+            expected = self.from_rows(path)
+            ranged = self.client.get(path, {'start': '2026-01-02T00:00:00-06:00', 'end': '2026-02-28T00:00:00-06:00'}).json()
+            # Days 2..Feb 27: drops Jan 1 and Feb 28
+            self.assertEqual(ranged, expected[2:-2])
+            self.assertEqual(self.client.get(path, {'year': 2026}).json(), expected)
+
+    def test_served_with_one_query(self):
+        self.client.get('/api/events/feed', {'year': 2026, 'month': 1})
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/events/feed', {'year': 2026, 'month': 1})
+        self.assertEqual(len(response.json()), 8)
+
+    def test_edit_rebuilds_only_its_month(self):
+        self.client.get('/api/events/feed', {'year': 2026})
+        february = MonthSnapshot.objects.get(kind=MonthSnapshot.KIND_FEED, year=2026, month=2).built_at
+
+        event = CalendarEvent.objects.filter(calendar_month=self.months[0]).first()
+        event.title = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            event.save()
+
+        titles = [e['title'] for e in self.client.get('/api/events/feed', {'year': 2026, 'month': 1}).json()]
+        self.assertIn("Renamed", titles)
+        self.assertEqual(MonthSnapshot.objects.get(kind=MonthSnapshot.KIND_FEED, year=2026, month=2).built_at, february)
+
+
+    def test_event_moved_to_another_month_leaves_the_old_one(self):
+        self.client.get('/api/events/feed', {'year': 2026})
+        event = CalendarEvent.objects.filter(calendar_month=self.months[0]).first()
+        event.calendar_month = self.months[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            event.save()
+
+        january = [e['id'] for e in self.client.get('/api/events/feed', {'year': 2026, 'month': 1}).json()]
+        february = [e['id'] for e in self.client.get('/api/events/feed', {'year': 2026, 'month': 2}).json()]
+        self.assertNotIn(event.pk, january)
+        self.assertIn(event.pk, february)
+
+
+@override_settings(PARSE_STATUS_POLL_SECONDS=0.01)
+class ParseStatusStreamTests(TransactionTestCase):
+    """
+    The admin's parse status stream follows a month from processing to done.
+    """
+
+    def setUp(self):
+        self.month = CalendarMonth.objects.create(image='', parsed_data={"status": "processing", "successfully_parsed": False})
+        self.staff = get_user_model().objects.create_user('staff', password='x', is_staff=True)
+        self.client = AsyncClient()
+
+    async def read_stream(self, response):
+        return b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+    async def test_streams_transition_to_success(self):
+        await self.client.aforce_login(self.staff)
+        response = await self.client.get(f'/calendar/months/{self.month.pk}/status/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        async def finish_parse():
+            await asyncio.sleep(0.05)
+            await CalendarMonth.objects.filter(pk=self.month.pk).aupdate(
+                parsed_data={"successfully_parsed": True}, successfully_parsed=True,
+            )
+
+        _, body = await asyncio.gather(finish_parse(), self.read_stream(response))
+        events = [block.splitlines() for block in body.strip().split('\n\n') if not block.startswith(':')]
+        self.assertEqual([lines[0] for lines in events], ['event: status', 'event: status', 'event: done'])
+        self.assertIn('"state": "processing"', events[0][1])
+        self.assertIn('"state": "success"', events[-1][1])
+
+    async def test_unparsed_result_ends_the_stream(self):
+        # Not a calendar: finished, unsuccessful, with no status or error key
+        await CalendarMonth.objects.filter(pk=self.month.pk).aupdate(parsed_data={"successfully_parsed": False})
+        await self.client.aforce_login(self.staff)
+        response = await self.client.get(f'/calendar/months/{self.month.pk}/status/')
+
+        body = await self.read_stream(response)
+        self.assertIn('event: done', body)
+        self.assertIn('"state": "failed"', body)
+
+    async def test_requires_staff(self):
+        response = await self.client.get(f'/calendar/months/{self.month.pk}/status/')
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(TWILIO_PHONE_NUMBER='+15550000000', TWILIO_RETRY_BACKOFF_SECONDS=0.01, TWILIO_SEND_RATE=1000)
+class NotificationTests(TransactionTestCase):
+    """
+    The notification path against the in-process Twilio stand-in.
+    """
+
+    def test_steady_state_send_is_one_api_call(self):
+        client = FakeTwilioClient()
+        numbers = ['+15550000001', '+15550000002', '+15550000003']
+        send_message(client, 'family', "Family", numbers, "first")
+        client.calls.clear()
+
+        send_message(client, 'family', "Family", numbers, "second")
+        self.assertEqual(client.calls, {'messages.create': 1})
+        conversation = client.find('family')
+        self.assertEqual(set(conversation.participants), set(numbers))
+        self.assertEqual([body for _, body in conversation.messages], ["first", "second"])
+
+    def test_deleted_conversation_is_recreated(self):
+        client = FakeTwilioClient()
+        send_message(client, 'family', "Family", ['+15550000001'], "first")
+        client.conversation_store.clear()
+
+        send_message(client, 'family', "Family", ['+15550000001'], "second")
+        self.assertEqual(client.find('family').messages[0][1], "second")
+        self.assertEqual(TwilioConversation.objects.get().sid, client.find('family').sid)
+
+    def test_fan_out_respects_calendars_and_retries_throttling(self):
+        target = date(2031, 3, 4)
+        for calendar, title in (('north', "North Bingo"), ('', "Main Party")):
+            month = CalendarMonth.objects.create(image='', calendar=calendar, year=2031, month=3)
+            CalendarEvent.objects.create(calendar_month=month, day=4, all_day=True, title=title, original_text='')
+        for i, calendars in enumerate([['north'], [''], [], ['south']] * 3):
+            RecipientGroup.objects.create(name=f"Group {i}", conversation_name=f"group-{i}", calendars=calendars,
+                                          participants=f"724555{i:04d}")
+
+        # Answered with 429s whatever the machine's speed; each is retried after a backoff
+        client = FakeTwilioClient()
+        client.throttle_next = 3
+        report = fan_out(client, target_date=target)
+
+        self.assertEqual((report.count('sent'), report.count('skipped'), report.count('failed')), (9, 3, 0))
+        self.assertEqual(client.throttled, 3)
+        self.assertGreater(len(client.find('group-2').participants), 0)
+        self.assertIn("North Bingo", client.find('group-0').messages[0][1])
+        self.assertNotIn("Main Party", client.find('group-0').messages[0][1])
+        self.assertIn("Main Party", client.find('group-2').messages[0][1])
+        self.assertIsNone(client.find('group-3'))
+
+
+class TokenBucketTests(SimpleTestCase):
+    """
+    The send rate limit, on a fake clock.
+    """
+
+    def test_burst_then_rate(self):
+        clock = SimpleNamespace(now=0.0, slept=[])
+
+        def sleep(seconds):
+            clock.slept.append(seconds)
+            clock.now += seconds
+
+        bucket = TokenBucket(rate=10, capacity=2, clock=lambda: clock.now, sleep=sleep)
+        for _ in range(5):
+            bucket.acquire()
+
+        # Two from the burst, then one every 1/rate seconds
+        self.assertEqual(len(clock.slept), 3)
+        self.assertAlmostEqual(clock.now, 0.3)
+
+
+class QueryProfilingTests(TestCase):
+    """
+    The opt-in profiling middleware and its report.
+    """
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.log = os.path.join(directory, 'query_profile.log')
+        for m in range(1, 7):
+            month = CalendarMonth.objects.create(image='', year=2031, month=m)
+            CalendarEvent.objects.create(calendar_month=month, day=2, all_day=True, title="Party", original_text='')
+        # Snapshots are rebuilt on commit, which a TestCase never reaches
+        call_command('rebuild_month_snapshots', stdout=io.StringIO())
+
+    def test_repeated_shapes_are_flagged(self):
+        profile = QueryProfile()
+        with connection.execute_wrapper(profile):
+            for month in CalendarMonth.objects.all():
+                list(month.events.all())
+        self.assertEqual(len(profile.queries), 7)
+        self.assertEqual([count for count, _ in profile.repeated(5).values()], [6])
+
+    def test_server_timing_and_log(self):
+        with override_settings(QUERY_PROFILING=True, QUERY_PROFILING_LOG=self.log):
+            response = self.client.get('/api/events', {'start': '2031-01-01', 'end': '2031-07-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", total;dur=[\d.]+$')
+
+        # Each process writes its own file
+        self.assertEqual(os.listdir(os.path.dirname(self.log)), [f'query_profile.log.{os.getpid()}'])
+        # ...and the report reads them all, here another worker's
+        shutil.copy(f'{self.log}.{os.getpid()}', f'{self.log}.1')
+
+        output = io.StringIO()
+        call_command('query_profile_report', log=self.log, stdout=output)
+        self.assertIn('2 requests in 2 files', output.getvalue())
+        self.assertIn('GET api/events', output.getvalue())
+
+    def test_repeats_are_logged_as_warnings(self):
+        def view(request):
+            for month in CalendarMonth.objects.all():
+                list(month.events.all())
+            return HttpResponse()
+
+        with override_settings(QUERY_PROFILING=True, QUERY_PROFILING_LOG=''):
+            middleware = QueryProfilingMiddleware(view)
+        with self.assertLogs('grandpa.profiling', 'WARNING') as logs:
+            middleware(RequestFactory().get('/months'))
+        self.assertIn('Possible N+1 on /months: 6 x', logs.output[0])
+
+    def test_report_clear(self):
+        with override_settings(QUERY_PROFILING=True, QUERY_PROFILING_LOG=self.log):
+            self.client.get('/api/events', {'start': '2031-01-01', 'end': '2031-07-01'})
+        current = f'{self.log}.{os.getpid()}'
+        # An exited worker's file, and a rotated-out file of this one
+        shutil.copy(current, f'{self.log}.999999999')
+        shutil.copy(current, f'{current}.1')
+
+        output = io.StringIO()
+        call_command('query_profile_report', log=self.log, clear=True, stdout=output)
+        self.assertIn('3 requests in 3 files', output.getvalue())
+        self.assertIn('Cleared 3 files', output.getvalue())
+        # This (running) process's file is emptied, not removed, since it is still appending to it
+        self.assertEqual(os.listdir(os.path.dirname(self.log)), [f'query_profile.log.{os.getpid()}'])
+        self.assertEqual(os.path.getsize(current), 0)
+
+    def test_disabled_by_default(self):
+        response = self.client.get('/api/events', {'start': '2031-01-01', 'end': '2031-07-01'})
+        self.assertNotIn('Server-Timing', response)
+
+
+@override_settings(GEMINI_RETRY_BACKOFF_SECONDS=0, GEMINI_HEDGE_AFTER_SECONDS=0.05, GEMINI_HEDGE_MIN_SAMPLES=10 ** 6)
+class HedgingTests(SimpleTestCase):
+    """
+    Deadlines, retries and hedging around extraction calls.
+    """
+
+    def flaky(self, *outcomes):
+        """A call whose n-th invocation sleeps/raises/returns according to outcomes[n]."""
+        calls = iter(outcomes)
+
+        def fn():
+            delay, outcome = next(calls)
+            time.sleep(delay)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        return fn
+
+    @override_settings(GEMINI_HEDGING=True)
+    def test_hedge_wins_over_slow_attempt(self):
+        start = time.perf_counter()
+        result = hedging.call(self.flaky((2, 'slow'), (0, 'hedge')))
+        self.assertEqual(result, 'hedge')
+        self.assertLess(time.perf_counter() - start, 1)
+
+    @override_settings(GEMINI_REQUEST_TIMEOUT_SECONDS=0.1, GEMINI_MAX_RETRIES=0)
+    def test_deadline(self):
+        with self.assertRaises(hedging.DeadlineExceeded):
+            hedging.call(self.flaky((1, 'late')))
+
+    def test_transient_errors_are_retried(self):
+        fn = self.flaky((0, FakeGeminiError("503")), (0, FakeGeminiError("503")), (0, 'ok'))
+        self.assertEqual(hedging.call(fn), 'ok')
+        with self.assertRaises(ValueError):
+            hedging.call(self.flaky((0, ValueError("bad JSON")), (0, 'never')))
+
+    @override_settings(GEMINI_HEDGING=True)
+    def test_async_loser_is_cancelled(self):
+        cancelled = []
+
+        async def attempt(delay, value):
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.append(value)
+                raise
+            return value
+
+        attempts = iter([(2, 'slow'), (0, 'hedge')])
+        result = asyncio.run(hedging.acall(lambda: attempt(*next(attempts))))
+        self.assertEqual(result, 'hedge')
+        self.assertEqual(cancelled, ['slow'])
+
+
+class ExportImportTests(TestCase):
+    """
+    export_events -> import_events round trip, through COPY on PostgreSQL and the
+    bulk_create fallback elsewhere.
+    """
+
+    def test_round_trip(self):
+        from .synthetic import generate_calendar_data
+        generate_calendar_data(2031, 1, 3, all_day_rate=0.2)
+        CalendarMonth.objects.filter(month=1).update(parsed_data={"events": [{"title": "Tab\tand\nnewline"}]})
+        before = list(CalendarEvent.objects.order_by('pk').values_list(
+            'pk', 'calendar_month_id', 'event_date', 'start_minute_of_day', 'all_day', 'title'))
+        months_before = list(CalendarMonth.objects.order_by('pk').values_list('pk', 'year', 'month', 'parsed_data'))
+
+        path = os.path.join(tempfile.mkdtemp(), 'events.ndjson.gz')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        call_command('export_events', output=path, stderr=io.StringIO())
+
+        with self.assertRaises(CommandError):
+            call_command('import_events', path, stdout=io.StringIO())
+        output = io.StringIO()
+        call_command('import_events', path, clear=True, stdout=output)
+
+        self.assertIn(f'Imported 12 months / {len(before)} events', output.getvalue())
+        self.assertEqual(list(CalendarEvent.objects.order_by('pk').values_list(
+            'pk', 'calendar_month_id', 'event_date', 'start_minute_of_day', 'all_day', 'title')), before)
+        self.assertEqual(list(CalendarMonth.objects.order_by('pk').values_list('pk', 'year', 'month', 'parsed_data')),
+                         months_before)
+        # New rows don't collide with the imported ids
+        self.assertGreater(CalendarMonth.objects.create(image='').pk, months_before[-1][0])
+
+
+class ReconcileTests(TestCase):
+    """
+    Re-parses are applied as a minimal diff against the stored events.
+    """
+
+    def setUp(self):
+        self.month = CalendarMonth.objects.create(image='')
+        self.events = [
+            {"day": 3, "hour": 10, "minute": 0, "am_pm": "am", "title": "Bingo", "original_text": "10am Bingo",
+             "color": "black"},
+            {"day": 3, "hour": 2, "minute": 0, "am_pm": "pm", "title": "Trivia", "original_text": "2pm Trivia",
+             "color": "black"},
+            {"day": 4, "all_day": True, "title": "Outing", "original_text": "Outing", "color": "red"},
+        ]
+
+    def store(self, events):
+        result = {"successfully_parsed": True, "month": 5, "year": 2031, "events": events}
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            diff = CalendarMonth.store_parse_result(self.month.pk, result)
+        return diff, callbacks
+
+    def test_unchanged_reparse_writes_nothing(self):
+        self.store(self.events)
+        ids = set(CalendarEvent.objects.values_list('pk', flat=True))
+
+        diff, callbacks = self.store(self.events)
+        self.assertEqual((diff.created, diff.updated, diff.deleted, diff.unchanged), (0, 0, 0, 3))
+        self.assertEqual(set(CalendarEvent.objects.values_list('pk', flat=True)), ids)
+        # No signals: snapshots and cached text stay valid
+        self.assertEqual(callbacks, [])
+
+    def test_minimal_diff(self):
+        self.store(self.events)
+        bingo = CalendarEvent.objects.get(title="Bingo")
+        changed = [
+            {**self.events[0], "hour": 11, "original_text": "11am Bingo"},  # time re-read
+            self.events[2],
+            {"day": 5, "hour": 1, "minute": 30, "am_pm": "pm", "title": "Yoga", "original_text": "1:30pm Yoga",
+             "color": "black"},
+        ]
+        diff, callbacks = self.store(changed)
+
+        self.assertEqual((diff.created, diff.updated, diff.deleted, diff.unchanged), (1, 1, 1, 1))
+        bingo.refresh_from_db()
+        self.assertEqual(bingo.start_minute_of_day, 11 * 60)
+        self.assertFalse(CalendarEvent.objects.filter(title="Trivia").exists())
+        self.assertTrue(callbacks)
+
+    def test_manual_corrections_are_kept(self):
+        self.store(self.events)
+        CalendarEvent.objects.filter(title="Trivia").update(title="Trivia with Dave", manually_edited=True)
+
+        diff, _ = self.store(self.events[:1])
+        self.assertEqual((diff.deleted, diff.kept), (1, 1))
+        self.assertEqual(set(CalendarEvent.objects.values_list('title', flat=True)), {"Bingo", "Trivia with Dave"})
+
+    def admin_post(self, url, data):
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302, response.content[:2000])
+
+    def test_events_added_in_admin_are_kept(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', password='x'))
+        self.store(self.events)
+        self.month.image = 'calendar_images/may.png'
+        self.month.save()
+        added = {"day": 6, "hour": 3, "minute": 0, "am_pm": "pm", "color": "black"}
+
+        # Standalone
+        self.admin_post('/admin/grandpa/calendarevent/add/', {
+            **added, "calendar_month": self.month.pk, "title": "Concert", "original_text": "3pm Concert",
+        })
+        # Inline, on the month's change page
+        self.admin_post(f'/admin/grandpa/calendarmonth/{self.month.pk}/change/', {
+            "calendar": "", "month": 5, "year": 2031, "successfully_parsed": "on", "notes_or_announcements": "[]",
+            "events-TOTAL_FORMS": 1, "events-INITIAL_FORMS": 0, "events-MIN_NUM_FORMS": 0, "events-MAX_NUM_FORMS": 1000,
+            **{f"events-0-{name}": value for name, value in {**added, "day": 7, "title": "Choir"}.items()},
+            "events-0-calendar_month": self.month.pk,
+        })
+
+        self.assertEqual(set(CalendarEvent.objects.filter(manually_edited=True).values_list('title', flat=True)),
+                         {"Concert", "Choir"})
+        diff, _ = self.store(self.events)
+        self.assertEqual((diff.deleted, diff.kept), (0, 2))
+
+
+class FakeFilesClient:
+    """
+    Just enough of genai.Client for GeminiBackend.extract: Files API uploads and
+    deletes, and a generate_content that fails for files deleted server-side.
+    """
+
+    def __init__(self):
+        self.files = self
+        self.models = self
+        self.uploaded, self.deleted, self.missing = [], [], set()
+        # Raised by every generate_content call when set
+        self.error = None
+
+    def upload(self, file, config):
+        name = f"files/{len(self.uploaded)}"
+        self.uploaded.append(name)
+        return types.File(name=name, uri=f"https://example.test/{name}", mime_type=config.mime_type,
+                          size_bytes=len(file.getvalue()), expiration_time=timezone.now() + timedelta(hours=48))
+
+    def delete(self, name):
+        self.deleted.append(name)
+
+    def generate_content(self, model, contents, config):
+        if self.error is not None:
+            raise self.error
+        if contents[0].file_data.file_uri in self.missing:
+            raise genai_errors.APIError(403, {'error': {'message': 'File not found', 'status': 'PERMISSION_DENIED'}})
+        return SimpleNamespace(parsed=None, usage_metadata=None, text='{"successfully_parsed": false, "events": []}')
+
+
+class GeminiUploadTests(TransactionTestCase):
+    """
+    Files API uploads are reused per image hash and cleaned up in batches.
+    """
+
+    def setUp(self):
+        self.client_stub = FakeFilesClient()
+        self.backend = GeminiBackend(api_key='test-key')
+        self.backend.client = self.client_stub
+        self.prepared = PreparedImage(data=make_image(7), mime_type='image/png', width=320, height=240, original_bytes=1)
+
+    def test_upload_is_reused(self):
+        self.backend.extract(self.prepared, "prompt")
+        self.backend.extract(self.prepared, "prompt")
+        self.assertEqual(len(self.client_stub.uploaded), 1)
+        self.assertEqual(GeminiUpload.objects.count(), 1)
+
+    def test_file_deleted_server_side_is_uploaded_again(self):
+        self.backend.extract(self.prepared, "prompt")
+        self.client_stub.missing.add(GeminiUpload.objects.get().uri)
+
+        self.backend.extract(self.prepared, "prompt")
+        self.assertEqual(self.client_stub.uploaded, ['files/0', 'files/1'])
+        self.assertEqual(GeminiUpload.objects.get().name, 'files/1')
+
+    def test_bad_request_keeps_the_upload(self):
+        self.backend.extract(self.prepared, "prompt")
+        self.client_stub.error = genai_errors.APIError(400, {'error': {'message': 'Invalid argument', 'status': 'INVALID_ARGUMENT'}})
+
+        with self.assertRaises(genai_errors.APIError):
+            self.backend.extract(self.prepared, "prompt")
+        self.assertEqual(self.client_stub.uploaded, ['files/0'])
+        self.assertEqual(GeminiUpload.objects.get().name, 'files/0')
+
+    def test_attempt_threads_close_their_connections(self):
+        opened = []
+
+        def track(sender, connection, **kwargs):
+            if threading.current_thread() is not threading.main_thread():
+                opened.append(connection)
+
+        connection_created.connect(track)
+        self.addCleanup(connection_created.disconnect, track)
+        # Through hedging.call, so uploads.acquire runs in an attempt thread
+        result = CalendarProcessor(backend=self.backend).process_image(None, prepared=self.prepared)
+
+        self.assertNotIn('error', result)
+        self.assertEqual(GeminiUpload.objects.count(), 1)
+        self.assertTrue(opened)
+        self.assertTrue(all(connection.connection is None for connection in opened))
+
+    def test_cleanup_deletes_stale_and_expiring_uploads(self):
+        now = timezone.now()
+        for i, (expires_in, unused_for) in enumerate([(timedelta(hours=40), timedelta(0)),
+                                                      (timedelta(minutes=5), timedelta(0)),
+                                                      (timedelta(hours=40), timedelta(hours=7)),
+                                                      (-timedelta(hours=1), timedelta(hours=49))]):
+            GeminiUpload.objects.create(content_sha256=f"{i:064d}", name=f"files/{i}", uri='', mime_type='image/png',
+                                        expires_at=now + expires_in, last_used_at=now - unused_for)
+
+        self.assertEqual(cleanup(self.client_stub, batch_size=10), (3, 0))
+        # The already-expired file is only forgotten
+        self.assertEqual(sorted(self.client_stub.deleted), ['files/1', 'files/2'])
+        self.assertEqual(list(GeminiUpload.objects.values_list('name', flat=True)), ['files/0'])
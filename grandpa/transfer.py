@@ -0,0 +1,179 @@
+"""
+Streaming export and bulk import of CalendarMonth/CalendarEvent rows as NDJSON
+(see `manage.py export_events` / `manage.py import_events`).
+
+The file holds a header line, then one JSON object per month, then one per event;
+each object is the row's columns keyed by attname plus "model". Rows are read in
+server-side cursor chunks and written as they arrive, and imported through
+PostgreSQL COPY as they are read, so memory stays flat at any size. Other
+databases fall back to batched bulk_create (where auto_now columns are reset to
+the import time).
+"""
+import gzip
+import json
+import sys
+from contextlib import contextmanager
+from itertools import groupby
+from operator import itemgetter
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from . import snapshots
+from .caching import bump_events_version
+from .models import CalendarEvent, CalendarMonth, MonthSnapshot
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the stdlib encoder
+    orjson = None
+
+FORMAT = 'grandpa-events'
+VERSION = 1
+
+# Exported in this order; events reference months, so months must load first
+MODELS = {'calendarmonth': CalendarMonth, 'calendarevent': CalendarEvent}
+
+
+def _dumps(record):
+    if orjson is not None:
+        return orjson.dumps(record)
+    return json.dumps(record, default=lambda value: value.isoformat(), separators=(',', ':')).encode()
+
+
+def _loads(line):
+    return orjson.loads(line) if orjson is not None else json.loads(line)
+
+
+def columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+@contextmanager
+def open_stream(path, mode, compress=None):
+    """
+    Opens `path` ('-' for stdin/stdout) in binary `mode`, gzip-compressed if
+    `compress` is set or, when it is None, if the name ends in .gz.
+    """
+    compress = path.endswith('.gz') if compress is None else compress
+    if path == '-':
+        raw = sys.stdout.buffer if 'w' in mode else sys.stdin.buffer
+        if not compress:
+            yield raw
+            return
+        # Closing the GzipFile writes the trailer but leaves stdin/stdout open
+        with gzip.GzipFile(fileobj=raw, mode=mode) as stream:
+            yield stream
+        return
+    with (gzip.open(path, mode) if compress else open(path, mode)) as stream:
+        yield stream
+
+
+def export_rows(stream, chunk_size=2000):
+    """
+    Writes every month and event to `stream` (binary). Returns {model: rows written}.
+    """
+    stream.write(_dumps({'format': FORMAT, 'version': VERSION}) + b'\n')
+    counts = {}
+    for name, model in MODELS.items():
+        names = columns(model)
+        counts[name] = 0
+        # values_list + iterator: plain tuples from a server-side cursor on PostgreSQL
+        for row in model.objects.order_by('pk').values_list(*names).iterator(chunk_size=chunk_size):
+            record = dict(zip(names, row))
+            record['model'] = name
+            stream.write(_dumps(record) + b'\n')
+            counts[name] += 1
+    return counts
+
+
+def _records(stream):
+    """(model name, record) for every row line, validating the model and columns."""
+    known = {name: set(columns(model)) for name, model in MODELS.items()}
+    for number, line in enumerate(stream, start=2):
+        record = _loads(line)
+        name = record.pop('model', None)
+        if name not in MODELS:
+            raise ValueError(f"Unknown model {name!r} on line {number}")
+        if not record.keys() <= known[name]:
+            raise ValueError(f"Unknown {name} columns on line {number}: {', '.join(sorted(record.keys() - known[name]))}")
+        yield name, record
+
+
+def copy_rows(cursor, model, records):
+    """
+    Streams `records` into the model's table with COPY (PostgreSQL). `cursor` is
+    the underlying psycopg cursor.
+    """
+    quote = connection.ops.quote_name
+    names = columns(model)
+    json_columns = {f.attname for f in model._meta.concrete_fields if f.get_internal_type() == 'JSONField'}
+    sql = f"COPY {quote(model._meta.db_table)} ({', '.join(quote(n) for n in names)}) FROM STDIN"
+    # The raw cursor raises psycopg's own errors; translate them (e.g. a duplicate key
+    # into django.db.IntegrityError) as Django's cursor wrapper would
+    with connection.wrap_database_errors, cursor.copy(sql) as copy:
+        for record in records:
+            # Text-format COPY: JSON goes in as its text, ISO dates/timestamps parse as-is
+            copy.write_row([
+                _dumps(record[n]).decode() if n in json_columns and record.get(n) is not None else record.get(n)
+                for n in names
+            ])
+            yield record
+
+
+def bulk_create_rows(model, records, batch_size=2000):
+    """
+    The fallback for other databases: bulk_create in batches.
+    """
+    batch = []
+    for record in records:
+        batch.append(model(**record))
+        if len(batch) >= batch_size:
+            model.objects.bulk_create(batch)
+            batch = []
+        yield record
+    model.objects.bulk_create(batch)
+
+
+def import_rows(stream, clear=False):
+    """
+    Loads an export_rows() stream in one transaction and returns {model: rows loaded}.
+    Primary keys are kept (so events still point at their months) and sequences are
+    moved past them afterwards; with clear=True existing months and events (and
+    everything that cascades from them) are deleted first.
+    """
+    header = _loads(stream.readline() or b'{}')
+    if header.get('format') != FORMAT or header.get('version') != VERSION:
+        raise ValueError(f"Not a {FORMAT} v{VERSION} export (header: {header})")
+
+    counts = dict.fromkeys(MODELS, 0)
+    periods = set()
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if clear:
+            # A plain DELETE: QuerySet.delete() would send a signal, and schedule a
+            # snapshot rebuild, per event; all snapshots are dropped below anyway
+            cursor.execute(f"DELETE FROM {connection.ops.quote_name(CalendarEvent._meta.db_table)}")
+            CalendarMonth.objects.all().delete()
+            MonthSnapshot.objects.all().delete()
+
+        for name, records in groupby(_records(stream), key=itemgetter(0)):
+            model = MODELS[name]
+            records = (record for _, record in records)
+            if connection.vendor == 'postgresql':
+                loaded = copy_rows(cursor.cursor, model, records)
+            else:
+                loaded = bulk_create_rows(model, records)
+            for record in loaded:
+                counts[name] += 1
+                if model is CalendarMonth:
+                    periods.add((record.get('year'), record.get('month')))
+
+        # Explicit ids leave the sequences behind; move them past the imported rows
+        for sql in connection.ops.sequence_reset_sql(no_style(), list(MODELS.values())):
+            cursor.execute(sql)
+
+        # COPY and bulk_create send no signals: refresh snapshots and cached text explicitly
+        for year, month in periods:
+            snapshots.schedule_rebuild(year, month)
+        transaction.on_commit(bump_events_version)
+
+    return counts
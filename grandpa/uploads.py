@@ -0,0 +1,157 @@
+"""
+Gemini Files API uploads, reused across parses and cleaned up in batches.
+
+An image is uploaded once per content hash: while its GeminiUpload record is more
+than GEMINI_UPLOAD_REUSE_MARGIN_SECONDS from the server-side expiry, retries,
+hedged requests and re-parses (e.g. after a prompt change) reference the same
+file instead of uploading it again. `cleanup` deletes remote files that are about
+to expire or haven't been used for GEMINI_UPLOAD_KEEP_SECONDS, so they don't count
+against the project's storage quota; the parse worker runs it periodically and
+`manage.py cleanup_gemini_uploads` runs it on demand.
+"""
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from google.genai import errors, types
+from . import metrics
+from .models import GeminiUpload
+
+# Files API uploads live for 48 hours unless the response says otherwise
+DEFAULT_LIFETIME = timedelta(hours=48)
+
+
+def reuse_margin():
+    return timedelta(seconds=getattr(settings, 'GEMINI_UPLOAD_REUSE_MARGIN_SECONDS', 30 * 60))
+
+
+def content_hash(prepared):
+    return hashlib.sha256(prepared.data).hexdigest()
+
+
+def find(sha256):
+    """The newest upload of these bytes that is still safely within its lifetime."""
+    upload = GeminiUpload.objects.filter(
+        content_sha256=sha256, expires_at__gt=timezone.now() + reuse_margin()
+    ).order_by('-expires_at').first()
+    if upload is not None:
+        GeminiUpload.objects.filter(pk=upload.pk).update(last_used_at=timezone.now())
+    return upload
+
+
+def remember(sha256, file):
+    return GeminiUpload.objects.create(
+        content_sha256=sha256,
+        name=file.name,
+        uri=file.uri,
+        mime_type=file.mime_type,
+        size_bytes=file.size_bytes or 0,
+        expires_at=file.expiration_time or timezone.now() + DEFAULT_LIFETIME,
+    )
+
+
+def forget(upload):
+    GeminiUpload.objects.filter(pk=upload.pk).delete()
+
+
+def part(upload):
+    """The generate_content reference to an upload."""
+    return types.Part.from_uri(file_uri=upload.uri, mime_type=upload.mime_type)
+
+
+def is_missing(exc):
+    """
+    Whether a generate_content error means a referenced file is gone (deleted or
+    expired). Not 400: that is a bad request (argument, prompt, schema), and
+    uploading the image again would only repeat it.
+    """
+    return isinstance(exc, errors.APIError) and exc.code in (403, 404)
+
+
+def acquire(client, prepared):
+    """
+    Returns (upload, reused): a stored reference to `prepared` on the Files API,
+    uploading it only if no reusable one exists.
+    """
+    sha256 = content_hash(prepared)
+    upload = find(sha256)
+    if upload is not None:
+        metrics.inc('grandpa_gemini_upload_reuse_total', 'hit')
+        return upload, True
+
+    metrics.inc('grandpa_gemini_upload_reuse_total', 'miss')
+    metrics.observe('grandpa_gemini_upload_bytes', len(prepared.data))
+    with metrics.timed('grandpa_gemini_upload_seconds'):
+        file = client.files.upload(
+            file=io.BytesIO(prepared.data),
+            config=types.UploadFileConfig(mime_type=prepared.mime_type)
+        )
+    return remember(sha256, file), False
+
+
+async def aacquire(client, prepared):
+    sha256 = content_hash(prepared)
+    upload = await sync_to_async(find)(sha256)
+    if upload is not None:
+        metrics.inc('grandpa_gemini_upload_reuse_total', 'hit')
+        return upload, True
+
+    metrics.inc('grandpa_gemini_upload_reuse_total', 'miss')
+    metrics.observe('grandpa_gemini_upload_bytes', len(prepared.data))
+    with metrics.timed('grandpa_gemini_upload_seconds'):
+        file = await client.aio.files.upload(
+            file=io.BytesIO(prepared.data),
+            config=types.UploadFileConfig(mime_type=prepared.mime_type)
+        )
+    return await sync_to_async(remember)(sha256, file), False
+
+
+def cleanup(client, batch_size=None, keep_seconds=None):
+    """
+    Deletes one batch of uploads that are near expiry or unused for `keep_seconds`
+    (default GEMINI_UPLOAD_KEEP_SECONDS), remote files concurrently. Records whose
+    remote delete fails are kept for the next run. Returns (deleted, failed).
+    """
+    batch_size = batch_size or getattr(settings, 'GEMINI_UPLOAD_CLEANUP_BATCH', 100)
+    if keep_seconds is None:
+        keep_seconds = getattr(settings, 'GEMINI_UPLOAD_KEEP_SECONDS', 6 * 60 * 60)
+    now = timezone.now()
+    batch = list(GeminiUpload.objects.filter(
+        Q(expires_at__lte=now + reuse_margin()) | Q(last_used_at__lte=now - timedelta(seconds=keep_seconds))
+    ).order_by('expires_at')[:batch_size])
+    if not batch:
+        return 0, 0
+
+    def delete(upload):
+        if upload.expires_at <= now:
+            # Already removed server-side
+            return True
+        try:
+            client.files.delete(name=upload.name)
+        except Exception as e:
+            if isinstance(e, errors.APIError) and e.code in (403, 404):
+                # Gone already
+                return True
+            print(f"Failed to delete {upload.name}: {e}")
+            return False
+        return True
+
+    with ThreadPoolExecutor(max_workers=getattr(settings, 'GEMINI_UPLOAD_CLEANUP_CONCURRENCY', 8)) as pool:
+        results = list(pool.map(delete, batch))
+
+    deleted = [upload.pk for upload, ok in zip(batch, results) if ok]
+    GeminiUpload.objects.filter(pk__in=deleted).delete()
+    return len(deleted), len(batch) - len(deleted)
+
+
+def cleanup_with_default_client(**kwargs):
+    """`cleanup` using the shared client for GOOGLE_API_KEY; (0, 0) if there is no key."""
+    from .gemini import get_client
+    api_key = getattr(settings, 'GOOGLE_API_KEY', None)
+    if not api_key:
+        return 0, 0
+    return cleanup(get_client(api_key), **kwargs)
@@ -6,5 +6,6 @@ urlpatterns = [
     path('', views.calendar_view, name='calendar_home'),
     path('month/<int:year>/<int:month>/', views.calendar_view, name='calendar_month'),
     path('day/<int:year>/<int:month>/<int:day>/', views.calendar_view, name='calendar_day'),
+    path('months/<int:pk>/status/', views.parse_status_stream, name='parse_status_stream'),
     # Add other routes as needed
 ]
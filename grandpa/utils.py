@@ -22,3 +22,14 @@ def get_current_date():
                 pass
     
     return datetime.now(tz)
+
+
+def percentile(samples, pct):
+    """
+    Nearest-rank percentile of a list of numbers.
+    """
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
@@ -1,10 +1,27 @@
 from django.shortcuts import render, redirect
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
 from django.conf import settings
-from datetime import datetime, timedelta
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.db.models import (
+    BigIntegerField, BooleanField, Count, DateField, ExpressionWrapper, IntegerField, OuterRef, Q, SmallIntegerField,
+    Subquery, TextField, Value,
+)
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast, TruncMonth
+from datetime import date, datetime, timedelta
+from collections import namedtuple
 from zoneinfo import ZoneInfo
+import asyncio
 import calendar
-from .models import CalendarEvent
+import hashlib
+import hmac
+import json
+import time
+from . import metrics as pipeline_metrics
+from .caching import events_version, version_datetime
+from .models import CalendarEvent, CalendarMonth, ParseJob
 from .utils import get_current_date
 
 def redirect_to_calendar(request, exception=None):
@@ -29,6 +46,47 @@ def calendar_view(request, year=None, month=None, day=None):
 
     return render(request, 'calendar.html', context)
 
+DayEvent = namedtuple('DayEvent', ['all_day', 'start_minute_of_day', 'title'])
+
+def next_month_of(d):
+    return (d.year + 1, 1) if d.month == 12 else (d.year, d.month + 1)
+
+def fetch_message_data(target_date, now):
+    """
+    Everything get_events_text needs in one round-trip: the target day's events, in
+    display order, plus which of the relevant months (current, target, next) have any
+    events at all. Returns (events, months_with_events) where months_with_events
+    holds (year, month).
+    """
+    months = {(now.year, now.month), (target_date.year, target_date.month), next_month_of(now)}
+    first = date(*min(months), 1)
+    last_year, last_month = max(months)
+    last = date(last_year, last_month, calendar.monthrange(last_year, last_month)[1])
+
+    # kind=0 rows are the day's events; kind=1 rows mark a month that has events.
+    # Literals are cast to their column's type: PostgreSQL won't match an untyped
+    # NULL or text parameter against e.g. smallint across a UNION.
+    day_rows = CalendarEvent.objects.filter(event_date=target_date.date()).order_by().values_list(
+        Cast(Value(0), IntegerField()), Cast(Value(None), DateField()), 'all_day', 'start_minute_of_day', 'title', 'id'
+    )
+    month_rows = CalendarEvent.objects.filter(event_date__range=(first, last)).order_by().values_list(
+        Cast(Value(1), IntegerField()), TruncMonth('event_date', output_field=DateField()),
+        Cast(Value(False), BooleanField()), Cast(Value(None), SmallIntegerField()), Cast(Value(''), TextField()),
+        Cast(Value(None), BigIntegerField()),
+    ).distinct()
+
+    # Ordering applies to the whole union; the month marker rows just come along.
+    # The id tiebreak keeps events starting at the same minute in a fixed order.
+    combined = day_rows.union(month_rows, all=True).order_by(*CalendarEvent.DAY_ORDERING)
+
+    events, months_with_events = [], set()
+    for kind, month_start, *fields, _ in combined:
+        if kind == 0:
+            events.append(DayEvent(*fields))
+        else:
+            months_with_events.add((month_start.year, month_start.month))
+    return events, months_with_events
+
 def get_events_text(target_date, title_prefix):
     year = target_date.year
     month = target_date.month
@@ -36,11 +94,9 @@ def get_events_text(target_date, title_prefix):
     
     # --- Check 3: Current month empty check ---
     now_chicago = get_current_date()
-    
-    current_month_events_exist = CalendarEvent.objects.filter(
-        calendar_month__year=now_chicago.year,
-        calendar_month__month=now_chicago.month
-    ).exists()
+
+    events_list, months_with_events = fetch_message_data(target_date, now_chicago)
+    current_month_events_exist = (now_chicago.year, now_chicago.month) in months_with_events
     
     if not current_month_events_exist:
         # Format date: Saturday, January 3
@@ -56,38 +112,6 @@ def get_events_text(target_date, title_prefix):
         lines.append(f"Full schedule at: {calendar_url}")
         return "\n".join(lines)
 
-    # --- Query Events for Target Date ---
-    events = CalendarEvent.objects.filter(
-        calendar_month__year=year,
-        calendar_month__month=month,
-        day=day
-    )
-    
-    # Helper to normalize time to (hour_24, minute)
-    def normalize_time(e):
-        h = e.hour
-        m = e.minute or 0
-        
-        if h is None:
-            return (24, 0) # No time -> End
-            
-        # If hour > 12, assume 24h format (e.g. 13-23)
-        if h > 12:
-            pass # already 24h
-        elif h == 12:
-             # 12 is tricky. 12 AM = 0, 12 PM = 12.
-             if e.am_pm and e.am_pm.lower() == 'am':
-                 h = 0
-        else: # 0-11 or 1-11
-             if e.am_pm and e.am_pm.lower() == 'pm':
-                 h += 12
-                 
-        return (h, m)
-
-    # Custom sort for time
-    events_list = list(events)
-    events_list.sort(key=lambda e: (-1, 0) if e.all_day else normalize_time(e))
-    
     # Format date: Saturday, January 3
     date_str = target_date.strftime("%A, %B %-d")
     lines = [f"Events {title_prefix}, {date_str}:"]
@@ -96,10 +120,7 @@ def get_events_text(target_date, title_prefix):
         # --- Check 1: Empty Day but Month has events ---
         # We know "current month" has events from Check 3.
         # But target_date might be next month.
-        target_month_has_events = CalendarEvent.objects.filter(
-            calendar_month__year=year,
-            calendar_month__month=month
-        ).exists()
+        target_month_has_events = (year, month) in months_with_events
         
         if target_month_has_events:
             lines.append("No events appear to be scheduled on this day.")
@@ -110,10 +131,10 @@ def get_events_text(target_date, title_prefix):
             if e.all_day:
                 lines.append(f"All Day - {e.title}")
             else:
-                h, m = normalize_time(e)
-                if h == 24: # No time (but not all_day)
+                if e.start_minute_of_day is None: # No time (but not all_day)
                     lines.append(f"{e.title}")
                     continue
+                h, m = divmod(e.start_minute_of_day, 60)
                 
                 # Format back to 12h for display
                 am_pm_str = "AM"
@@ -134,18 +155,7 @@ def get_events_text(target_date, title_prefix):
     is_end_of_month = now_chicago.day >= (last_day_of_month - 1)
     
     if is_end_of_month:
-        # Calculate next month
-        if now_chicago.month == 12:
-            next_month_year = now_chicago.year + 1
-            next_month_month = 1
-        else:
-            next_month_year = now_chicago.year
-            next_month_month = now_chicago.month + 1
-            
-        next_month_has_events = CalendarEvent.objects.filter(
-            calendar_month__year=next_month_year,
-            calendar_month__month=next_month_month
-        ).exists()
+        next_month_has_events = next_month_of(now_chicago) in months_with_events
         
         if not next_month_has_events:
             lines.append("")
@@ -160,13 +170,134 @@ def get_events_text(target_date, title_prefix):
     
     return "\n".join(lines)
 
+def events_text_response(request, target_date, title_prefix):
+    """
+    Serves get_events_text from the cache. The text only changes when calendar data
+    changes (events version) or the Chicago date rolls over, so both are part of the
+    cache key and the ETag; Last-Modified is whichever of the two happened last.
+    """
+    today = get_current_date()
+    version = events_version()
+    key = f"messages:{title_prefix}:{target_date:%Y-%m-%d}:{today:%Y-%m-%d}:{version}"
+
+    etag = '"%s"' % hashlib.md5(key.encode()).hexdigest()
+    midnight = today.replace(hour=0, minute=0, second=0, microsecond=0)
+    last_modified = max(version_datetime(version), midnight).timestamp()
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is None:
+        text = cache.get(key)
+        if text is None:
+            text = get_events_text(target_date, title_prefix)
+            cache.set(key, text, getattr(settings, 'MESSAGES_CACHE_TIMEOUT', 60 * 60 * 24))
+        response = HttpResponse(text, content_type="text/plain")
+    else:
+        response = not_modified
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'no-cache'
+    return response
+
 def messages_today(request):
     today = get_current_date()
-    text = get_events_text(today, "today")
-    return HttpResponse(text, content_type="text/plain")
+    return events_text_response(request, today, "today")
 
 def messages_tomorrow(request):
     tomorrow = get_current_date() + timedelta(days=1)
     print(f"Tomorrow: {tomorrow}")
-    text = get_events_text(tomorrow, "tomorrow")
-    return HttpResponse(text, content_type="text/plain")
+    return events_text_response(request, tomorrow, "tomorrow")
+
+async def parse_status(pk):
+    """
+    The admin-facing parse state of a CalendarMonth in one query, without loading
+    parsed_data itself (which holds every extracted event). None if it doesn't exist.
+    """
+    latest_job = ParseJob.objects.filter(calendar_month=OuterRef('pk')).order_by('-created_at')
+    row = await CalendarMonth.objects.filter(pk=pk).annotate(
+        has_result=ExpressionWrapper(Q(parsed_data__isnull=False), output_field=BooleanField()),
+        parse_status=KT('parsed_data__status'),
+        parse_error=KT('parsed_data__error'),
+        event_count=Count('events'),
+        job_status=Subquery(latest_job.values('status')[:1]),
+        job_attempts=Subquery(latest_job.values('attempts')[:1]),
+        job_error=Subquery(latest_job.values('last_error')[:1]),
+    ).values(
+        'has_result', 'successfully_parsed', 'parse_status', 'parse_error', 'event_count',
+        'job_status', 'job_attempts', 'job_error',
+    ).afirst()
+    if row is None:
+        return None
+
+    # Same states as CalendarMonthAdmin.status_display: any finished result that isn't
+    # a success (e.g. a photo that isn't a calendar) is a failure
+    if not row['has_result']:
+        state = 'pending'
+    elif row['parse_status'] == 'processing':
+        state = 'processing'
+    elif row['successfully_parsed']:
+        state = 'success'
+    else:
+        state = 'failed'
+
+    return {
+        'state': state,
+        'events': row['event_count'],
+        'error': row['parse_error'] or row['job_error'] or '',
+        'job': {'status': row['job_status'], 'attempts': row['job_attempts']},
+    }
+
+async def parse_status_stream(request, pk):
+    """
+    Server-Sent Events stream of a CalendarMonth's parse status, used by the admin
+    change page instead of asking people to reload it. Sends a `status` event on every
+    change and `done` once parsing has finished; the browser's EventSource reconnects
+    on its own if the connection is dropped or times out. Serve under ASGI
+    (`uvicorn config.asgi:application`) so open streams don't each hold a worker.
+    """
+    user = await request.auser()
+    if not (user.is_active and user.is_staff):
+        return HttpResponseForbidden()
+
+    poll = getattr(settings, 'PARSE_STATUS_POLL_SECONDS', 1)
+    deadline = time.monotonic() + getattr(settings, 'PARSE_STATUS_STREAM_SECONDS', 300)
+
+    async def events():
+        last = None
+        idle = 0.0
+        while time.monotonic() < deadline:
+            status = await parse_status(pk)
+            if status is None:
+                yield "event: done\ndata: {}\n\n"
+                return
+            if status != last:
+                last = status
+                idle = 0.0
+                yield f"event: status\ndata: {json.dumps(status)}\n\n"
+                if status['state'] in ('success', 'failed'):
+                    yield f"event: done\ndata: {json.dumps(status)}\n\n"
+                    return
+            elif idle >= 15:
+                # Comment line: keeps proxies from closing an idle connection
+                idle = 0.0
+                yield ": keepalive\n\n"
+            await asyncio.sleep(poll)
+            idle += poll
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def metrics(request):
+    """
+    Ingestion metrics in the Prometheus text format (see grandpa/metrics.py). When
+    METRICS_TOKEN is set, scrapers must send it as `Authorization: Bearer <token>`.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    response = HttpResponse(pipeline_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    response['Cache-Control'] = 'no-store'
+    return response